@@ -0,0 +1,152 @@
+"""
+Benchmark: requests per second and latency (p50 / p99) of the async-native API views versus the
+DRF (sync) ones they replace, both served by uvicorn (settings.ASYNC_API_VIEWS).
+
+Run from the project root, against a migrated database (e.g. inside the web container):
+    python -m benchmarks.bench_api_views [--seconds 10] [--concurrency 64] [--workers 1]
+
+One uvicorn server is started per flavour, on the same database. Every endpoint is hammered for
+`--seconds` by `--concurrency` clients with a logged-in session:
+- submit: POST /summarize/ with a new URL (INSERT + broker publish)
+- status: GET /summarize/<id>/
+- list:   GET /my-summaries/?limit=20
+Publishes go to an in-memory broker unless --broker is given: no worker is needed and nothing is scraped.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import django
+import httpx
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+
+USERNAME = 'bench-api-views'
+CSRF_TOKEN = 'b' * 32  # Any 32-character token works, as long as cookie and header agree
+SEEDED_SUMMARIES = 200
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(async_views: bool, workers: int, broker: str):
+    port = free_port()
+    env = {**os.environ, 'ASYNC_API_VIEWS': str(async_views), 'CELERY_BROKER_URL': broker}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'intelliresearchhub.asgi:application', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        env=env,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(200):
+        try:
+            httpx.get(f'{base_url}/accounts/login/', timeout=1)
+            return process, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('uvicorn did not start')
+
+
+def prepare_user():
+    """A user with a session and SEEDED_SUMMARIES rows to list. Returns (cookies, a summary id)."""
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from interface_layer.models import Summary
+
+    User = get_user_model()
+    User.objects.filter(username=USERNAME).delete()
+    user = User.objects.create_user(username=USERNAME)
+    Summary.objects.bulk_create(
+        Summary(user=user, url=f'https://bench.example/{i}', status='COMPLETED', output_summary='Summary')
+        for i in range(SEEDED_SUMMARIES)
+    )
+    client = Client()
+    client.force_login(user)
+    cookies = {'sessionid': client.cookies['sessionid'].value, 'csrftoken': CSRF_TOKEN}
+    return cookies, Summary.objects.filter(user=user).values_list('id', flat=True).first()
+
+
+def make_request(endpoint: str, summary_id):
+    if endpoint == 'submit':
+        return lambda client: client.post(
+            '/summarize/', json={'url': f'https://bench.example/new/{uuid.uuid4().hex}'},
+            headers={'X-CSRFToken': CSRF_TOKEN},
+        )
+    if endpoint == 'status':
+        return lambda client: client.get(f'/summarize/{summary_id}/')
+    return lambda client: client.get('/my-summaries/', params={'limit': 20})
+
+
+async def hammer(base_url: str, cookies: dict, request, seconds: float, concurrency: int) -> tuple:
+    """Returns (latencies in seconds, errors)."""
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await request(client)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes per server')
+    parser.add_argument('--endpoints', default='submit,status,list')
+    parser.add_argument('--broker', default='memory://')
+    args = parser.parse_args()
+
+    django.setup()
+    cookies, summary_id = prepare_user()
+
+    print(f"{args.concurrency} concurrent clients, {args.seconds:.0f}s per endpoint, {args.workers} uvicorn worker(s)")
+    print(f"{'endpoint':<8} {'views':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for async_views in (False, True):
+            process, base_url = start_server(async_views, args.workers, args.broker)
+            try:
+                for endpoint in args.endpoints.split(','):
+                    request = make_request(endpoint, summary_id)
+                    asyncio.run(hammer(base_url, cookies, request, 1, args.concurrency))  # Warm up
+                    latencies, errors = asyncio.run(
+                        hammer(base_url, cookies, request, args.seconds, args.concurrency)
+                    )
+                    print(
+                        f"{endpoint:<8} {'async' if async_views else 'sync':<6} "
+                        f"{len(latencies) / args.seconds:>8.0f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+                        f"{percentile(latencies, 0.99) * 1000:>8.1f} {errors:>7}"
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        from django.contrib.auth import get_user_model
+        get_user_model().objects.filter(username=USERNAME).delete()
+
+
+if __name__ == '__main__':
+    main()
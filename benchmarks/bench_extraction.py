@@ -0,0 +1,83 @@
+"""
+Benchmark: full BeautifulSoup cleaning vs the streaming extractor on large pages.
+
+Run from the project root:
+    python -m benchmarks.bench_extraction
+
+The page is fed in 64 KB chunks, like the network would deliver it.
+"Bytes read" shows how much of the page had to be downloaded before the text budget was filled.
+"""
+import time
+import tracemalloc
+
+from domain.extraction import clean_html, StreamingTextExtractor, MAX_CONTENT_CHARS
+
+CHUNK_SIZE = 64 * 1024
+PAGE_SIZES = [100 * 1024, 1024 * 1024, 5 * 1024 * 1024]
+REPEAT = 3
+
+
+def make_page(size: int) -> str:
+    """A realistic-ish article: big inline scripts/styles, navigation, then lots of paragraphs."""
+    head = (
+        "<html><head><title>Benchmark article</title>"
+        "<style>" + ".c{color:red}" * 2000 + "</style>"
+        "<script>" + "var x = 1;" * 5000 + "</script></head><body>"
+        "<nav>" + "<a href='/'>Home</a> " * 200 + "</nav>"
+        "<header><h1>A very long article</h1></header><article>\n"
+    )
+    paragraph = (
+        "<p>Researchers measured the <b>latency</b> of the pipeline under load and found that most "
+        "of the time was spent waiting on the network rather than in the parser itself.</p>\n"
+    )
+    body = paragraph * ((size - len(head)) // len(paragraph) + 1)
+    return head + body + "</article><footer>Copyright</footer></body></html>"
+
+
+def run_full(html: str):
+    return clean_html(html, MAX_CONTENT_CHARS), len(html)
+
+
+def run_streaming(html: str):
+    extractor = StreamingTextExtractor(limit=MAX_CONTENT_CHARS)
+    consumed = 0
+    for i in range(0, len(html), CHUNK_SIZE):
+        chunk = html[i:i + CHUNK_SIZE]
+        consumed += len(chunk)
+        if extractor.feed(chunk):
+            break
+    return extractor.result(), consumed
+
+
+def measure(func, html: str):
+    # 1. Latency (best of REPEAT, without tracemalloc overhead)
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        text, consumed = func(html)
+        best = min(best, time.perf_counter() - start)
+
+    # 2. Peak memory allocated while cleaning
+    tracemalloc.start()
+    func(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return text, consumed, best, peak
+
+
+def main():
+    print(f"{'page':>8} | {'method':>9} | {'time (ms)':>9} | {'peak mem (MB)':>13} | {'bytes read':>10}")
+    print("-" * 64)
+    for size in PAGE_SIZES:
+        html = make_page(size)
+        full_text, *full_stats = measure(run_full, html)
+        stream_text, *stream_stats = measure(run_streaming, html)
+        assert full_text == stream_text, "streaming output differs from the reference cleaning"
+
+        for name, (consumed, seconds, peak) in (('full', full_stats), ('streaming', stream_stats)):
+            print(f"{size // 1024:>6}KB | {name:>9} | {seconds * 1000:>9.1f} | {peak / 1e6:>13.2f} | {consumed:>10}")
+
+
+if __name__ == '__main__':
+    main()
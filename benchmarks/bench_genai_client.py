@@ -0,0 +1,119 @@
+"""
+Benchmark: per-call latency of a fresh genai.Client per summary (the old behaviour)
+versus the shared, process-wide client from domain/genai_client.py.
+
+Run from the project root:
+    python -m benchmarks.bench_genai_client [--calls 50] [--handshake-ms 30]
+
+No API key or network needed: the SDK is pointed at a local stub of the generateContent endpoint.
+The stub sleeps `--handshake-ms` once per NEW connection, standing in for the TCP + TLS handshake
+to the real API; a reused keep-alive connection skips it, exactly like in production.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google import genai
+
+from domain.genai_client import GenAIClientManager
+
+MODEL = 'gemini-2.5-flash'
+REPLY = json.dumps({
+    'candidates': [{'content': {'role': 'model', 'parts': [{'text': '**TL;DR** stub summary.'}]}}],
+}).encode('utf-8')
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs add ~40 ms to every keep-alive reply
+    handshake_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        time.sleep(self.handshake_delay)  # Once per connection, not per request
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(handshake_ms: float) -> ThreadingHTTPServer:
+    StubModelHandler.handshake_delay = handshake_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubModelHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_factory(base_url: str):
+    return lambda api_key: genai.Client(api_key=api_key, http_options={'base_url': base_url})
+
+
+def read_key_from_disk(secret_path: str) -> str:
+    """What ResearchAgent did before every call."""
+    with open(secret_path, 'r') as file:
+        return file.read().strip()
+
+
+def measure(get_client, calls: int) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        client = get_client()  # Keep a reference: genai.Client closes its connections when collected
+        client.models.generate_content(model=MODEL, contents='Summarize this.')
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    mean = sum(timings) / len(timings)
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:>18} | {mean * 1000:>8.2f} ms | {p50 * 1000:>8.2f} ms | {p95 * 1000:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--handshake-ms', type=float, default=30)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.handshake_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    factory = make_factory(base_url)
+
+    with tempfile.TemporaryDirectory() as secrets_dir:
+        secret_path = os.path.join(secrets_dir, 'google_credentials')
+        with open(secret_path, 'w') as file:
+            file.write('stub-key\n')
+
+        # 1. Old behaviour: read the secret and build a client for every call
+        def new_client_per_call():
+            return factory(read_key_from_disk(secret_path))
+
+        # 2. New behaviour: one manager per process, warmed up like a Celery worker does
+        manager = GenAIClientManager(secrets_dir=secrets_dir, client_factory=factory)
+        manager.get_client().models.generate_content(model=MODEL, contents='warm up')
+
+        print(f"{args.calls} calls, {args.handshake_ms:g} ms simulated handshake per new connection\n")
+        print(f"{'client':>18} | {'mean':>11} | {'p50':>11} | {'p95':>11}")
+        print('-' * 62)
+        report('new per call', measure(new_client_per_call, args.calls))
+        report('shared (manager)', measure(manager.get_client, args.calls))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
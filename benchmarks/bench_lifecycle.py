@@ -0,0 +1,415 @@
+"""
+Benchmark: the whole submit -> process -> poll lifecycle, on the real API and a real Celery worker.
+
+Run from the project root, against a migrated database and a Redis server (e.g. inside the web container):
+    python -m benchmarks.bench_lifecycle [--jobs 200] [--concurrency 20] [--sizes 20,100,400]
+                                         [--model-latency-ms 800] [--compare benchmarks/results/<earlier>.json]
+
+Fully offline: pages come from a local stub site (articles of --sizes KB) and summaries from a stub of
+the Gemini API (GOOGLE_GEMINI_BASE_URL) that answers after --model-latency-ms.
+The benchmark starts uvicorn and one Celery worker (thread pool, every queue), then --concurrency
+clients each submit a new URL and poll its status until it is COMPLETED or FAILED, --jobs times in total.
+
+Reported (and written as JSON to --output, to compare commits with --compare):
+- jobs per second, and the submit -> final status latency percentiles
+- per-stage latency percentiles and queue waits, from the worker's Prometheus histograms (domain/telemetry.py)
+- SQL statements per job, in the worker and in the API (the polls included)
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import django
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.bench_api_views import CSRF_TOKEN, free_port, percentile
+from benchmarks.bench_extraction import make_page
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+
+USERNAME = 'bench-lifecycle'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+FINAL_STATUSES = ('COMPLETED', 'FAILED')
+SUMMARY = '**TL;DR** stub summary.\n\n**Key Points:**\n* One\n* Two\n\n**Conclusion:** Stub.'
+# Metrics of the report that are better when lower (the rest are better when higher)
+LOWER_IS_BETTER = ('latency', 'stages', 'queue_wait', 'db_queries_per_job')
+
+
+# ==========================================
+# STUBS (the web and the model API)
+# ==========================================
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+    """
+    GET /page/<KB>/<anything>: an article of that size. Its first paragraph names the path: no two
+    URLs share content, so the content-hash caches never skip a stage.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+    pages = {}
+    pages_lock = threading.Lock()
+
+    def do_GET(self):
+        match = re.match(r'^/page/(\d+)/', self.path)
+        if not match:
+            self.reply(404, b'Not found', 'text/plain')
+            return
+        size_kb = int(match.group(1))
+        with self.pages_lock:
+            if size_kb not in self.pages:
+                self.pages[size_kb] = make_page(size_kb * 1024).encode('utf-8')
+        page = self.pages[size_kb].replace(b'<article>\n', f'<article>\n<p>Article {self.path}</p>\n'.encode('utf-8'), 1)
+        time.sleep(self.latency)
+        self.reply(200, page, 'text/html; charset=utf-8')
+
+    def reply(self, code: int, body: bytes, content_type: str):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    """generateContent (and its SSE stream): a fixed summary after `latency` seconds, with token counts."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def do_POST(self):
+        prompt = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        reply = json.dumps({
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': SUMMARY}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': len(prompt) // 4, 'candidatesTokenCount': len(SUMMARY) // 4},
+        })
+        body = (f'data: {reply}\r\n\r\n' if 'alt=sse' in self.path else reply).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if 'alt=sse' in self.path else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(handler, latency_ms: float) -> str:
+    handler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# ==========================================
+# THE STACK UNDER TEST
+# ==========================================
+
+def start_stack(args, model_url: str) -> tuple:
+    """uvicorn + one Celery worker. Returns (processes, API URL, worker metrics URL)."""
+    api_port, metrics_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        'GOOGLE_GEMINI_BASE_URL': model_url,
+        'GOOGLE_CREDENTIALS': 'stub-key',  # Read when there is no Docker secret (domain/genai_client.py)
+        'SCRAPE_POLITENESS': 'False',  # Every stub page is on one host: 1 fetch/s would be all we measure
+        'SUMMARY_STREAMING': 'False',
+        'SUMMARY_SCHEDULING_ENABLED': 'True',
+        'SUMMARY_SCHEDULING_BACKEND': 'redis',  # The API queues jobs, the worker's rechecks start them
+        'WORKER_METRICS_PORT': str(metrics_port),
+    }
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)  # One process each: the default registry is the whole story
+    web = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'intelliresearchhub.asgi:application', '--port', str(api_port),
+         '--log-level', 'warning', '--no-access-log'],
+        env=env,
+    )
+    worker = subprocess.Popen(
+        [sys.executable, '-m', 'celery', '-A', 'intelliresearchhub', 'worker', '-Q', 'celery,fetch,parse,summarize',
+         '-P', 'threads', '-c', str(args.worker_concurrency), '-l', 'warning', '-n', f'bench-{api_port}@%h'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    processes = [web, worker]
+    api_url, metrics_url = f'http://127.0.0.1:{api_port}', f'http://127.0.0.1:{metrics_port}'
+    try:
+        for url in (f'{api_url}/metrics/', metrics_url):
+            wait_until_up(url, processes)
+    except Exception:
+        stop(processes)
+        raise
+    return processes, api_url, metrics_url
+
+
+def wait_until_up(url: str, processes: list, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if any(process.poll() is not None for process in processes):
+            raise RuntimeError('The API or the worker exited during startup')
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def stop(processes: list):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def login() -> dict:
+    """Session cookies of a fresh benchmark user."""
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    User = get_user_model()
+    User.objects.filter(username=USERNAME).delete()
+    client = Client()
+    client.force_login(User.objects.create_user(username=USERNAME))
+    return {'sessionid': client.cookies['sessionid'].value, 'csrftoken': CSRF_TOKEN}
+
+
+# ==========================================
+# LOAD
+# ==========================================
+
+async def run_jobs(api_url: str, cookies: dict, urls: list, concurrency: int, poll_interval: float) -> list:
+    """Submits every URL and polls it to the end, `concurrency` jobs at a time. Returns [(seconds, status)]."""
+    results = []
+    pending = iter(urls)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api_url, cookies=cookies, limits=limits, timeout=60) as client:
+
+        async def lifecycle(url):
+            started = time.perf_counter()
+            response = await client.post('/summarize/', json={'url': url}, headers={'X-CSRFToken': CSRF_TOKEN})
+            response.raise_for_status()
+            summary_id = response.json()['id']
+            status = response.json()['status']
+            while status not in FINAL_STATUSES:
+                await asyncio.sleep(poll_interval)
+                status = (await client.get(f'/summarize/{summary_id}/')).json()['status']
+            results.append((time.perf_counter() - started, status))
+
+        async def user():
+            for url in pending:
+                await lifecycle(url)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return results
+
+
+# ==========================================
+# METRICS
+# ==========================================
+
+def scrape(url: str) -> dict:
+    """{(sample name, sorted labels): value} of one Prometheus scrape."""
+    samples = {}
+    for family in text_string_to_metric_families(httpx.get(url, timeout=10).text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def delta(before: dict, after: dict, name: str, **match) -> dict:
+    """Increase of every `name` sample whose labels include `match`, keyed by its labels."""
+    return {
+        labels: value - before.get((sample, labels), 0)
+        for (sample, labels), value in after.items()
+        if sample == name and all(dict(labels).get(key) == wanted for key, wanted in match.items())
+    }
+
+
+def histogram_summary(before: dict, after: dict, name: str, **match) -> dict:
+    """count, mean and p50/p90/p99 (interpolated in the buckets, like PromQL's histogram_quantile) of a histogram."""
+    buckets = {}
+    for (sample, labels), value in after.items():
+        labels = dict(labels)
+        if sample != f'{name}_bucket' or any(labels.get(key) != wanted for key, wanted in match.items()):
+            continue
+        bound = float(labels['le'])
+        buckets[bound] = buckets.get(bound, 0) + value - before.get((sample, tuple(sorted(labels.items()))), 0)
+    total = sum(delta(before, after, f'{name}_sum', **match).values())
+    count = max(buckets.values(), default=0)
+    if not count:
+        return {'count': 0}
+    ordered = sorted(buckets.items())
+    return {
+        'count': int(count),
+        'mean': total / count,
+        **{f'p{round(q * 100)}': bucket_quantile(ordered, q) for q in (0.5, 0.9, 0.99)},
+    }
+
+
+def bucket_quantile(buckets: list, q: float) -> float:
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return lower  # Beyond the last finite bucket: its bound is the best we know
+            return lower + (bound - lower) * (rank - below) / max(count - below, 1e-12)
+        lower, below = bound, count
+    return lower
+
+
+def labels_of(samples: dict, name: str, label: str) -> list:
+    return sorted({dict(labels)[label] for sample, labels in samples if sample == name and label in dict(labels)})
+
+
+# ==========================================
+# REPORT
+# ==========================================
+
+def build_report(args, results: list, wall: float, worker: tuple, api: tuple) -> dict:
+    latencies = [seconds for seconds, _ in results]
+    completed = sum(status == 'COMPLETED' for _, status in results)
+    (worker_before, worker_after), (api_before, api_after) = worker, api
+    stages = labels_of(worker_after, 'summary_stage_seconds_count', 'stage')
+    queues = labels_of(worker_after, 'summary_queue_wait_seconds_count', 'stage')
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': vars(args) | {'compare': None, 'output': None},
+        'jobs': len(results),
+        'completed': completed,
+        'failed': len(results) - completed,
+        'wall_seconds': wall,
+        'jobs_per_second': len(results) / wall,
+        'latency': {f'p{round(q * 100)}': percentile(latencies, q) for q in (0.5, 0.9, 0.99)} | {'max': max(latencies)},
+        'stages': {stage: histogram_summary(worker_before, worker_after, 'summary_stage_seconds', stage=stage) for stage in stages},
+        'queue_wait': {stage: histogram_summary(worker_before, worker_after, 'summary_queue_wait_seconds', stage=stage) for stage in queues},
+        'db_queries_per_job': {
+            'worker': sum(delta(worker_before, worker_after, 'db_queries_total').values()) / len(results),
+            'api': sum(delta(api_before, api_after, 'db_queries_total').values()) / len(results),
+        },
+        'model_tokens_per_job': {
+            direction: sum(delta(worker_before, worker_after, 'summary_model_tokens_total', direction=direction).values()) / len(results)
+            for direction in ('input', 'output')
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report: dict):
+    print(f"\n{report['jobs']} jobs ({report['failed']} failed) in {report['wall_seconds']:.1f}s: "
+          f"{report['jobs_per_second']:.2f} jobs/s")
+    latency = report['latency']
+    print(f"submit -> done: p50 {latency['p50'] * 1000:.0f} ms | p90 {latency['p90'] * 1000:.0f} ms | "
+          f"p99 {latency['p99'] * 1000:.0f} ms | max {latency['max'] * 1000:.0f} ms")
+    print(f"\n{'':<20} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for section in ('stages', 'queue_wait'):
+        for stage, summary in report[section].items():
+            name = stage if section == 'stages' else f'queue wait: {stage}'
+            if not summary['count']:
+                continue
+            print(f"{name:<20} {summary['count']:>7} " + ' '.join(
+                f"{summary[key] * 1000:>9.1f}" for key in ('mean', 'p50', 'p90', 'p99')))
+    queries = report['db_queries_per_job']
+    print(f"\nSQL statements per job: worker {queries['worker']:.1f}, API {queries['api']:.1f} (polls included)")
+
+
+def flatten(report: dict, prefix: str = '') -> dict:
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def print_comparison(previous: dict, report: dict):
+    """Relative change of every number of the report, flagged when it got >5% worse."""
+    print(f"\nCompared with {previous['commit']} ({previous['timestamp']}):")
+    old, new = flatten(previous), flatten(report)
+    for key in sorted(set(old) & set(new)):
+        if key.startswith('config.') or key in ('jobs', 'completed', 'wall_seconds') or key.endswith('.count') or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key]
+        worse = change > 0.05 if key.startswith(LOWER_IS_BETTER) else change < -0.05
+        print(f"{'!' if worse else ' '} {key:<40} {old[key]:>12.4g} -> {new[key]:>12.4g} ({change:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=20, help='jobs in flight')
+    parser.add_argument('--worker-concurrency', type=int, default=32, help='threads of the Celery worker')
+    parser.add_argument('--sizes', default='20,100,400', help='page sizes in KB, used in turn')
+    parser.add_argument('--site-latency-ms', type=float, default=50)
+    parser.add_argument('--model-latency-ms', type=float, default=800)
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='seconds between status polls')
+    parser.add_argument('--output', help='JSON report (default: benchmarks/results/lifecycle-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='an earlier JSON report to compare with')
+    args = parser.parse_args()
+
+    django.setup()
+    site_url = start_stub(StubSiteHandler, args.site_latency_ms)
+    model_url = start_stub(StubModelHandler, args.model_latency_ms)
+    cookies = login()
+
+    # Every job gets a URL of its own: no cache hit and no single-flight follower skips the pipeline
+    run = uuid.uuid4().hex[:8]
+    sizes = [int(size) for size in args.sizes.split(',')]
+    urls = [f"{site_url}/page/{sizes[i % len(sizes)]}/{i}?run={run}" for i in range(args.jobs)]
+
+    processes, api_url, metrics_url = start_stack(args, model_url)
+    try:
+        worker_before, api_before = scrape(metrics_url), scrape(f'{api_url}/metrics/')
+        started = time.perf_counter()
+        results = asyncio.run(run_jobs(api_url, cookies, urls, args.concurrency, args.poll_interval))
+        wall = time.perf_counter() - started
+        worker_after, api_after = scrape(metrics_url), scrape(f'{api_url}/metrics/')
+    finally:
+        stop(processes)
+        from django.contrib.auth import get_user_model
+        get_user_model().objects.filter(username=USERNAME).delete()
+
+    report = build_report(args, results, wall, (worker_before, worker_after), (api_before, api_after))
+    print_report(report)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"lifecycle-{report['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+    print(f"\nReport written to {output}")
+
+    if args.compare:
+        print_comparison(json.loads(Path(args.compare).read_text(encoding='utf-8')), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: per-page cleaning time of every HTML parser backend (see domain/parsers.py).
+
+Run from the project root:
+    python -m benchmarks.bench_parsers
+
+Pages are the golden test pages plus a synthetic 1 MB article.
+Every backend gets the whole page at once (even 'stream'), so this measures pure parse + clean CPU time.
+Backends whose library is not installed are skipped.
+"""
+import os
+import pathlib
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+django.setup()
+
+from benchmarks.bench_extraction import make_page  # noqa: E402
+from domain.parsers import BACKENDS  # noqa: E402
+
+GOLDEN_DIR = pathlib.Path(__file__).resolve().parent.parent / 'domain' / 'tests' / 'golden'
+REPEAT = 20
+
+
+def load_pages() -> list:
+    pages = [(path.stem, path.read_text(encoding='utf-8')) for path in sorted(GOLDEN_DIR.glob('*.html'))]
+    pages.append(('synthetic-1MB', make_page(1024 * 1024)))
+    return pages
+
+
+def measure(backend, html: str, repeat: int) -> float:
+    """Best wall time of `repeat` runs, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        backend.clean(html)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    backends = [backend_class() for backend_class in BACKENDS.values() if backend_class.available()]
+    skipped = [backend_class.name for backend_class in BACKENDS.values() if not backend_class.available()]
+
+    header = f"{'page':>16} | {'size (KB)':>9} | " + ' | '.join(f"{b.name:>11}" for b in backends)
+    print(header)
+    print('-' * len(header))
+
+    for name, html in load_pages():
+        # Big pages need fewer runs to get a stable number
+        repeat = REPEAT if len(html) < 100 * 1024 else 3
+        reference = BACKENDS['html.parser']().clean(html)
+
+        timings = []
+        for backend in backends:
+            assert backend.clean(html) == reference, f"{backend.name} differs from html.parser on {name}"
+            timings.append(measure(backend, html, repeat))
+
+        print(f"{name:>16} | {len(html) / 1024:>9.1f} | " + ' | '.join(f"{t * 1000:>8.2f} ms" for t in timings))
+
+    if skipped:
+        print(f"\nSkipped (not installed): {', '.join(skipped)}")
+
+
+if __name__ == '__main__':
+    main()
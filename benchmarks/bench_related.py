@@ -0,0 +1,129 @@
+"""
+Benchmark: the related-summaries index (domain/related.py, GET /summarize/<id>/related/).
+
+Run from the project root (no database needed: the index is built in a temporary directory):
+    python -m benchmarks.bench_related [--rows 100000] [--users 20] [--queries 200]
+
+Made-up summaries are drawn from a few hundred topics (words of the topic, plus common filler words).
+Prints:
+- add: latency of one more summary (what index_related_task pays per completion) and the rebuild rate
+- search p50 / p99 for a typical user (1/--users of the rows, scanned in full) and for one user
+  owning every row (IVF: only the nearest lists are scanned)
+- recall@10 of the IVF search against a full scan of the same rows
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+
+import django
+
+from benchmarks.bench_api_views import percentile
+from benchmarks.bench_search import make_vocabulary, sentence
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+
+TOPICS = 300
+WORDS_PER_TOPIC = 40
+BATCH_SIZE = 2000
+K = 10
+
+
+def make_summaries(rows: int, users: int, rng) -> list:
+    """(summary_id, owner_id, url, text) rows: 70% topic words, 30% common words"""
+    vocabulary = make_vocabulary(random.Random(7))
+    words = vocabulary[0]
+    topics = [rng.sample(words[1000:], WORDS_PER_TOPIC) for _ in range(TOPICS)]
+    summaries = []
+    for i in range(rows):
+        topic = topics[rng.randrange(TOPICS)]
+        text = ' '.join(rng.choices(topic, k=42)) + ' ' + sentence(rng, vocabulary, 18)
+        summaries.append((uuid.uuid4(), 1 + i % users, f"https://example.com/{'-'.join(rng.sample(topic, 3))}", text))
+    return summaries
+
+
+def timed_searches(index, queries: list, owner_id: int) -> tuple:
+    latencies, results = [], []
+    for vector, summary_id in queries:
+        started = time.perf_counter()
+        results.append(index.search(vector, owner_id, K, exclude=summary_id))
+        latencies.append(time.perf_counter() - started)
+    return latencies, results
+
+
+def recall(approximate: list, exact: list) -> float:
+    found = sum(len({i for i, _ in a} & {i for i, _ in e}) for a, e in zip(approximate, exact))
+    return found / max(1, sum(len(e) for e in exact))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    django.setup()
+    from django.conf import settings
+    from domain.related import RelatedIndex, embed
+
+    config = settings.RELATED_INDEX
+    rng = random.Random(42)
+    summaries = make_summaries(args.rows, args.users, rng)
+    started = time.perf_counter()
+    vectors = [embed(url, text) for _, _, url, text in summaries]
+    embed_seconds = time.perf_counter() - started
+
+    # 1. Bulk build (build_related_index), then single adds (index_related_task)
+    with tempfile.TemporaryDirectory() as path:
+        index = RelatedIndex(path, config['DIMENSIONS'], probes=config['PROBES'], exact_rows=config['EXACT_ROWS'])
+        rows = [(summary_id, owner_id, vector) for (summary_id, owner_id, _, _), vector in zip(summaries, vectors)]
+        build_seconds, add_latencies = build(index, rows)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"{args.rows} summaries: embed {args.rows / embed_seconds:,.0f}/s, bulk add {args.rows / build_seconds:,.0f}/s, "
+              f"{size / 2 ** 20:.0f} MiB on disk, {len(index.arrays['centroids'])} lists")
+        print(f"add one summary: p50 {percentile(add_latencies, 0.5) * 1000:.2f} ms, "
+              f"p99 {percentile(add_latencies, 0.99) * 1000:.2f} ms\n")
+
+        # 2. A typical user: their rows are scanned in full (a reader process maps the files with its own instance)
+        sample = rng.sample(range(args.rows), args.queries)
+        reader = RelatedIndex(path, config['DIMENSIONS'], probes=config['PROBES'], exact_rows=config['EXACT_ROWS'])
+        queries = [(vectors[i], summaries[i][0]) for i in sample if summaries[i][1] == 1]
+        latencies, _ = timed_searches(reader, queries, 1)
+        print(f"{'search':<44} {'p50 ms':>8} {'p99 ms':>8} {'recall@10':>10}")
+        print_row(f"user with {args.rows // args.users} summaries (full scan)", latencies, 1.0)
+
+    # 3. One user owning every row: IVF (nearest lists only) against a full scan
+    with tempfile.TemporaryDirectory() as path:
+        index = RelatedIndex(path, config['DIMENSIONS'], probes=config['PROBES'], exact_rows=0)
+        build(index, [(summary_id, 1, vector) for (summary_id, _, vector) in rows])
+        full_scan = RelatedIndex(path, config['DIMENSIONS'], probes=config['PROBES'], exact_rows=args.rows)
+        queries = [(vectors[i], summaries[i][0]) for i in sample]
+        latencies, approximate = timed_searches(index, queries, 1)
+        full_latencies, exact = timed_searches(full_scan, queries, 1)
+        print_row(f"user with {args.rows} summaries (IVF, {config['PROBES']} lists)", latencies, recall(approximate, exact))
+        print_row(f"user with {args.rows} summaries (full scan)", full_latencies, 1.0)
+
+
+def build(index, rows: list) -> tuple:
+    """Adds all but the last 200 rows in batches, then those one by one. Returns (batch seconds, single add latencies)."""
+    started = time.perf_counter()
+    for start in range(0, len(rows) - 200, BATCH_SIZE):
+        index.add(rows[start:min(start + BATCH_SIZE, len(rows) - 200)])
+    build_seconds = time.perf_counter() - started
+    latencies = []
+    for row in rows[-200:]:
+        started = time.perf_counter()
+        index.add([row])
+        latencies.append(time.perf_counter() - started)
+    return build_seconds, latencies
+
+
+def print_row(name: str, latencies: list, recall_at_k: float):
+    print(f"{name:<44} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} {recall_at_k:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: fair scheduling (domain/scheduling.py) against one FIFO queue, on a simulated clock.
+
+Run from the project root (no database, broker or model needed):
+    python -m benchmarks.bench_scheduling [--import-size 1000] [--users 20] [--window 150] [--job-seconds 10]
+
+One user imports --import-size URLs at t=0; --users other users each submit one URL at a random moment of
+the next --window seconds. Every job holds one pipeline slot (settings.SUMMARY_SCHEDULING['MAX_RUNNING'] of them)
+for an exponentially distributed time of mean --job-seconds.
+Prints, for FIFO (what a single Celery queue does) and for the fair scheduler with the configured caps:
+the wait of the single submissions (p50 / p99 / max) and when the import is done.
+"""
+import argparse
+import heapq
+import os
+import random
+
+import django
+
+from benchmarks.bench_api_views import percentile
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+
+IMPORTER = 1
+
+
+def make_submissions(args, rng) -> list:
+    """(time, user id, lane, [job ids]) in time order"""
+    from domain.scheduling import BULK, INTERACTIVE
+
+    submissions = [(0.0, IMPORTER, BULK, [f"import-{i}" for i in range(args.import_size)])]
+    for user_id in range(2, args.users + 2):
+        submissions.append((rng.uniform(0, args.window), user_id, INTERACTIVE, [f"single-{user_id}"]))
+    return sorted(submissions, key=lambda submission: submission[0])
+
+
+def simulate(submissions: list, durations: dict, slots: int, scheduler=None) -> dict:
+    """Job id -> (submitted at, started at, finished at). Without a scheduler, jobs start in FIFO order."""
+    times = {}
+    events = [(at, 0, index) for index, (at, *_) in enumerate(submissions)]  # (time, 0: submit / 1: finish, ...)
+    heapq.heapify(events)
+    fifo, running = [], set()
+    now = 0.0
+
+    def start(lane, job_ids):
+        for job_id in job_ids:
+            running.add(job_id)
+            times[job_id] = (times[job_id][0], now, now + durations[job_id])
+            heapq.heappush(events, (now + durations[job_id], 1, job_id))
+
+    while events:
+        now, kind, payload = heapq.heappop(events)
+        if kind == 0:
+            _, user_id, lane, job_ids = submissions[payload]
+            times.update((job_id, (now, None, None)) for job_id in job_ids)
+            if scheduler:
+                scheduler.push(lane, user_id, job_ids)
+            else:
+                fifo.extend(job_ids)
+        else:
+            running.discard(payload)
+        if scheduler:
+            scheduler.dispatch(start, lambda job_ids: {job_id for job_id in job_ids if job_id in running})
+        else:
+            free = slots - len(running)
+            start(None, fifo[:free])
+            del fifo[:free]
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--import-size', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--window', type=float, default=150)
+    parser.add_argument('--job-seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    django.setup()
+    from django.conf import settings
+    from domain.scheduling import FairScheduler, LocMemFairQueue
+
+    config = settings.SUMMARY_SCHEDULING
+    rng = random.Random(42)
+    submissions = make_submissions(args, rng)
+    durations = {job_id: rng.expovariate(1 / args.job_seconds) for *_, job_ids in submissions for job_id in job_ids}
+    print(f"{args.import_size} URLs imported at t=0, {args.users} single URLs over {args.window:.0f}s, "
+          f"{config['MAX_RUNNING']} pipeline slots, jobs of {args.job_seconds:.0f}s on average\n")
+    print(f"{'':<16} {'single wait p50':>16} {'p99':>8} {'max':>8} {'import done':>12}")
+
+    for name, scheduler in (
+        ('FIFO', None),
+        ('fair', FairScheduler(
+            LocMemFairQueue(), max_running=config['MAX_RUNNING'], max_running_per_user=config['MAX_RUNNING_PER_USER'],
+            bulk_share=config['BULK_SHARE'], bulk_slice=config['BULK_SLICE'], running_timeout=float('inf'),
+        )),
+    ):
+        times = simulate(submissions, durations, config['MAX_RUNNING'], scheduler)
+        waits = [started - submitted for job_id, (submitted, started, _) in times.items() if job_id.startswith('single')]
+        import_done = max(finished for job_id, (_, _, finished) in times.items() if job_id.startswith('import'))
+        print(f"{name:<16} {percentile(waits, 0.5):>15.1f}s {percentile(waits, 0.99):>7.1f}s "
+              f"{max(waits):>7.1f}s {import_done:>11.0f}s")
+
+
+if __name__ == '__main__':
+    main()
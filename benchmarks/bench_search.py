@@ -0,0 +1,122 @@
+"""
+Benchmark: latency of SummaryQuerySet.search() (GET /my-summaries/search/) over a large history.
+
+Run from the project root, against a migrated database (e.g. inside the web container):
+    python -m benchmarks.bench_search [--rows 200000] [--users 20] [--repeat 50]
+
+Seeds --rows completed summaries (spread over --users users, the benchmark user owning 1/--users of them)
+with made-up URLs, summaries and page text, then times one page (20 results) of typical queries:
+common and rare words, a phrase, a misspelt piece of URL. Prints p50/p99 per query and the plan of the first.
+The seeded rows are deleted at the end.
+"""
+import argparse
+import os
+import random
+import time
+
+import django
+
+from benchmarks.bench_api_views import percentile
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
+
+USERNAME = 'bench-search'
+# Made-up words with Zipf frequencies, like natural text: a handful of them in every page, most in very few
+VOCABULARY_SIZE = 50000
+SYLLABLES = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+HOSTS = ['news.example.com', 'blog.example.org', 'docs.example.io', 'github.com', 'arxiv.org', 'wikipedia.org']
+BATCH_SIZE = 2000
+
+
+def make_vocabulary(rng) -> tuple:
+    """(words, most frequent first; cumulative Zipf weights for rng.choices)"""
+    words = sorted({''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5))) for _ in range(VOCABULARY_SIZE)})
+    rng.shuffle(words)
+    weights, total = [], 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        weights.append(total)
+    return words, weights
+
+
+def sentence(rng, vocabulary, n: int) -> str:
+    words, weights = vocabulary
+    return ' '.join(rng.choices(words, cum_weights=weights, k=n)) + '.'
+
+
+def make_queries(words: list) -> dict:
+    return {
+        'common word': words[20],
+        'rare word': words[5000],
+        'two words': f'{words[300]} {words[800]}',
+        'phrase': f'"{words[3]} {words[4]}"',
+        'fuzzy url': words[100][:-1],  # A URL word with its last letter missing
+    }
+
+
+def seed(rows: int, users: int, vocabulary: tuple):
+    """Returns the benchmark user (owner of every `users`-th row)."""
+    from django.contrib.auth import get_user_model
+    from domain.search import search_document, text_document
+    from interface_layer.models import Summary
+
+    User = get_user_model()
+    User.objects.filter(username__startswith=USERNAME).delete()
+    owners = [User.objects.create_user(username=f'{USERNAME}-{i}') for i in range(users)]
+    rng = random.Random(42)
+    batch = []
+    for i in range(rows):
+        url = f"https://{rng.choice(HOSTS)}/{sentence(rng, vocabulary, 3)[:-1].replace(' ', '-')}-{i}"
+        output_summary = sentence(rng, vocabulary, 60)
+        text = ' '.join(sentence(rng, vocabulary, 20) for _ in range(40))
+        batch.append(Summary(
+            user=owners[i % users], url=url, status='COMPLETED', output_summary=output_summary,
+            search_vector=search_document(url, output_summary), text_vector=text_document(text),
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Summary.objects.bulk_create(batch)
+            batch = []
+            print(f"\rSeeded {i + 1}/{rows}", end='', flush=True)
+    Summary.objects.bulk_create(batch)
+    print()
+    with django.db.connection.cursor() as cursor:
+        cursor.execute('ANALYZE interface_layer_summary')
+    return owners[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from interface_layer.models import Summary
+
+    vocabulary = make_vocabulary(random.Random(7))
+    queries = make_queries(vocabulary[0])
+    user = seed(args.rows, args.users, vocabulary)
+    try:
+        print(f"{args.rows} summaries, {args.rows // args.users} of them the searching user's")
+        print(f"{'query':<28} {'matches':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, query in queries.items():
+            queryset = Summary.objects.filter(user=user).search(query).only('id', 'url', 'status')
+            matches = queryset.count()
+            list(queryset[:20])  # Warm up
+            latencies = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                list(queryset[:21])  # One page, plus the look-ahead row (RankedPagination)
+                latencies.append(time.perf_counter() - started)
+            print(f"{f'{name} ({query})':<28} {matches:>8} {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}")
+
+        queryset = Summary.objects.filter(user=user).search(queries['common word']).only('id', 'url', 'status')[:21]
+        print('\n' + queryset.explain(analyze=True))
+    finally:
+        get_user_model().objects.filter(username__startswith=USERNAME).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,71 @@
 # conftest.py
 import pytest
+from django.db import connections
+from django.db.models.signals import pre_migrate
 from rest_framework.test import APIClient
 from interface_layer.models import Summary
+from domain.cache import reset_summary_cache
+from domain.page_cache import reset_page_cache
+from domain.circuit_breaker import reset_circuit_breakers
+from domain.related import reset_related_index
+from domain.scheduling import reset_fair_scheduler
+from unittest.mock import MagicMock, patch
+
+def create_extensions(app_config, using='default', **kwargs):
+    """
+    The test database is built straight from the models (--nomigrations), so migration 0008 never
+    creates pg_trgm: the trigram index on Summary.url needs its operator class first.
+    """
+    if app_config.label == 'interface_layer':
+        with connections[using].cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+pre_migrate.connect(create_extensions)
+
+@pytest.fixture(autouse=True)
+def fresh_summary_cache():
+    """The locmem summary and page caches live for the whole process; start every test empty"""
+    reset_summary_cache()
+    reset_page_cache()
+    yield
+    reset_summary_cache()
+    reset_page_cache()
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breakers(settings):
+    """Breakers start closed, in memory"""
+    settings.CIRCUIT_BREAKER = {**settings.CIRCUIT_BREAKER, 'BACKEND': 'locmem'}
+    reset_circuit_breakers()
+    yield
+    reset_circuit_breakers()
+
+@pytest.fixture(autouse=True)
+def event_publisher():
+    """Status events go to a fake Redis client; tests can inspect its .publish calls"""
+    publisher = MagicMock()
+    with patch("domain.events._get_publisher", return_value=publisher):
+        yield publisher
+
+@pytest.fixture(autouse=True)
+def no_scrape_throttling(settings):
+    """Scrapes are mocked in tests (no robots.txt to fetch); test_politeness.py turns the scheduler back on"""
+    settings.SCRAPE_POLITENESS = {**settings.SCRAPE_POLITENESS, 'ENABLED': False}
+
+@pytest.fixture(autouse=True)
+def related_index(settings, tmp_path):
+    """Every test gets its own (empty) related-summaries index on disk"""
+    settings.RELATED_INDEX = {**settings.RELATED_INDEX, 'PATH': str(tmp_path / 'related_index')}
+    reset_related_index()
+    yield
+    reset_related_index()
+
+@pytest.fixture(autouse=True)
+def fair_scheduler(settings):
+    """Jobs go through the fair queue, in memory; it lives for the whole process, so start every test empty"""
+    settings.SUMMARY_SCHEDULING = {**settings.SUMMARY_SCHEDULING, 'ENABLED': True, 'BACKEND': 'locmem'}
+    reset_fair_scheduler()
+    yield
+    reset_fair_scheduler()
 
 @pytest.fixture
 def api_client():
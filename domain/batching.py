@@ -0,0 +1,37 @@
+# Packing many short documents into as few model requests as possible
+
+# Gemini's tokenizer averages roughly 4 characters of English text per token.
+# Close enough for budgeting without calling the API's count_tokens endpoint.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap, local estimate of how many model tokens `text` will use.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def pack_documents(documents: list, token_budget: int, max_documents: int) -> list:
+    """
+    Groups documents into packs for summarize_texts().
+
+    `documents` is a list of dicts with at least a 'tokens' key.
+    Each pack stays under `token_budget` tokens and `max_documents` items;
+    a document that is too large on its own gets a pack to itself.
+    Documents keep their original order inside and across packs.
+    """
+    packs = []
+    current, current_tokens = [], 0
+
+    for document in documents:
+        tokens = document['tokens']
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_documents):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(document)
+        current_tokens += tokens
+
+    if current:
+        packs.append(current)
+    return packs
@@ -0,0 +1,268 @@
+# Shared summary cache (lets popular URLs skip the scrape and the Gemini call)
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from domain.canonical import url_key
+from domain.content_store import content_hash
+from domain.services import PROMPT_VERSION
+
+
+class CacheBackend:
+    """
+    Minimal key -> dict store with a per-entry TTL.
+    Every backend must also evict on its own once it holds more than `max_entries` keys.
+    Backends with different `namespace`s can share a Redis server or table without evicting each other's keys.
+    """
+    def __init__(self, max_entries: int, namespace: str = 'summary-cache'):
+        self.max_entries = max_entries
+        self.namespace = namespace
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict, ttl: int):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemBackend(CacheBackend):
+    """
+    In-process LRU. Fast, but every worker process has its own copy,
+    so only use it for local development and tests.
+    """
+    def __init__(self, max_entries: int, namespace: str = 'summary-cache'):
+        super().__init__(max_entries, namespace)
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            # Mark as most recently used
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: int):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            # Evict the least recently used entries
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisBackend(CacheBackend):
+    """
+    Shared across the web and worker containers.
+    Redis expires keys by TTL on its own; a sorted set of "last used" timestamps
+    lets us drop the least recently used keys once we exceed `max_entries`.
+    """
+    def __init__(self, max_entries: int, namespace: str = 'summary-cache', url: str = None):
+        super().__init__(max_entries, namespace)
+        self.KEY_PREFIX = f'{namespace}:'
+        self.INDEX_KEY = f'{namespace}:index'
+        import redis  # Imported lazily so the locmem backend works without a Redis server
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def get(self, key: str):
+        raw = self.client.get(self.KEY_PREFIX + key)
+        if raw is None:
+            self.client.zrem(self.INDEX_KEY, key)
+            return None
+        self.client.zadd(self.INDEX_KEY, {key: time.time()})
+        return json.loads(raw)
+
+    def set(self, key: str, value: dict, ttl: int):
+        pipe = self.client.pipeline()
+        pipe.set(self.KEY_PREFIX + key, json.dumps(value), ex=ttl)
+        pipe.zadd(self.INDEX_KEY, {key: time.time()})
+        pipe.zcard(self.INDEX_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            # Oldest scores first == least recently used
+            evicted = [member for member, _ in self.client.zpopmin(self.INDEX_KEY, overflow)]
+            if evicted:
+                self.client.delete(*[self.KEY_PREFIX + k.decode('utf-8') for k in evicted])
+
+    def delete(self, key: str):
+        pipe = self.client.pipeline()
+        pipe.delete(self.KEY_PREFIX + key)
+        pipe.zrem(self.INDEX_KEY, key)
+        pipe.execute()
+
+    def clear(self):
+        keys = self.client.zrange(self.INDEX_KEY, 0, -1)
+        if keys:
+            self.client.delete(*[self.KEY_PREFIX + k.decode('utf-8') for k in keys])
+        self.client.delete(self.INDEX_KEY)
+
+
+class DatabaseBackend(CacheBackend):
+    """
+    Stores entries in the Postgres table behind SummaryCacheEntry (rows are keyed "<namespace>:<key>").
+    Eviction runs every `EVICT_EVERY` writes instead of on each one, since it needs a COUNT(*).
+    """
+    EVICT_EVERY = 100
+
+    def __init__(self, max_entries: int, namespace: str = 'summary-cache'):
+        super().__init__(max_entries, namespace)
+        self.key_prefix = f'{namespace}:'
+        self._writes = 0
+
+    def get(self, key: str):
+        from interface_layer.models import SummaryCacheEntry
+
+        now = timezone.now()
+        entry = SummaryCacheEntry.objects.filter(key=self.key_prefix + key, expires_at__gt=now).first()
+        if entry is None:
+            return None
+        SummaryCacheEntry.objects.filter(key=self.key_prefix + key).update(last_accessed=now)
+        return entry.value
+
+    def set(self, key: str, value: dict, ttl: int):
+        from interface_layer.models import SummaryCacheEntry
+
+        now = timezone.now()
+        SummaryCacheEntry.objects.update_or_create(
+            key=self.key_prefix + key,
+            defaults={
+                'value': value,
+                'expires_at': now + timedelta(seconds=ttl),
+                'last_accessed': now,
+            },
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        from interface_layer.models import SummaryCacheEntry
+
+        # 1. Expired rows are always garbage, whatever their namespace
+        SummaryCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+
+        # 2. Then trim the least recently used rows of this namespace down to max_entries
+        entries = SummaryCacheEntry.objects.filter(key__startswith=self.key_prefix)
+        overflow = entries.count() - self.max_entries
+        if overflow > 0:
+            stale_keys = entries.order_by('last_accessed').values_list('key', flat=True)[:overflow]
+            SummaryCacheEntry.objects.filter(key__in=list(stale_keys)).delete()
+
+    def delete(self, key: str):
+        from interface_layer.models import SummaryCacheEntry
+        SummaryCacheEntry.objects.filter(key=self.key_prefix + key).delete()
+
+    def clear(self):
+        from interface_layer.models import SummaryCacheEntry
+        SummaryCacheEntry.objects.filter(key__startswith=self.key_prefix).delete()
+
+
+BACKENDS = {
+    'locmem': LocMemBackend,
+    'redis': RedisBackend,
+    'database': DatabaseBackend,
+}
+
+
+class SummaryCache:
+    """
+    Three kinds of keys live in the backend:
+
+    - content:<sha256(clean text)>:<prompt version> -> the finished summary
+    - url:<sha256(normalized url)>:<prompt version> -> the content hash last seen at that URL
+    - segment:<sha256(segment text)>:<prompt version> -> the notes on one segment of a long document
+
+    The URL alias lets make_summary_request answer before anything is scraped,
+    while the content key still matches when two different URLs serve the same text.
+    """
+    def __init__(self, backend: CacheBackend, ttl: int, version: str = PROMPT_VERSION):
+        self.backend = backend
+        self.ttl = ttl
+        self.version = version
+
+    def url_key(self, url: str) -> str:
+        return f"url:{url_key(url)}:{self.version}"
+
+    def content_key(self, digest: str) -> str:
+        return f"content:{digest}:{self.version}"
+
+    def segment_key(self, digest: str) -> str:
+        return f"segment:{digest}:{self.version}"
+
+    def get_for_content(self, text: str):
+        """Returns the cached summary for this exact clean text, or None."""
+        entry = self.backend.get(self.content_key(content_hash(text)))
+        return entry['summary'] if entry else None
+
+    def get_for_url(self, url: str):
+        """Returns the cached summary last produced for this URL, or None."""
+        alias = self.backend.get(self.url_key(url))
+        if alias is None:
+            return None
+        entry = self.backend.get(self.content_key(alias['content_hash']))
+        return entry['summary'] if entry else None
+
+    def get_for_segment(self, text: str):
+        """Returns the cached notes on this segment of a long document, or None."""
+        entry = self.backend.get(self.segment_key(content_hash(text)))
+        return entry['notes'] if entry else None
+
+    def store_segment(self, text: str, notes: str):
+        self.backend.set(self.segment_key(content_hash(text)), {'notes': notes}, self.ttl)
+
+    def store(self, url: str, text: str, summary: str):
+        digest = content_hash(text)
+        self.backend.set(self.content_key(digest), {'summary': summary}, self.ttl)
+        self.backend.set(self.url_key(url), {'content_hash': digest}, self.ttl)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """
+    Returns the process-wide cache configured by settings.SUMMARY_CACHE.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = settings.SUMMARY_CACHE
+                backend_class = BACKENDS[config['BACKEND']]
+                _cache = SummaryCache(backend_class(config['MAX_ENTRIES']), ttl=config['TTL'])
+    return _cache
+
+
+def reset_summary_cache():
+    """Drops the process-wide cache instance (used by tests and after settings change)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,48 @@
+# URL normalization (so "the same page" maps to the same cache / job key)
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only tell the site where the click came from; the page is the same without them
+TRACKING_PARAMS = frozenset((
+    'fbclid', 'gclid', 'gclsrc', 'dclid', 'msclkid', 'yclid', 'twclid', 'ttclid', 'igshid', 'li_fat_id',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'oly_anon_id', 'oly_enc_id', 'vero_id',
+    'wickedid', 'ref_src', 'ref_url', 'spm',
+))
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Returns a stable form of the URL for use as a lookup key.
+    Scheme and host are lower-cased, default ports and fragments are dropped,
+    tracking parameters are removed, the rest of the query is sorted and a trailing slash is trimmed.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower().rstrip('.')
+
+    # Keep the port only when it is not the default one for the scheme
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+
+    # "/article/" and "/article" are the same page on virtually every site; "/" stays "/"
+    path = parts.path.rstrip('/') or '/'
+
+    # utm_source & co. do not change the page; the order of the others does not either
+    params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(name)]
+    query = urlencode(sorted(params))
+
+    # The fragment (#section) never reaches the server, so it cannot change the page
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def url_key(url: str) -> str:
+    """sha256 of the normalized URL: the key of a page in the caches and of its single-flight job."""
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
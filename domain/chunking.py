@@ -0,0 +1,70 @@
+# Splitting long documents into segments for map-reduce summarization
+import re
+import zlib
+
+from domain.batching import CHARS_PER_TOKEN, estimate_tokens
+
+# Clean text is one line of single-space separated words, so sentences are the natural unit
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# A typical English sentence, in tokens; only used to size the boundary probability
+AVERAGE_SENTENCE_TOKENS = 25
+
+
+def split_sentences(text: str) -> list:
+    return [sentence for sentence in SENTENCE_END.split(text) if sentence]
+
+
+def split_oversized(sentence: str, max_tokens: int) -> list:
+    """Cuts a sentence longer than a whole segment (tables, code, run-on text), at a space when there is one."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(' ', 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(sentence[:cut])
+        sentence = sentence[cut:].lstrip(' ')
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def is_boundary(sentence: str, divisor: int) -> bool:
+    # crc32, not hash(): it must give the same answer in every worker process
+    return zlib.crc32(sentence.encode('utf-8')) % divisor == 0
+
+
+def split_segments(text: str, max_tokens: int) -> list:
+    """
+    Splits `text` into segments of at most `max_tokens` tokens, on sentence boundaries.
+
+    Boundaries are content-defined: once a segment holds a quarter of the budget, it ends after
+    any sentence whose checksum hits 0 mod `divisor` (or when the next sentence would not fit).
+    So an edit in one place only moves the boundaries around it; every other segment comes out
+    byte-identical and its summary is served from the segment cache.
+    """
+    min_tokens = max_tokens // 4
+    # Expect a boundary roughly halfway between min_tokens and max_tokens
+    divisor = max(2, (max_tokens // 2 - min_tokens) // AVERAGE_SENTENCE_TOKENS)
+
+    segments = []
+    current, current_tokens = [], 0
+    for sentence in split_sentences(text):
+        for piece in ([sentence] if estimate_tokens(sentence) <= max_tokens else split_oversized(sentence, max_tokens)):
+            tokens = estimate_tokens(piece) + 1
+            # 1. The budget is a hard limit
+            if current and current_tokens + tokens > max_tokens:
+                segments.append(' '.join(current))
+                current, current_tokens = [], 0
+
+            current.append(piece)
+            current_tokens += tokens
+
+            # 2. Content-defined cut
+            if current_tokens >= min_tokens and is_boundary(piece, divisor):
+                segments.append(' '.join(current))
+                current, current_tokens = [], 0
+
+    if current:
+        segments.append(' '.join(current))
+    return segments
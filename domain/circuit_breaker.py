@@ -0,0 +1,239 @@
+# Circuit breakers around the model API and scraped sites, shared by every worker
+import threading
+import time
+
+from django.conf import settings
+
+from domain.errors import CircuitOpenError, TransientError
+
+
+class CircuitStore:
+    """
+    Breaker state for one name:
+    - failures: transient failures counted in a fixed window of `window` seconds
+    - open: set for `reset_timeout` seconds when the circuit trips; calls are refused meanwhile
+    - tripped: stays set until a probe succeeds (half-open while `open` has expired)
+    - probe: one caller at a time may test a half-open circuit
+    """
+    def state(self, name: str) -> tuple:
+        """(open_for, tripped, probe_for): seconds left on `open` / `probe` (0 when unset)."""
+        raise NotImplementedError
+
+    def add_failure(self, name: str, window: float) -> int:
+        raise NotImplementedError
+
+    def trip(self, name: str, reset_timeout: float):
+        raise NotImplementedError
+
+    def try_probe(self, name: str, probe_timeout: float) -> bool:
+        raise NotImplementedError
+
+    def release_probe(self, name: str):
+        raise NotImplementedError
+
+    def close(self, name: str):
+        raise NotImplementedError
+
+
+class LocMemCircuitStore(CircuitStore):
+    """Per-process state: local development and tests only."""
+    def __init__(self):
+        self._keys = {}  # (name, key) -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _get(self, name, key, now):
+        value, expires_at = self._keys.get((name, key), (None, None))
+        if expires_at is not None and expires_at <= now:
+            self._keys.pop((name, key), None)
+            return None, None
+        return value, expires_at
+
+    def state(self, name: str) -> tuple:
+        with self._lock:
+            now = time.monotonic()
+            open_value, open_until = self._get(name, 'open', now)
+            tripped, _ = self._get(name, 'tripped', now)
+            probe_value, probe_until = self._get(name, 'probe', now)
+            return (
+                open_until - now if open_value else 0,
+                bool(tripped),
+                probe_until - now if probe_value else 0,
+            )
+
+    def add_failure(self, name: str, window: float) -> int:
+        with self._lock:
+            now = time.monotonic()
+            count, expires_at = self._get(name, 'failures', now)
+            count = (count or 0) + 1
+            self._keys[(name, 'failures')] = (count, expires_at or now + window)
+            return count
+
+    def trip(self, name: str, reset_timeout: float):
+        with self._lock:
+            self._keys[(name, 'open')] = (True, time.monotonic() + reset_timeout)
+            self._keys[(name, 'tripped')] = (True, None)
+            for key in ('failures', 'probe'):
+                self._keys.pop((name, key), None)
+
+    def try_probe(self, name: str, probe_timeout: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._get(name, 'probe', now)[0]:
+                return False
+            self._keys[(name, 'probe')] = (True, now + probe_timeout)
+            return True
+
+    def release_probe(self, name: str):
+        with self._lock:
+            self._keys.pop((name, 'probe'), None)
+
+    def close(self, name: str):
+        with self._lock:
+            for key in ('failures', 'open', 'tripped', 'probe'):
+                self._keys.pop((name, key), None)
+
+
+class RedisCircuitStore(CircuitStore):
+    """State shared by every worker, so one overloaded endpoint is seen as such by the whole fleet."""
+    KEY_PREFIX = 'circuit:'
+
+    def __init__(self, url: str = None):
+        import redis  # Imported lazily so the locmem backend works without a Redis server
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+
+    def _key(self, name, key):
+        return f"{self.KEY_PREFIX}{name}:{key}"
+
+    def state(self, name: str) -> tuple:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.pttl(self._key(name, 'open'))
+        pipe.exists(self._key(name, 'tripped'))
+        pipe.pttl(self._key(name, 'probe'))
+        open_ms, tripped, probe_ms = pipe.execute()
+        # PTTL is -2 for a missing key
+        return max(0, open_ms) / 1000, bool(tripped), max(0, probe_ms) / 1000
+
+    def add_failure(self, name: str, window: float) -> int:
+        key = self._key(name, 'failures')
+        pipe = self.client.pipeline()
+        pipe.incr(key)
+        # NX: the window starts with the first failure, later ones do not extend it
+        pipe.expire(key, max(1, int(window)), nx=True)
+        count, _ = pipe.execute()
+        return count
+
+    def trip(self, name: str, reset_timeout: float):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(name, 'open'), 1, px=max(1, int(reset_timeout * 1000)))
+        pipe.set(self._key(name, 'tripped'), 1)
+        pipe.delete(self._key(name, 'failures'), self._key(name, 'probe'))
+        pipe.execute()
+
+    def try_probe(self, name: str, probe_timeout: float) -> bool:
+        return bool(self.client.set(self._key(name, 'probe'), 1, nx=True, px=max(1, int(probe_timeout * 1000))))
+
+    def release_probe(self, name: str):
+        self.client.delete(self._key(name, 'probe'))
+
+    def close(self, name: str):
+        self.client.delete(*(self._key(name, key) for key in ('failures', 'open', 'tripped', 'probe')))
+
+
+CIRCUIT_BACKENDS = {
+    'locmem': LocMemCircuitStore,
+    'redis': RedisCircuitStore,
+}
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. `failure_threshold` transient failures within `window` seconds trip it.
+    Open: calls are refused with CircuitOpenError for `reset_timeout` seconds, without touching the endpoint.
+    Half-open: one probe call goes through; success closes the circuit, failure opens it again.
+
+    Successes cost one read while the circuit is closed: only failures and probes write.
+    """
+    def __init__(self, name: str, store: CircuitStore, failure_threshold: int, window: float,
+                 reset_timeout: float, probe_timeout: float):
+        self.name = name
+        self.store = store
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError if the call must not be made. Returns True if the call is the half-open probe."""
+        open_for, tripped, probe_for = self.store.state(self.name)
+        if open_for > 0:
+            raise CircuitOpenError(self.name, open_for)
+        if not tripped:
+            return False
+        if probe_for > 0 or not self.store.try_probe(self.name, self.probe_timeout):
+            raise CircuitOpenError(self.name, probe_for or self.probe_timeout)
+        return True
+
+    def call(self, fn, classify, probe: bool = None):
+        """
+        Runs `fn()` unless the circuit is open, and raises whatever it raises through `classify` (domain/errors.py).
+        Only transient errors count as failures: a 404 or a refused prompt still proves the endpoint is up.
+        Pass `probe` if before_call() was already made by the caller.
+        """
+        if probe is None:
+            probe = self.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            error = classify(e)
+            if isinstance(error, TransientError):
+                self.record_failure(probe)
+            else:
+                self.record_success(probe)
+            if error is e:
+                raise
+            raise error from e
+        self.record_success(probe)
+        return result
+
+    def cancel(self, probe: bool):
+        """The call cleared by before_call() is not made after all: a probe goes back for the next caller."""
+        if probe:
+            self.store.release_probe(self.name)
+
+    def record_success(self, probe: bool = False):
+        if probe:
+            self.store.close(self.name)
+
+    def record_failure(self, probe: bool = False):
+        if probe or self.store.add_failure(self.name, self.window) >= self.failure_threshold:
+            print(f"Circuit '{self.name}' is open for {self.reset_timeout}s", flush=True)
+            self.store.trip(self.name, self.reset_timeout)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """A breaker for `name` ('gemini', 'scrape:<host>'), configured by settings.CIRCUIT_BREAKER."""
+    global _store
+    config = settings.CIRCUIT_BREAKER
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CIRCUIT_BACKENDS[config['BACKEND']]()
+    return CircuitBreaker(
+        name,
+        _store,
+        failure_threshold=config['FAILURE_THRESHOLD'],
+        window=config['WINDOW'],
+        reset_timeout=config['RESET_TIMEOUT'],
+        probe_timeout=config['PROBE_TIMEOUT'],
+    )
+
+
+def reset_circuit_breakers():
+    """Drops the process-wide state (used by tests and after settings change)."""
+    global _store
+    with _store_lock:
+        _store = None
@@ -0,0 +1,122 @@
+# Prompt compression: the clean text still holds what the tag stripping could not tell from the article (cookie
+# banners, "Share this story", breadcrumbs, blocks repeated on every page). It is dropped before the text goes
+# into a prompt, and a text slightly over the token budget is fitted to it by dropping its least dense sentences.
+# Clean text has no line breaks left: the blocks are its sentences.
+import re
+
+from django.conf import settings
+
+from domain.batching import CHARS_PER_TOKEN, estimate_tokens
+from domain.chunking import split_sentences
+from domain.related import STOP_WORDS
+from domain.telemetry import record_prompt_compression
+
+WORD_RE = re.compile(r'[^\W\d_]+')
+# Repeats are told apart by their numbers too ("Sales rose 5% in 2024." is not "Sales rose 7% in 2025.")
+KEY_RE = re.compile(r'\w+')
+# Function words: prose is full of them, menus and lists of names are not (jusText's stop-word density)
+FUNCTION_WORDS = (STOP_WORDS - {'www', 'http', 'https', 'com', 'org', 'net', 'html'}) | {'a', 'i'}
+# Share of function words from which a block reads as prose
+PROSE_FUNCTION_WORDS = 0.3
+# Under this share over the whole text, it is not English and function words are not counted at all
+MIN_ENGLISH_FUNCTION_WORDS = 0.1
+
+# Separators of link lists and breadcrumbs ("Home › World › Europe", "About | Careers | Contact"), and links
+SEPARATOR_RE = re.compile(r'(?<!\S)[|›»·•/>]+(?!\S)')
+URL_RE = re.compile(r'\w+://\S+|\bwww\.\S+|\S+@\S+\.\w+')
+BOILERPLATE_RE = re.compile(
+    r'©|\b(?:copyright \d{4}|we use cookies|accept (?:all )?cookies|cookie (?:policy|settings|preferences)|'
+    r'privacy policy|terms (?:of (?:use|service)|and conditions)|all rights reserved|'
+    r'(?:subscribe to|sign up for) (?:our|the) newsletter|(?:sign|log) in to (?:comment|continue|read)|'
+    r'skip to (?:main )?content|share (?:this (?:article|story|page)|on (?:facebook|twitter|x|linkedin|whatsapp))|'
+    r'follow us on|click here|advertisement)\b',
+    re.IGNORECASE,
+)
+# Longer blocks naming boilerplate are article text (a story about privacy policies)
+BOILERPLATE_MAX_WORDS = 30
+
+
+def compress(text: str, token_budget: int, max_trim_ratio: float) -> tuple:
+    """
+    Returns (compressed text, {reason: estimated tokens removed}):
+
+    1. Repeated blocks (every "Share this article." but the first), short blocks of boilerplate and link lists go.
+    2. If the rest is over `token_budget` by at most `max_trim_ratio` of it, the blocks of lowest density go
+       until it fits (among equals, the later ones: the lede matters most). Longer texts are kept whole
+       for the map-reduce pipeline.
+
+    Kept blocks keep their order. The text comes back unchanged when nothing was dropped, or everything would be.
+    """
+    removed = {}
+    kept = []
+    seen = set()
+    for block in split_sentences(text):
+        words = WORD_RE.findall(block.lower())
+        reason = junk_reason(block, words, seen)
+        if reason:
+            removed[reason] = removed.get(reason, 0) + estimate_tokens(block) + 1
+        else:
+            kept.append((block, words))
+
+    # Fit the budget (counted in characters, like estimate_tokens(): the blocks are joined by one space)
+    chars = sum(len(block) + 1 for block, _ in kept) - 1
+    excess = chars - token_budget * CHARS_PER_TOKEN
+    if 0 < excess <= chars * max_trim_ratio:
+        all_words = [word for _, words in kept for word in words]
+        english = sum(word in FUNCTION_WORDS for word in all_words) >= MIN_ENGLISH_FUNCTION_WORDS * len(all_words)
+        order = sorted(range(len(kept)), key=lambda i: (block_density(*kept[i], english=english), -i))
+        dropped = set()
+        for i in order:
+            if excess <= 0:
+                break
+            dropped.add(i)
+            excess -= len(kept[i][0]) + 1
+            removed['budget'] = removed.get('budget', 0) + estimate_tokens(kept[i][0]) + 1
+        kept = [block for i, block in enumerate(kept) if i not in dropped]
+
+    if not removed or not kept:
+        return text, {}
+    return ' '.join(block for block, _ in kept), removed
+
+
+def compress_for_prompt(text: str) -> str:
+    """compress() with settings.PROMPT_COMPRESSION; what it saved is counted in the metrics and the current span."""
+    config = settings.PROMPT_COMPRESSION
+    if not config['ENABLED']:
+        return text
+    compressed, removed = compress(text, config['TOKEN_BUDGET'], config['MAX_TRIM_RATIO'])
+    record_prompt_compression(estimate_tokens(text), estimate_tokens(compressed), removed)
+    return compressed
+
+
+def junk_reason(block: str, words: list, seen: set):
+    """Why `block` is dropped whatever the budget ('repeated', 'boilerplate', 'link_list'), or None."""
+    noise = len(SEPARATOR_RE.findall(block)) + len(URL_RE.findall(block))
+    if not words:
+        # Numbers alone stay ("1." of a numbered list); separators alone do not
+        return 'link_list' if noise else None
+    key = ' '.join(KEY_RE.findall(block.lower()))
+    if key in seen:
+        return 'repeated'
+    seen.add(key)
+    if len(words) <= BOILERPLATE_MAX_WORDS and BOILERPLATE_RE.search(block):
+        return 'boilerplate'
+    if noise * 2 >= len(words):
+        return 'link_list'
+    return None
+
+
+def block_density(block: str, words: list, english: bool = True) -> float:
+    """
+    Readability-style content score of a block: 1 point, plus one per comma, plus one per 100 characters
+    (at most 3), scaled down by its share of separators and links and, in English, by a lack of function words.
+    Sentences of prose score 1 or more; lists of names, bylines and captions less.
+    """
+    if not words:
+        return 0.0
+    score = 1 + block.count(',') + min(3, len(block) // 100)
+    noise = len(SEPARATOR_RE.findall(block)) + len(URL_RE.findall(block))
+    score *= max(0.0, 1 - noise / len(words))
+    if english:
+        score *= min(1.0, sum(word in FUNCTION_WORDS for word in words) / len(words) / PROSE_FUNCTION_WORDS)
+    return score
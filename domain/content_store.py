@@ -0,0 +1,89 @@
+# Deduplicated, compressed storage for scraped page text
+import hashlib
+import zlib
+from datetime import timedelta
+
+try:
+    import zstandard
+except ImportError:  # zlib still works, just with a worse ratio
+    zstandard = None
+
+from django.utils import timezone
+
+from domain.near_duplicates import bands, simhash
+
+# zstd's default level: ~3-4x smaller than the raw text and far faster than zlib
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+CODEC_ZSTD = 'zstd'
+CODEC_ZLIB = 'zlib'
+CODEC_CHOICES = [(CODEC_ZSTD, 'Zstandard'), (CODEC_ZLIB, 'zlib')]
+
+
+def content_hash(text: str) -> str:
+    """sha256 of the text: the blob's primary key, also used by the summary cache."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress(text: str) -> tuple:
+    """
+    Returns (codec, compressed bytes). The codec is stored next to the data,
+    so a blob written on a machine without zstandard can still be read everywhere.
+    """
+    raw = text.encode('utf-8')
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("This content is zstd-compressed; install the 'zstandard' package to read it")
+        raw = zstandard.ZstdDecompressor().decompress(bytes(data))
+    elif codec == CODEC_ZLIB:
+        raw = zlib.decompress(bytes(data))
+    else:
+        raise ValueError(f"Unknown content codec {codec!r}")
+    return raw.decode('utf-8')
+
+
+def save_content(text: str):
+    """
+    Stores `text` once and returns its ContentBlob.
+    Identical text (the same page summarized by many users) always maps to the same row.
+    """
+    from interface_layer.models import ContentBlob
+
+    digest = content_hash(text)
+    blob = ContentBlob.objects.filter(digest=digest).first()
+    if blob is not None:
+        return blob
+
+    # 1. Only compress (and fingerprint, for near-duplicates) when the text is new
+    codec, data = compress(text)
+    fingerprint = simhash(text)
+
+    # 2. Another worker may insert the same text concurrently; both end up with the same row
+    blob, _ = ContentBlob.objects.get_or_create(
+        digest=digest,
+        defaults={
+            'codec': codec, 'data': data, 'size': len(text),
+            'simhash': fingerprint, 'simhash_bands': bands(fingerprint) if fingerprint is not None else None,
+        },
+    )
+    return blob
+
+
+def delete_unreferenced_content(min_age: timedelta = timedelta(hours=1)) -> int:
+    """
+    Removes blobs that no Summary points to any more (e.g. after users deleted their history).
+    Blobs younger than `min_age` are kept: a worker saves the blob before it attaches it to its summary.
+    Returns how many were deleted. Run it from a periodic job (manage.py delete_unreferenced_content),
+    not from request handling.
+    """
+    from interface_layer.models import ContentBlob
+
+    deleted, _ = ContentBlob.objects.filter(summaries__isnull=True, created_at__lt=timezone.now() - min_age).delete()
+    return deleted
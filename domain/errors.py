@@ -0,0 +1,88 @@
+# Typed errors raised by ResearchAgent, so the tasks can tell "try again later" from "give up"
+import httpx
+
+# HTTP statuses that mean "overloaded / try again", for web pages and the model API alike
+TRANSIENT_STATUS_CODES = frozenset((408, 425, 429, 500, 502, 503, 504))
+
+
+class ResearchAgentError(Exception):
+    """Base class of everything ResearchAgent raises on purpose."""
+
+
+class TransientError(ResearchAgentError):
+    """
+    Worth retrying: throttling, timeouts, 5xx. `retry_after` (seconds) is the server's hint, if it gave one.
+    The Celery tasks retry these with exponential backoff (autoretry_for).
+    """
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ScrapeError(ResearchAgentError):
+    """The page cannot be scraped (404, 403, not HTML...). Retrying will not help."""
+
+
+class TransientScrapeError(TransientError):
+    """The site is slow, down or throttling us."""
+
+
+class SummaryError(ResearchAgentError):
+    """The model refused the request or answered with nothing usable. Retrying will not help."""
+
+
+class MissingCredentialsError(SummaryError):
+    def __init__(self):
+        super().__init__("Could not locate 'google_credentials' in Docker secrets.")
+
+
+class TransientSummaryError(TransientError):
+    """The model endpoint is throttling us (429) or overloaded (5xx), or the call timed out."""
+
+
+class CircuitOpenError(ResearchAgentError):
+    """
+    The circuit breaker for `name` is open: the endpoint failed too often and gets a break.
+    Nothing was sent. The tasks park themselves for `retry_after` seconds instead of failing.
+    """
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open: retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def retry_after_header(response) -> float:
+    """Seconds from a Retry-After header (the delay form only), or None."""
+    try:
+        return float(response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def classify_scrape_error(error: Exception, url: str) -> ResearchAgentError:
+    if isinstance(error, ResearchAgentError):
+        return error
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        if code in TRANSIENT_STATUS_CODES:
+            return TransientScrapeError(f"{url} answered {code}", retry_after_header(error.response))
+        return ScrapeError(f"{url} answered {code}")
+    if isinstance(error, httpx.TransportError):  # Timeouts, refused connections, DNS...
+        return TransientScrapeError(f"Could not reach {url}: {error!r}")
+    return ScrapeError(f"Could not scrape {url}: {error}")
+
+
+def classify_model_error(error: Exception) -> ResearchAgentError:
+    from google.genai import errors as genai_errors
+
+    if isinstance(error, ResearchAgentError):
+        return error
+    if isinstance(error, genai_errors.APIError):
+        if error.code in TRANSIENT_STATUS_CODES:
+            return TransientSummaryError(
+                f"Model API error {error.code}: {error.message}", retry_after_header(error.response),
+            )
+        return SummaryError(f"Model API error {error.code}: {error.message}")
+    if isinstance(error, httpx.TransportError):
+        return TransientSummaryError(f"Could not reach the model API: {error!r}")
+    return SummaryError(f"AI generation failed: {error}")
@@ -0,0 +1,230 @@
+# Live updates: workers publish status changes and summary chunks to Redis, the web process pushes them to browsers (SSE)
+import asyncio
+import json
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+# One channel per user, so a dashboard only hears about its own jobs
+CHANNEL_PREFIX = 'summary-events:'
+# Events a slow dashboard has not read yet; older ones are dropped (it can always re-fetch the status)
+QUEUE_SIZE = 100
+# Seconds to wait before reconnecting to Redis after the subscription dropped
+RECONNECT_DELAY = 1
+# How long a new listener waits for the hub's subscription to be live before going on anyway
+SUBSCRIBE_TIMEOUT = 5
+
+# Token streams: one Redis stream per summary, so a viewer that connects late still gets every chunk
+STREAM_PREFIX = 'summary-stream:'
+STREAM_TTL = 600  # seconds; the finished text is in the database anyway
+STREAM_BLOCK_MS = 5000  # how long a reader waits for new chunks before reporting a quiet period
+
+
+def channel_for(user_id) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+# ==========================================
+# PUBLISHING (Celery workers)
+# ==========================================
+
+_publisher = None
+
+
+def _get_publisher():
+    global _publisher
+    if _publisher is None:
+        import redis  # Imported lazily so tests and tools can run without a Redis server
+        # redis-py notices a fork and opens fresh connections in the child
+        _publisher = redis.Redis.from_url(settings.REDIS_URL)
+    return _publisher
+
+
+def publish_status(user_id, summary_id, status: str):
+    """
+    Announces a status transition (PROCESSING, COMPLETED, FAILED) of one summary.
+    Best effort: a Redis hiccup must never fail the job itself; dashboards can still re-fetch.
+    """
+    message = json.dumps({'id': str(summary_id), 'status': status})
+    try:
+        _get_publisher().publish(channel_for(user_id), message)
+    except Exception as e:
+        print(f"Could not publish {status} for {summary_id}: {e}", flush=True)
+
+
+def stream_key(summary_id) -> str:
+    return f"{STREAM_PREFIX}{summary_id}"
+
+
+class SummaryStreamWriter:
+    """
+    Appends the chunks of one summary to its Redis stream while the model is still generating.
+    Best effort like publish_status(): after a Redis error it stops writing, the job carries on.
+    """
+    def __init__(self, summary_id):
+        self.key = stream_key(summary_id)
+        self.failed = False
+
+    def write(self, text: str):
+        self._add({'chunk': text})
+
+    def restart(self):
+        """A retried attempt starts over: readers drop what they have assembled so far."""
+        self._add({'reset': ''})
+
+    def finish(self, status: str):
+        """Marks the end of the stream. Call it AFTER the final text is saved to the database."""
+        self._add({'done': status})
+
+    def _add(self, fields: dict):
+        if self.failed:
+            return
+        try:
+            pipe = _get_publisher().pipeline()
+            pipe.xadd(self.key, fields)
+            pipe.expire(self.key, STREAM_TTL)
+            pipe.execute()
+        except Exception as e:
+            self.failed = True
+            print(f"Could not relay summary stream {self.key}: {e}", flush=True)
+
+
+# ==========================================
+# SUBSCRIBING (web process, async)
+# ==========================================
+
+class EventHub:
+    """
+    Fans Redis messages out to every dashboard connected to this web process.
+
+    A single pattern subscription (summary-events:*) serves all of them, instead of one Redis
+    connection per open browser tab. Each listener gets its own bounded asyncio.Queue.
+    """
+    def __init__(self, url: str = None):
+        self.url = url or settings.REDIS_URL
+        self._listeners = defaultdict(set)  # user id (str) -> queues
+        self._reader = None
+        self._subscribed = asyncio.Event()
+
+    def add_listener(self, user_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._listeners[str(user_id)].add(queue)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.get_running_loop().create_task(self._read_forever())
+        return queue
+
+    async def wait_subscribed(self, timeout: float = SUBSCRIBE_TIMEOUT) -> bool:
+        """True once messages published from now on are guaranteed to reach the listeners."""
+        try:
+            await asyncio.wait_for(self._subscribed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def remove_listener(self, user_id, queue: asyncio.Queue):
+        queues = self._listeners.get(str(user_id))
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._listeners[str(user_id)]
+
+    def dispatch(self, channel: str, data):
+        """Hands one pub/sub message to every listener of that user."""
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        user_id = channel[len(CHANNEL_PREFIX):]
+        queues = self._listeners.get(user_id)
+        if not queues:
+            return
+
+        event = json.loads(data)
+        for queue in list(queues):
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest event rather than block everyone else
+            queue.put_nowait(event)
+
+    async def _read_forever(self):
+        import redis.asyncio as aioredis
+
+        while True:
+            client = aioredis.Redis.from_url(self.url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self.dispatch(message['channel'], message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Summary event subscription lost: {e}", flush=True)
+            finally:
+                self._subscribed.clear()
+                await pubsub.aclose()
+                await client.aclose()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+# One hub per event loop (uvicorn runs one loop per worker process)
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_event_hub() -> EventHub:
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = EventHub()
+        _hubs[loop] = hub
+    return hub
+
+
+@asynccontextmanager
+async def listen(user_id):
+    """
+    async with listen(user.id) as queue: ... -> each `await queue.get()` is one {'id', 'status'} event.
+    Returns once the subscription is live, so anything read from the database afterwards
+    plus the events that follow gives a complete picture.
+    """
+    hub = get_event_hub()
+    queue = hub.add_listener(user_id)
+    try:
+        await hub.wait_subscribed()
+        yield queue
+    finally:
+        hub.remove_listener(user_id, queue)
+
+
+async def read_summary_stream(summary_id, block_ms: int = STREAM_BLOCK_MS):
+    """
+    Replays the summary's stream from the start, then follows it live. Yields:
+
+    - ('chunk', text) for every generated piece
+    - ('reset', '') when a retried job starts its summary over
+    - ('done', status) once, at the end
+    - None after `block_ms` without news (the caller may re-check the database or send a keep-alive)
+    """
+    import redis.asyncio as aioredis
+
+    key = stream_key(summary_id)
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    last_id = '0'
+    try:
+        while True:
+            reply = await client.xread({key: last_id}, block=block_ms, count=100)
+            if not reply:
+                yield None
+                continue
+            for entry_id, fields in reply[0][1]:
+                last_id = entry_id
+                if b'chunk' in fields:
+                    yield 'chunk', fields[b'chunk'].decode('utf-8')
+                elif b'reset' in fields:
+                    yield 'reset', ''
+                else:
+                    yield 'done', fields[b'done'].decode('utf-8')
+                    return
+    finally:
+        await client.aclose()
@@ -0,0 +1,271 @@
+# HTML -> clean text (the "cleaning phase" of the scraper)
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+# Default limit of the cleaning functions (~15,000 characters, approx 3000 words).
+# The scraper asks for much more (settings.SUMMARY_MAP_REDUCE): long texts are map-reduced, not cut.
+MAX_CONTENT_CHARS = 15000
+
+# Javascript, css, and structural junk: their whole subtree is dropped
+SKIPPED_TAGS = ("script", "style", "header", "footer", "nav", "aside")
+
+
+def clean_html(html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+    """
+    Reference implementation: builds the full BeautifulSoup tree, then cleans it.
+    StreamingTextExtractor must produce exactly the same text.
+    """
+    # 1. Parse HTML
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 2. THE CLEANING PHASE
+    # Remove javascript, css, and structural junk
+    for script in soup(list(SKIPPED_TAGS)):
+        script.extract() # Rips the tag out of the tree
+
+    # 3. Extract Text
+    # get_text() joins all text, using a space as separator
+    text = soup.get_text(separator=' ')
+
+    # 4. Normalize Whitespace
+    # "Hello      World" -> "Hello World"
+    clean_text = ' '.join(normalize_lines(text))
+
+    # 5. Truncate
+    return clean_text[:limit]
+
+
+def normalize_lines(text: str) -> list:
+    """
+    Splits text into whitespace-free phrases: one per line, further split on double spaces.
+    Joining the result with ' ' gives the normalized text.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return [chunk for chunk in chunks if chunk]
+
+
+# ==========================================
+# STREAMING EXTRACTOR
+# ==========================================
+
+# Elements that never have children (BeautifulSoup closes them immediately)
+VOID_TAGS = frozenset((
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr',
+))
+# Text inside these is stored by BeautifulSoup as a special string type that get_text() ignores
+HIDDEN_TEXT_TAGS = frozenset(('rt', 'rp', 'template', 'script', 'style'))
+# Whitespace-only text is kept as-is inside these
+PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+
+ASCII_SPACES = frozenset('\x20\x0a\x09\x0c\x0d')
+# Every character str.splitlines() treats as a line boundary
+LINE_BREAK = re.compile('[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    Incremental version of clean_html(): feed() it the page chunk by chunk as it downloads.
+
+    Skipped subtrees are dropped while parsing (no tree is ever built), and text is normalized
+    line by line as soon as each line is complete. Once `limit` characters of clean text exist,
+    feed() returns True so the caller can stop downloading.
+    """
+    def __init__(self, limit: int = MAX_CONTENT_CHARS):
+        # Character references are decoded by hand, the same way BeautifulSoup does it
+        super().__init__(convert_charrefs=False)
+        self.limit = limit
+        self.done = False
+
+        # Open elements, like BeautifulSoup's tag stack (plus per-name counts for O(1) checks)
+        self._stack = []
+        self._open = {}
+        # Void elements written as <br>; a later </br> for them is silently ignored
+        self._already_closed = []
+
+        # The text node currently being read (several handle_data calls can make up one node)
+        self._string_parts = []
+        self._has_strings = False
+
+        # Raw text of the current, still incomplete, line
+        self._line_parts = []
+        self._line_length = 0
+        self._next_check = limit
+
+        # Finished output
+        self._chunks = []
+        self._length = 0
+
+    # --- Public API ---
+
+    def feed(self, data: str) -> bool:
+        """Parses the next piece of the document. Returns True once the character budget is filled."""
+        if not self.done:
+            super().feed(data)
+        return self.done
+
+    def result(self) -> str:
+        """Finishes parsing and returns the clean text (same as clean_html() on the whole page)."""
+        if not self.done:
+            self.close()
+            self._end_string()
+            self._flush_line(final=True)
+        return ' '.join(self._chunks)[:self.limit]
+
+    # --- HTMLParser callbacks ---
+
+    def handle_starttag(self, tag, attrs):
+        self._end_string()
+        if tag in VOID_TAGS:
+            self._already_closed.append(tag)
+        else:
+            self._stack.append(tag)
+            self._open[tag] = self._open.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag, attrs):
+        # <tag/>: opened and closed at once, so it can never contain anything
+        self._end_string()
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            # Redundant </br> for a <br> that was already closed: not even a text boundary
+            self._already_closed.remove(tag)
+            return
+        self._end_string()
+        if self._open.get(tag):
+            # Close everything up to (and including) the most recent <tag>
+            while self._stack:
+                name = self._stack.pop()
+                self._open[name] -= 1
+                if name == tag:
+                    break
+
+    def handle_data(self, data):
+        if not self._inside(SKIPPED_TAGS) and not self._inside(HIDDEN_TEXT_TAGS):
+            self._string_parts.append(data)
+
+    def handle_charref(self, name):
+        self.handle_data(decode_charref(name))
+
+    def handle_entityref(self, name):
+        self.handle_data(html5.get(name + ';', '&' + name))
+
+    def handle_comment(self, data):
+        self._end_string()
+
+    def handle_decl(self, decl):
+        self._end_string()
+
+    def handle_pi(self, data):
+        self._end_string()
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> counts as text; anything else is a declaration
+        self._end_string()
+        if data.upper().startswith('CDATA[') and not self._inside(SKIPPED_TAGS):
+            self._string_parts.append(data[len('CDATA['):])
+            self._end_string()
+
+    # --- Internals ---
+
+    def _inside(self, tags) -> bool:
+        return any(self._open.get(tag) for tag in tags)
+
+    def _end_string(self):
+        """A text node just ended: add it to the current line, separated by ' ' like get_text()."""
+        if not self._string_parts or self.done:
+            self._string_parts = []
+            return
+        string = ''.join(self._string_parts)
+        self._string_parts = []
+
+        if not self._inside(PRESERVE_WHITESPACE_TAGS):
+            string = collapse_blank_string(string)
+
+        if self._has_strings:
+            string = ' ' + string
+        self._has_strings = True
+        self._line_parts.append(string)
+        self._line_length += len(string)
+
+        if LINE_BREAK.search(string):
+            self._flush_line()
+        elif self._line_length >= self._next_check:
+            # Minified pages may never contain a line break
+            self._finish_if_line_fills_budget()
+
+    def _flush_line(self, final: bool = False):
+        """Normalizes every complete line collected so far."""
+        pending = ''.join(self._line_parts)
+        lines = pending.splitlines(keepends=True)
+
+        # The last line may continue in the next text node
+        remainder = ''
+        if lines and not final and not LINE_BREAK.match(lines[-1][-1]):
+            remainder = lines.pop()
+        self._line_parts = [remainder] if remainder else []
+        self._line_length = len(remainder)
+
+        self._add_chunks(normalize_lines(''.join(lines)))
+        self._next_check = max(self.limit - self._length, 1)
+
+    def _finish_if_line_fills_budget(self):
+        """
+        Normalizing a prefix of a line always gives a prefix of that line's final normalized text.
+        So if the unfinished line alone already fills the budget, the result cannot change any more.
+        """
+        chunks = normalize_lines(''.join(self._line_parts))
+        needed = self.limit - self._length
+        if len(' '.join(chunks)) + (1 if self._chunks else 0) >= needed:
+            self._add_chunks(chunks)
+        else:
+            self._next_check = self._line_length * 2
+
+    def _add_chunks(self, chunks):
+        for chunk in chunks:
+            self._length += len(chunk) + (1 if self._chunks else 0)
+            self._chunks.append(chunk)
+            if self._length >= self.limit:
+                self.done = True
+                return
+
+
+def collapse_blank_string(string: str) -> str:
+    """
+    BeautifulSoup shrinks whitespace-only text nodes (outside <pre>/<textarea>) to a single newline or space.
+    """
+    if all(c in ASCII_SPACES for c in string):
+        return '\n' if '\n' in string else ' '
+    return string
+
+
+def decode_charref(name: str) -> str:
+    """
+    Numeric character reference -> text, following BeautifulSoup:
+    128-159 are read as windows-1252 and impossible code points become U+FFFD.
+    """
+    if name[:1] in ('x', 'X'):
+        match = re.match(r'([0-9a-fA-F]+)(.*)', name[1:], re.S)
+        base = 16
+    else:
+        match = re.match(r'([0-9]+)(.*)', name, re.S)
+        base = 10
+    if match is None:
+        return name
+    digits, extra = match.groups()
+    number = int(digits, base)
+
+    if 128 <= number <= 159:
+        try:
+            return bytes([number]).decode('windows-1252') + extra
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(number) + extra
+    except (ValueError, OverflowError):
+        return '\ufffd' + extra
@@ -0,0 +1,206 @@
+# Async HTTP fetch engine (pooled keep-alive connections shared by every scrape in the process)
+import asyncio
+import codecs
+import importlib.util
+import os
+import threading
+import weakref
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# HTTP/2 needs the optional 'h2' package (installed with httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class FetchedPage(NamedTuple):
+    """A downloaded page and the validators to re-check it with. `text` is None when `not_modified` (304)."""
+    text: str
+    etag: str = None
+    last_modified: str = None
+    not_modified: bool = False
+
+
+def conditional_headers(etag: str = None, last_modified: str = None) -> dict:
+    """If-None-Match / If-Modified-Since for the validators we have (servers prefer the ETag when given both)."""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+class AsyncFetcher:
+    """
+    Fetches many pages concurrently over one pooled httpx.AsyncClient.
+
+    - Connections are kept alive per host, so repeat fetches skip the TCP/TLS handshake.
+    - A global semaphore bounds the fetches in flight; a per-host one keeps us polite to each site.
+    - Bodies are streamed and capped at `max_bytes`, so a huge page cannot exhaust memory.
+
+    Bound to the event loop it is first used on; use get_fetcher() to get the one for the current loop.
+    """
+    def __init__(self, max_connections: int = 200, max_per_host: int = 8, timeout: float = 10,
+                 max_bytes: int = 5 * 1024 * 1024, transport=None):
+        self.max_per_host = max_per_host
+        self.max_bytes = max_bytes
+        self._global_slots = asyncio.Semaphore(max_connections)
+        # Held only by the fetches using them: a host's semaphore goes away with its last fetch
+        self._host_slots = weakref.WeakValueDictionary()
+        self._client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE and transport is None,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=30,
+            ),
+            transport=transport,
+        )
+
+    @classmethod
+    def from_settings(cls):
+        config = settings.FETCHER
+        return cls(
+            max_connections=config['MAX_CONNECTIONS'],
+            max_per_host=config['MAX_PER_HOST'],
+            timeout=config['TIMEOUT'],
+            max_bytes=config['MAX_BYTES'],
+        )
+
+    def _host_slot(self, host: str) -> asyncio.Semaphore:
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return slot
+
+    async def fetch_text(self, url: str, headers: dict = None) -> str:
+        """
+        Downloads the page and returns the decoded body (truncated at max_bytes).
+        Raises httpx.HTTPStatusError for 4xx/5xx answers.
+        """
+        return (await self.fetch_page(url, headers=headers)).text
+
+    async def fetch_page(self, url: str, etag: str = None, last_modified: str = None, headers: dict = None,
+                         consumer=None) -> FetchedPage:
+        """
+        Like fetch_text(), but also returns the page's validators. Given the ones from the last download,
+        the request is conditional: an unchanged page answers 304 without a body (not_modified=True).
+        A `consumer` (see fetch_stream()) is fed the decoded body as it arrives; once its feed() returns True
+        the download stops, and the page holds only what was read so far.
+        """
+        host = urlsplit(url).hostname or ''
+        headers = {**(headers or {}), **conditional_headers(etag, last_modified)}
+        async with self._global_slots, self._host_slot(host):
+            async with self._client.stream('GET', url, headers=headers or None) as response:
+                validators = {
+                    'etag': response.headers.get('ETag') or etag,
+                    'last_modified': response.headers.get('Last-Modified') or last_modified,
+                }
+                if response.status_code == 304:
+                    return FetchedPage(None, not_modified=True, **validators)
+                response.raise_for_status()
+
+                body = bytearray()
+                encoding = response.encoding or 'utf-8'
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+                    if (consumer and consumer.feed(decoder.decode(chunk))) or len(body) >= self.max_bytes:
+                        # Stop reading; the rest of the page is never downloaded
+                        break
+
+                text = bytes(body[:self.max_bytes]).decode(encoding, errors='replace')
+                return FetchedPage(text, **validators)
+
+    async def fetch_stream(self, url: str, consumer, headers: dict = None):
+        """
+        Streams the decoded body into `consumer.feed(text_chunk)` as it arrives.
+        As soon as feed() returns True the download is abandoned,
+        so the rest of a huge page is never transferred. Also stops at max_bytes.
+        """
+        host = urlsplit(url).hostname or ''
+        async with self._global_slots, self._host_slot(host):
+            async with self._client.stream('GET', url, headers=headers) as response:
+                response.raise_for_status()
+
+                async for text in response.aiter_text():
+                    if consumer.feed(text) or response.num_bytes_downloaded >= self.max_bytes:
+                        break
+
+    async def fetch_many(self, urls: list) -> list:
+        """
+        Fetches every URL concurrently (within the semaphore limits).
+        Returns the bodies in the same order; a failed URL gives its exception instead.
+        """
+        return await asyncio.gather(*(self.fetch_text(url) for url in urls), return_exceptions=True)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+# One fetcher per event loop: asyncio semaphores and connection pools cannot cross loops.
+_fetchers = weakref.WeakKeyDictionary()
+
+
+def get_fetcher() -> AsyncFetcher:
+    """
+    Returns the fetcher for the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    fetcher = _fetchers.get(loop)
+    if fetcher is None:
+        fetcher = AsyncFetcher.from_settings()
+        _fetchers[loop] = fetcher
+    return fetcher
+
+
+class _BackgroundLoop:
+    """
+    A private event loop running in a daemon thread.
+    Synchronous callers (e.g. Celery prefork tasks) hand coroutines to it, so the
+    fetcher and its warm connections survive from one task to the next.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fetcher-loop', daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine on the shared background loop and blocks until it finishes.
+    """
+    global _background
+    if _background is None:
+        with _background_lock:
+            if _background is None:
+                _background = _BackgroundLoop()
+    return _background.run(coro)
+
+
+def _reset_after_fork():
+    # A forked child (Celery prefork) inherits the parent's objects but not its threads.
+    # Drop them so the child starts its own loop and connection pool.
+    global _background, _background_lock, _fetchers
+    _background = None
+    _background_lock = threading.Lock()
+    _fetchers = weakref.WeakKeyDictionary()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,104 @@
+# One GenAI client per worker process (warm HTTPS connections, credentials read once)
+import os
+import threading
+
+from google import genai
+
+SECRETS_DIR = '/run/secrets'
+SECRET_NAME = 'google_credentials'
+
+
+class GenAIClientManager:
+    """
+    Hands out a shared genai.Client instead of building one (and re-reading the key) per call.
+
+    - The key is read from the Docker secret file, or from the GOOGLE_CREDENTIALS env var when there is none.
+    - The secret file is stat()ed on every call (a few microseconds); when it was rotated
+      the key is read again, and a new key gets a new client.
+    - The client's connection pool cannot be shared with a forked child, so every child starts empty
+      (see _reset_after_fork) and builds its own on warm_up() / first use.
+    """
+    def __init__(self, secret_name: str = SECRET_NAME, secrets_dir: str = SECRETS_DIR, client_factory=None):
+        self.secret_name = secret_name
+        self.secret_path = os.path.join(secrets_dir, secret_name)
+        self.client_factory = client_factory or (lambda api_key: genai.Client(api_key=api_key))
+        self._lock = threading.Lock()
+        self._file_state = None  # (mtime_ns, size, inode) of the secret file the key was read from
+        self._api_key = None
+        self._client = None
+
+    def get_client(self):
+        """Returns the shared client, or None when no key is configured."""
+        with self._lock:
+            # 1. Re-read the key only if the secret file changed (or was never read)
+            state = self._stat_secret()
+            if self._client is None or state != self._file_state:
+                api_key = self._read_api_key()
+                self._file_state = state
+
+                # 2. Same key (e.g. the file was just touched): keep the warm client
+                if api_key != self._api_key or self._client is None:
+                    self._replace_client(api_key)
+            return self._client
+
+    def warm_up(self):
+        """Builds the client ahead of the first task (called when a Celery worker process starts)."""
+        if self.get_client() is not None:
+            print("GenAI client ready for this worker process.", flush=True)
+
+    def reset(self):
+        """Forgets the client and key; the next get_client() starts from scratch."""
+        with self._lock:
+            self._replace_client(None)
+            self._file_state = None
+
+    def _stat_secret(self):
+        try:
+            stat = os.stat(self.secret_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read_api_key(self):
+        try:
+            with open(self.secret_path, 'r') as file:
+                # .strip() is crucial to remove invisible newline characters
+                return file.read().strip() or None
+        except OSError:
+            # Fallback for local development if you aren't using swarm/compose secrets locally
+            return os.getenv(self.secret_name.upper()) or None
+
+    def _replace_client(self, api_key):
+        old_client = self._client
+        self._api_key = api_key
+        self._client = self.client_factory(api_key) if api_key else None
+        if old_client is not None:
+            print("GenAI credentials changed, client rebuilt.", flush=True)
+            try:
+                old_client.close()
+            except Exception as e:
+                print(f"Could not close the previous GenAI client: {e}", flush=True)
+
+
+_manager = GenAIClientManager()
+
+
+def get_client_manager() -> GenAIClientManager:
+    return _manager
+
+
+def get_genai_client():
+    """The process-wide GenAI client (None when no key is configured)."""
+    return _manager.get_client()
+
+
+def _reset_after_fork():
+    # A forked child (Celery prefork) must not reuse the parent's sockets or its (possibly held) lock.
+    # Nothing is closed here: the connections still belong to the parent.
+    global _manager
+    _manager = GenAIClientManager(_manager.secret_name, os.path.dirname(_manager.secret_path),
+                                  _manager.client_factory)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,70 @@
+# Near-duplicate pages (mirrors, AMP versions, syndicated copies): SimHash fingerprints of the clean text,
+# looked up through LSH bands in Postgres (ContentBlob.simhash_bands, GIN-indexed)
+import hashlib
+import re
+
+import numpy as np
+from django.conf import settings
+
+WORD_RE = re.compile(r'\w+')
+SHINGLE_WORDS = 3
+# Four bands of 16 bits: two fingerprints at most 3 bits apart always have one band in common (pigeonhole),
+# which bounds NEAR_DUPLICATES['MAX_DISTANCE']
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# Blobs sharing a band with the page, checked for their real distance
+MAX_CANDIDATES = 200
+MASK = (1 << 64) - 1
+
+
+def simhash(text: str):
+    """
+    64-bit SimHash of the text's 3-word shingles: every shingle is hashed, and each bit of the fingerprint is
+    the majority vote of that bit over all the hashes. A few edited words flip only a few bits.
+    Returned signed (it is stored in a bigint column); None for texts under MIN_WORDS, too short to tell apart.
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) < settings.NEAR_DUPLICATES['MIN_WORDS']:
+        return None
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(hashes, dtype=np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int(np.packbits(votes).view('<i8')[0])
+
+
+def bands(fingerprint: int) -> list:
+    """The LSH bands of a fingerprint, each tagged with its position (band 2 never matches band 3)."""
+    unsigned = fingerprint & MASK
+    return [(band << BAND_BITS) | ((unsigned >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)) for band in range(BANDS)]
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & MASK).bit_count()
+
+
+def near_duplicate_summary(fingerprint):
+    """
+    The summary of a completed page whose text is within MAX_DISTANCE bits of `fingerprint` (the nearest one),
+    or None. Two queries: blobs sharing a band (GIN index), then a finished summary of the closest of them.
+    """
+    from interface_layer.models import ContentBlob, Summary
+
+    if fingerprint is None:
+        return None
+    # Farther pages may not share a band: they could not be found reliably
+    max_distance = min(settings.NEAR_DUPLICATES['MAX_DISTANCE'], BANDS - 1)
+    candidates = ContentBlob.objects.filter(simhash_bands__overlap=bands(fingerprint)).values_list('digest', 'simhash')
+    distances = {
+        digest: hamming(fingerprint, other)
+        for digest, other in candidates[:MAX_CANDIDATES]
+        if hamming(fingerprint, other) <= max_distance
+    }
+    if not distances:
+        return None
+    summaries = dict(
+        Summary.objects.filter(content_id__in=distances, status='COMPLETED')
+        .exclude(output_summary=None).values_list('content_id', 'output_summary')
+    )
+    nearest = min(summaries, key=distances.get, default=None)
+    return summaries[nearest] if nearest else None
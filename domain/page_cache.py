@@ -0,0 +1,71 @@
+# HTTP validator cache for scraped pages: re-checking a page we have seen costs a 304, not a download and a parse
+import threading
+
+from django.conf import settings
+
+from domain.cache import BACKENDS, CacheBackend
+from domain.canonical import url_key
+from domain.parsers import get_parser_backend
+
+
+class PageCache:
+    """
+    One entry per (normalized URL, parser) in a cache backend of its own namespace:
+
+        {'etag', 'last_modified', 'body_hash', 'content', 'tokens'}
+
+    - etag / last_modified: the validators of the last download, sent back as If-None-Match / If-Modified-Since
+    - body_hash: sha256 of the raw HTML, for servers that send no validators (or always answer 200)
+    - content / tokens: the ContentBlob digest of the clean text and its size; the text itself is
+      already stored (compressed, deduplicated) in the content store
+
+    The parser is part of the key: clean text made by another backend or length limit is not reused.
+    """
+    def __init__(self, backend: CacheBackend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+
+    def key(self, url: str) -> str:
+        limit = settings.SUMMARY_MAP_REDUCE['MAX_DOCUMENT_CHARS']
+        return f"{url_key(url)}:{get_parser_backend().name}:{limit}"
+
+    def get(self, url: str):
+        """The entry stored for this URL, or None."""
+        return self.backend.get(self.key(url))
+
+    def store(self, url: str, etag: str, last_modified: str, body_hash: str, content: str, tokens: int):
+        self.backend.set(self.key(url), {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+            'content': content,
+            'tokens': tokens,
+        }, self.ttl)
+
+    def forget(self, url: str):
+        self.backend.delete(self.key(url))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache:
+    """
+    Returns the process-wide page cache configured by settings.PAGE_CACHE.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = settings.PAGE_CACHE
+                backend = BACKENDS[config['BACKEND']](config['MAX_ENTRIES'], namespace='page-cache')
+                _cache = PageCache(backend, ttl=config['TTL'])
+    return _cache
+
+
+def reset_page_cache():
+    """Drops the process-wide page cache instance (used by tests and after settings change)."""
+    global _cache
+    with _cache_lock:
+        _cache = None
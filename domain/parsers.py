@@ -0,0 +1,174 @@
+# Pluggable HTML parser backends for the cleaning phase
+import importlib.util
+
+from django.conf import settings
+
+from domain.extraction import (
+    ASCII_SPACES, HIDDEN_TEXT_TAGS, MAX_CONTENT_CHARS, PRESERVE_WHITESPACE_TAGS, SKIPPED_TAGS,
+    StreamingTextExtractor, clean_html, collapse_blank_string, normalize_lines,
+)
+
+# For str.strip(): the characters BeautifulSoup counts as whitespace
+ASCII_WHITESPACE = ''.join(ASCII_SPACES)
+
+
+class ParserBackend:
+    """
+    Turns a page of HTML into clean text, exactly like clean_html():
+    skipped tags removed, text nodes joined with ' ', whitespace normalized, truncated to `limit`.
+
+    Streaming backends are fed the page while it downloads (see extractor());
+    the others get the whole body at once (see clean()).
+
+    On well-formed pages every backend gives the same text (domain/tests/golden/ checks this).
+    Badly broken markup may still differ: each parser repairs errors its own way.
+    """
+    name = None
+    streaming = False
+    # Module that must be importable for the backend to work
+    requires = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return cls.requires is None or importlib.util.find_spec(cls.requires) is not None
+
+    def clean(self, html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+        raise NotImplementedError
+
+    def extractor(self, limit: int = MAX_CONTENT_CHARS):
+        """Returns an object with feed(chunk) -> bool and result() -> str."""
+        raise NotImplementedError
+
+
+class HtmlParserBackend(ParserBackend):
+    """BeautifulSoup with the pure-Python html.parser: the reference, and the slowest."""
+    name = 'html.parser'
+
+    def clean(self, html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+        return clean_html(html, limit)
+
+
+class StreamingBackend(ParserBackend):
+    """
+    The incremental extractor: still pure Python, but it stops the download
+    as soon as the text budget is filled, so big pages are never fully parsed.
+    """
+    name = 'stream'
+    streaming = True
+
+    def clean(self, html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+        extractor = self.extractor(limit)
+        extractor.feed(html)
+        return extractor.result()
+
+    def extractor(self, limit: int = MAX_CONTENT_CHARS):
+        return StreamingTextExtractor(limit=limit)
+
+
+class LxmlBackend(ParserBackend):
+    """libxml2's HTML parser (C). The tree is walked with iterwalk, so no Python recursion."""
+    name = 'lxml'
+    requires = 'lxml'
+
+    def clean(self, html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+        from lxml import etree
+
+        # 1. Parse HTML
+        # Encoded to bytes, since lxml refuses str input carrying an <?xml encoding=...?> declaration
+        root = etree.fromstring(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+        if root is None:
+            return ''
+
+        # 2. Collect the text nodes, the way BeautifulSoup's get_text() sees them
+        strings = []
+        preserve = 0  # How many <pre>/<textarea> we are inside
+
+        def add(string):
+            if string:
+                strings.append(string if preserve else collapse_blank_string(string))
+
+        walker = etree.iterwalk(root, events=('start', 'end', 'comment', 'pi'))
+        for event, element in walker:
+            if event == 'start':
+                if element.tag in SKIPPED_TAGS or element.tag in HIDDEN_TEXT_TAGS:
+                    # THE CLEANING PHASE: drop the whole subtree (but not the text after it)
+                    walker.skip_subtree()
+                    continue
+                if element.tag in PRESERVE_WHITESPACE_TAGS:
+                    preserve += 1
+                add(element.text)
+            elif event == 'end':
+                if element.tag in PRESERVE_WHITESPACE_TAGS:
+                    preserve -= 1
+                add(element.tail)
+            else:
+                # Comments and processing instructions: only the text after them is visible
+                add(element.tail)
+
+        # 3. Normalize Whitespace & Truncate
+        return ' '.join(normalize_lines(' '.join(strings)))[:limit]
+
+
+class LexborBackend(ParserBackend):
+    """selectolax's binding to lexbor, a spec-compliant HTML5 parser written in C. The fastest."""
+    name = 'selectolax'
+    requires = 'selectolax'
+
+    def clean(self, html: str, limit: int = MAX_CONTENT_CHARS) -> str:
+        from selectolax.lexbor import LexborHTMLParser
+
+        # 1. Parse HTML
+        tree = LexborHTMLParser(html)
+
+        # 2. THE CLEANING PHASE
+        # Hidden string containers (<rt>, <template>...) never contribute text either
+        tree.strip_tags(list(SKIPPED_TAGS) + list(HIDDEN_TEXT_TAGS))
+
+        # 3. Extract Text
+        strings = []
+        for node in tree.root.traverse(include_text=True):
+            if node.tag != '-text':
+                continue
+            string = node.text_content
+            # Only whitespace-only strings can change, so only they pay for the ancestor check
+            if not string.strip(ASCII_WHITESPACE) and not self._preserves_whitespace(node):
+                string = collapse_blank_string(string)
+            strings.append(string)
+
+        # 4. Normalize Whitespace & Truncate
+        return ' '.join(normalize_lines(' '.join(strings)))[:limit]
+
+    @staticmethod
+    def _preserves_whitespace(node) -> bool:
+        parent = node.parent
+        while parent is not None:
+            if parent.tag in PRESERVE_WHITESPACE_TAGS:
+                return True
+            parent = parent.parent
+        return False
+
+
+BACKENDS = {
+    backend.name: backend for backend in (HtmlParserBackend, StreamingBackend, LxmlBackend, LexborBackend)
+}
+
+# 'auto' picks the first installed backend from this list (fastest first, see benchmarks/bench_parsers.py)
+AUTO_ORDER = ('selectolax', 'lxml', 'stream')
+
+
+def get_parser_backend(name: str = None) -> ParserBackend:
+    """
+    Returns the backend named by `name` or settings.HTML_PARSER_BACKEND ('auto' by default).
+    Raises ValueError for an unknown name and ImportError when its library is not installed.
+    """
+    name = name or getattr(settings, 'HTML_PARSER_BACKEND', 'auto')
+
+    if name == 'auto':
+        name = next(candidate for candidate in AUTO_ORDER if BACKENDS[candidate].available())
+
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f"Unknown HTML parser backend {name!r}. Choose one of: auto, {', '.join(BACKENDS)}")
+    if not backend_class.available():
+        raise ImportError(f"The {name!r} HTML parser backend needs the '{backend_class.requires}' package")
+    return backend_class()
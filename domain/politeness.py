@@ -0,0 +1,222 @@
+# Per-host politeness: a token bucket per domain, slowed down further by robots.txt Crawl-delay
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from django.conf import settings
+
+from domain.fetcher import DEFAULT_HEADERS, get_fetcher, run_sync
+
+
+class RateLimited(Exception):
+    """
+    The host's budget is used up. If `reserved`, a fetch slot is booked `retry_after` seconds
+    from now: reschedule the task with that countdown and fetch WITHOUT asking again.
+    """
+    def __init__(self, host: str, retry_after: float, reserved: bool):
+        super().__init__(f"Rate limit for {host}: retry in {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+        self.reserved = reserved
+
+
+class TokenBucketBackend:
+    """
+    reserve(host, rate, burst, max_wait) -> (wait, reserved)
+
+    - (0, True): fetch now.
+    - (wait, True): a slot is booked `wait` seconds ahead. The bucket goes negative, so the next
+      callers line up behind it instead of all coming back at the same moment.
+    - (max_wait, False): the queue for this host is already `max_wait` long; nothing was booked.
+    """
+    def reserve(self, host: str, rate: float, burst: int, max_wait: float) -> tuple:
+        raise NotImplementedError
+
+
+class LocMemTokenBucket(TokenBucketBackend):
+    """Per-process buckets. Each worker process throttles on its own: local development and tests only."""
+    def __init__(self):
+        self._buckets = {}  # host -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def reserve(self, host: str, rate: float, burst: int, max_wait: float) -> tuple:
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+
+            if tokens - 1 < -rate * max_wait:
+                self._buckets[host] = (tokens, now)
+                return max_wait, False
+
+            tokens -= 1
+            self._buckets[host] = (tokens, now)
+            return (max(0.0, -tokens / rate), True)
+
+
+class RedisTokenBucket(TokenBucketBackend):
+    """
+    Buckets shared by every worker, updated atomically by a Lua script.
+    The script uses the Redis server's clock, so workers with skewed clocks still agree.
+    """
+    KEY_PREFIX = 'scrape-bucket:'
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local max_wait = tonumber(ARGV[3])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+
+        local wait = max_wait
+        local reserved = 0
+        if tokens - 1 >= -rate * max_wait then
+            tokens = tokens - 1
+            wait = math.max(0, -tokens / rate)
+            reserved = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate + max_wait) + 60)
+        -- Lua numbers would be truncated to integers in the reply
+        return {tostring(wait), reserved}
+    """
+
+    def __init__(self, url: str = None):
+        import redis  # Imported lazily so the locmem backend works without a Redis server
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def reserve(self, host: str, rate: float, burst: int, max_wait: float) -> tuple:
+        wait, reserved = self._script(keys=[self.KEY_PREFIX + host], args=[rate, burst, max_wait])
+        return float(wait), bool(reserved)
+
+
+BUCKET_BACKENDS = {
+    'locmem': LocMemTokenBucket,
+    'redis': RedisTokenBucket,
+}
+
+
+class RobotsCache:
+    """
+    Parsed robots.txt per host, kept in memory for `ttl` seconds (at most `max_hosts`, least recently used out).
+    A robots.txt that cannot be fetched counts as "no rules"; after a server or network error it is retried after `error_ttl`.
+    """
+    def __init__(self, ttl: int, max_hosts: int, error_ttl: int = 300):
+        self.ttl = ttl
+        self.max_hosts = max_hosts
+        self.error_ttl = error_ttl
+        self._parsers = OrderedDict()  # origin -> (expires_at, RobotFileParser)
+        self._lock = threading.Lock()
+
+    def get(self, origin: str) -> RobotFileParser:
+        with self._lock:
+            item = self._parsers.get(origin)
+            if item is not None and item[0] > time.monotonic():
+                self._parsers.move_to_end(origin)
+                return item[1]
+
+        # Fetched outside the lock: one slow site must not hold up every other host
+        parser, ttl = self._load(origin)
+        with self._lock:
+            self._parsers[origin] = (time.monotonic() + ttl, parser)
+            self._parsers.move_to_end(origin)
+            while len(self._parsers) > self.max_hosts:
+                self._parsers.popitem(last=False)
+        return parser
+
+    def _load(self, origin: str) -> tuple:
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            text = run_sync(_fetch_robots(f"{origin}/robots.txt"))
+        except httpx.HTTPStatusError as e:
+            # 4xx: the site has no robots.txt, so no rules (for the full TTL). 5xx: try again soon
+            parser.parse([])
+            return parser, self.ttl if e.response.status_code < 500 else self.error_ttl
+        except Exception as e:
+            print(f"No usable robots.txt at {origin}: {e}", flush=True)
+            parser.parse([])
+            return parser, self.error_ttl
+        parser.parse(text.splitlines())
+        return parser, self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._parsers.clear()
+
+
+async def _fetch_robots(url: str) -> str:
+    return await get_fetcher().fetch_text(url)
+
+
+class PolitenessScheduler:
+    """
+    Decides when a URL may be fetched: at most `rate` fetches per second per host (bursts of `burst`),
+    or fewer if the site's robots.txt asks for it with Crawl-delay / Request-rate.
+    """
+    def __init__(self, buckets: TokenBucketBackend, robots: RobotsCache, rate: float, burst: int, max_wait: float):
+        self.buckets = buckets
+        self.robots = robots
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+
+    def limits_for(self, url: str) -> tuple:
+        """(rate, burst) for the URL's host, after applying robots.txt."""
+        parts = urlsplit(url)
+        parser = self.robots.get(f"{parts.scheme}://{parts.netloc}")
+        user_agent = DEFAULT_HEADERS['User-Agent']
+
+        rate, burst = self.rate, self.burst
+        crawl_delay = parser.crawl_delay(user_agent)
+        if crawl_delay:
+            rate, burst = min(rate, 1 / float(crawl_delay)), 1
+        request_rate = parser.request_rate(user_agent)
+        if request_rate and request_rate.requests and request_rate.seconds:
+            rate = min(rate, request_rate.requests / request_rate.seconds)
+        return rate, burst
+
+    def acquire(self, url: str):
+        """Returns if the URL may be fetched right now; raises RateLimited otherwise."""
+        host = (urlsplit(url).hostname or '').lower()
+        rate, burst = self.limits_for(url)
+        wait, reserved = self.buckets.reserve(host, rate, burst, self.max_wait)
+        if wait > 0:
+            raise RateLimited(host, wait, reserved)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_politeness_scheduler() -> PolitenessScheduler:
+    """
+    Returns the process-wide scheduler configured by settings.SCRAPE_POLITENESS.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = settings.SCRAPE_POLITENESS
+                _scheduler = PolitenessScheduler(
+                    BUCKET_BACKENDS[config['BACKEND']](),
+                    RobotsCache(config['ROBOTS_TTL'], config['ROBOTS_MAX_HOSTS']),
+                    rate=config['RATE'],
+                    burst=config['BURST'],
+                    max_wait=config['MAX_WAIT'],
+                )
+    return _scheduler
+
+
+def reset_politeness_scheduler():
+    """Drops the process-wide scheduler (used by tests and after settings change)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
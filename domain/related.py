@@ -0,0 +1,310 @@
+# "Related research": the summaries closest in content to a given one, from a local vector index (no model call)
+import fcntl
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from domain.search import url_words
+
+# Words of two letters or more; numbers say little about what a page is about
+WORD_RE = re.compile(r'[^\W\d_]{2,}')
+STOP_WORDS = frozenset(
+    'about after also an and are as at be been but by can could for from had has have he her his how if in into is '
+    'it its more most not of on or other our she so some such than that the their them then there these they this '
+    'to was we were what when which while who will with would you your www http https com org net html'.split()
+)
+
+# Rows the files are first created for; they double when full
+INITIAL_CAPACITY = 1024
+# The IVF lists are (re)trained once the index holds this many rows, then every time it has doubled
+MIN_TRAIN_ROWS = 4096
+# Spherical k-means: iterations, and training rows per list
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+# Rows are scored / assigned this many at a time (bounds the temporary float32 copies)
+CHUNK_ROWS = 8192
+ARRAYS = ('vectors', 'ids', 'owners', 'lists', 'centroids', 'df')
+
+
+def embed(url: str, text: str) -> np.ndarray:
+    """
+    Hashed term frequencies of the words in the URL and the summary: 1 + log(count) per word, added with a
+    random sign (colliding words cancel out instead of piling up) into one of DIMENSIONS buckets, L2-normalized.
+    The IDF half of TF-IDF is applied by the index at query time, from its own document frequencies.
+    """
+    dimensions = settings.RELATED_INDEX['DIMENSIONS']
+    vector = np.zeros(dimensions, dtype=np.float32)
+    words = WORD_RE.findall(f"{url_words(url)} {text or ''}".lower())
+    for word, count in Counter(word for word in words if word not in STOP_WORDS).items():
+        digest = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+        vector[digest % dimensions] += (1 + math.log(count)) * (1 if digest >> 63 else -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class RelatedIndex:
+    """
+    IVF (inverted file) index of summary vectors, memory-mapped from the files in `path`:
+
+        meta.json            {'generation', 'count', 'capacity', 'trained_at'}
+        vectors-<gen>.npy    (capacity, dimensions) float32, embed() of every row
+        ids-<gen>.npy        (capacity, 16) uint8, the summary UUIDs
+        owners-<gen>.npy     (capacity,) int64, their user ids (a search only ever sees the user's own rows)
+        lists-<gen>.npy      (capacity,) int32, the IVF list (nearest centroid) of every row, -1 until trained
+        centroids-<gen>.npy  (lists, dimensions) float32
+        df-<gen>.npy         (dimensions,) int64, how many rows use every bucket (for the IDF weights)
+
+    New rows are written in place and become visible when meta.json (replaced atomically) counts them.
+    Growing the files or retraining the lists writes a new generation: readers still mapping the old one
+    keep it until their next search. Writers (the workers) hold an exclusive flock; readers take no lock.
+    """
+    def __init__(self, path: str, dimensions: int, probes: int, exact_rows: int,
+                 initial_capacity: int = INITIAL_CAPACITY, min_train_rows: int = MIN_TRAIN_ROWS):
+        self.path = path
+        self.dimensions = dimensions
+        self.probes = probes
+        self.exact_rows = exact_rows
+        self.initial_capacity = initial_capacity
+        self.min_train_rows = min_train_rows
+        self.meta = None
+        self.arrays = {}
+        self._version = None
+        self._writable = False
+        self._lock = threading.Lock()
+
+    def _file(self, name: str, generation: int) -> str:
+        return os.path.join(self.path, f'{name}-{generation}.npy')
+
+    def _load(self, writable: bool = False) -> bool:
+        """Maps the current generation (again, if meta.json changed since the last call). False if there is no index."""
+        meta_path = os.path.join(self.path, 'meta.json')
+        for _ in range(3):
+            try:
+                stat = os.stat(meta_path)
+                version = (stat.st_ino, stat.st_mtime_ns)
+                if version == self._version and writable <= self._writable:
+                    return True
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                mode = 'r+' if writable else 'r'
+                self.arrays = {name: np.load(self._file(name, meta['generation']), mmap_mode=mode) for name in ARRAYS}
+            except FileNotFoundError:
+                # No index yet, or a writer replaced the generation we were about to map: look again
+                self.meta, self.arrays, self._version = None, {}, None
+                continue
+            self.meta, self._version, self._writable = meta, version, writable
+            return True
+        return False
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        stat = os.stat(meta_path)
+        self._version = (stat.st_ino, stat.st_mtime_ns)  # Our own maps are up to date
+
+    def _writer(self):
+        """Exclusive lock of the index directory, for every process and thread that writes to it."""
+        os.makedirs(self.path, exist_ok=True)
+        return _FileLock(os.path.join(self.path, 'lock'))
+
+    # --- Writing ---
+
+    def add(self, rows: list):
+        """Appends (summary_id, owner_id, vector) rows; retrains the lists when the index has doubled."""
+        if not rows:
+            return
+        with self._lock, self._writer():
+            if not self._load(writable=True):
+                self.meta = {'generation': 0, 'count': 0, 'capacity': 0, 'trained_at': 0}
+            count = self.meta['count']
+            if count + len(rows) > self.meta['capacity']:
+                self._rewrite(max(self.initial_capacity, 2 * self.meta['capacity'], count + len(rows)))
+
+            # 1. The new rows, past the end readers can see
+            end = count + len(rows)
+            vectors = np.stack([vector for _, _, vector in rows]).astype(np.float32)
+            self.arrays['vectors'][count:end] = vectors
+            self.arrays['ids'][count:end] = np.frombuffer(
+                b''.join(uuid.UUID(str(summary_id)).bytes for summary_id, _, _ in rows), dtype=np.uint8,
+            ).reshape(-1, 16)
+            self.arrays['owners'][count:end] = [owner_id for _, owner_id, _ in rows]
+            self.arrays['lists'][count:end] = self._assign(vectors) if len(self.arrays['centroids']) else -1
+            self.arrays['df'][:] += np.count_nonzero(vectors, axis=0)
+            for array in self.arrays.values():
+                array.flush()
+
+            # 2. Then the count that makes them visible
+            self.meta['count'] = end
+            if end >= max(self.min_train_rows, 2 * self.meta['trained_at']):
+                self._rewrite(self.meta['capacity'], train=True)
+            else:
+                self._write_meta()
+
+    def clear(self):
+        """Drops every row (the files of the next add() start over)."""
+        with self._lock, self._writer():
+            for name in os.listdir(self.path):
+                if name.endswith('.npy') or name == 'meta.json':
+                    os.remove(os.path.join(self.path, name))
+            self.meta, self.arrays, self._version = None, {}, None
+
+    def _rewrite(self, capacity: int, train: bool = False):
+        """
+        Copies the rows into a new generation of files (`capacity` rows), with freshly trained lists if `train`,
+        then points meta.json at it and deletes the old one.
+        """
+        count, old = self.meta['count'], self.meta['generation']
+        generation = old + 1 if self.arrays else old
+        vectors = self.arrays['vectors'][:count] if self.arrays else np.zeros((0, self.dimensions), np.float32)
+        if train:
+            centroids = self._train(vectors)
+        else:
+            centroids = self.arrays['centroids'] if self.arrays else np.zeros((0, self.dimensions), np.float32)
+
+        shapes = {
+            'vectors': ((capacity, self.dimensions), np.float32),
+            'ids': ((capacity, 16), np.uint8),
+            'owners': ((capacity,), np.int64),
+            'lists': ((capacity,), np.int32),
+            'centroids': (centroids.shape, np.float32),
+            'df': ((self.dimensions,), np.int64),
+        }
+        arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            arrays[name] = np.lib.format.open_memmap(self._file(name, generation), mode='w+', dtype=dtype, shape=shape)
+        arrays['centroids'][:] = centroids
+        if self.arrays:
+            for name in ('vectors', 'ids', 'owners', 'lists'):
+                arrays[name][:count] = self.arrays[name][:count]
+            arrays['df'][:] = self.arrays['df']
+        if train:
+            self.arrays = arrays  # _assign() reads the new centroids
+            for start in range(0, count, CHUNK_ROWS):
+                end = min(start + CHUNK_ROWS, count)
+                arrays['lists'][start:end] = self._assign(vectors[start:end])
+            self.meta['trained_at'] = count
+        for array in arrays.values():
+            array.flush()
+
+        self.meta.update(generation=generation, capacity=capacity)
+        self.arrays = arrays
+        self._write_meta()
+        if generation != old:
+            for name in ARRAYS:
+                os.remove(self._file(name, old))
+
+    def _train(self, vectors) -> np.ndarray:
+        """Spherical k-means over a sample of the rows: about sqrt(rows) centroids."""
+        lists = max(1, round(math.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(vectors[rng.choice(len(vectors), min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST), replace=False)], np.float32)
+        centroids = sample[rng.choice(len(sample), lists, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # A list left empty keeps its centroid
+            centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+        return centroids
+
+    def _assign(self, vectors) -> np.ndarray:
+        return np.argmax(np.asarray(vectors, np.float32) @ self.arrays['centroids'].T, axis=1).astype(np.int32)
+
+    # --- Reading ---
+
+    def search(self, vector: np.ndarray, owner_id: int, k: int, exclude=None) -> list:
+        """
+        The `k` rows of `owner_id` most similar to `vector` (cosine of the TF-IDF weighted vectors),
+        as (summary UUID, score), best first. `exclude` (a summary id) is left out.
+        Users with up to exact_rows rows are scanned in full; above that, only the `probes` nearest lists.
+        """
+        with self._lock:
+            if not self._load():
+                return []
+            count, arrays = self.meta['count'], self.arrays
+
+        # 1. Candidates: the user's rows (in the lists nearest to the query, for large histories)
+        rows = np.flatnonzero(arrays['owners'][:count] == owner_id)
+        if len(rows) > self.exact_rows and len(arrays['centroids']):
+            probe = np.argsort(-(arrays['centroids'] @ vector))[:self.probes]
+            rows = rows[np.isin(arrays['lists'][rows], probe)]
+        if not len(rows):
+            return []
+
+        # 2. Cosine similarity once every bucket is weighted by its IDF: (v * idf) . (q * idf) / |v * idf| |q * idf|,
+        # without making the weighted copy of every candidate
+        weights = np.square(np.log((1 + count) / (1 + arrays['df'])) + 1).astype(np.float32)
+        query_norm = math.sqrt(np.square(vector) @ weights)
+        if not query_norm:
+            return []
+        query = vector * weights / query_norm
+        scores = np.empty(len(rows), np.float32)
+        for start in range(0, len(rows), CHUNK_ROWS):
+            candidates = arrays['vectors'][rows[start:start + CHUNK_ROWS]]
+            norms = np.sqrt(np.square(candidates) @ weights)
+            scores[start:start + CHUNK_ROWS] = (candidates @ query) / np.where(norms > 0, norms, 1)
+
+        # 3. The best ones (a summary indexed twice, e.g. by a retried task, only counts once)
+        wanted = min(len(rows), 2 * k + 1)
+        best = np.argpartition(-scores, wanted - 1)[:wanted]
+        results, seen = [], {exclude}
+        for i in best[np.argsort(-scores[best])]:
+            summary_id = uuid.UUID(bytes=arrays['ids'][rows[i]].tobytes())
+            if summary_id in seen or scores[i] <= 0:
+                continue
+            seen.add(summary_id)
+            results.append((summary_id, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_related_index() -> RelatedIndex:
+    """
+    Returns the process-wide index configured by settings.RELATED_INDEX.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                config = settings.RELATED_INDEX
+                _index = RelatedIndex(
+                    config['PATH'], config['DIMENSIONS'], probes=config['PROBES'], exact_rows=config['EXACT_ROWS'],
+                )
+    return _index
+
+
+def reset_related_index():
+    """Drops the process-wide index instance (used by tests and after settings change)."""
+    global _index
+    with _index_lock:
+        _index = None
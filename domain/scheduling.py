@@ -0,0 +1,474 @@
+# Fair scheduling of summary jobs: per-user queues in priority lanes, served round-robin, under concurrency caps.
+# Jobs wait here instead of in the Celery queues (FIFO: 1,000 URLs of one user would hold up everybody else's);
+# the pipeline only ever holds what the caps let through.
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from prometheus_client.core import GaugeMetricFamily
+
+# Served in this order: an interactive submission never waits behind a bulk import
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+LANES = (INTERACTIVE, BULK)
+# Longest a dispatch round may hold the lock before another process may take it over
+LOCK_SECONDS = 30
+
+
+class FairQueueBackend:
+    """
+    State of the fair queue:
+    - one FIFO of summary ids per (lane, user)
+    - per lane, a ring of the users with waiting jobs: served users go to the back
+    - the running jobs: summary id -> (user id, lane, started at)
+    - a dispatch lock and a 'dirty' flag (jobs were pushed while somebody else dispatched), and the recheck flag
+    User ids come back as strings.
+    """
+    def push(self, lane: str, user_id, summary_ids: list):
+        raise NotImplementedError
+
+    def ring(self, lane: str) -> list:
+        raise NotImplementedError
+
+    def pop(self, lane: str, user_id, count: int, rotate: bool = True) -> list:
+        """Up to `count` ids from the front of the user's queue; with `rotate`, the user goes to the back of the ring."""
+        raise NotImplementedError
+
+    def move(self, summary_id, lane: str, user_id, to_lane: str, to_user_id) -> bool:
+        """Moves a waiting job from one queue to the back of another, atomically. False if it was not waiting there."""
+        raise NotImplementedError
+
+    def depths(self) -> dict:
+        """(lane, user id) -> waiting jobs"""
+        raise NotImplementedError
+
+    def running(self) -> dict:
+        raise NotImplementedError
+
+    def start(self, user_id, lane: str, summary_ids: list):
+        raise NotImplementedError
+
+    def finish(self, summary_ids: list):
+        raise NotImplementedError
+
+    def acquire_lock(self) -> bool:
+        raise NotImplementedError
+
+    def release_lock(self):
+        raise NotImplementedError
+
+    def mark_dirty(self):
+        raise NotImplementedError
+
+    def take_dirty(self) -> bool:
+        """Whether the flag was set; clears it."""
+        raise NotImplementedError
+
+    def is_dirty(self) -> bool:
+        raise NotImplementedError
+
+    def claim_recheck(self, ttl: float) -> bool:
+        """Sets the recheck flag unless it is set (a recheck is already scheduled): True if it was not."""
+        raise NotImplementedError
+
+    def release_recheck(self):
+        raise NotImplementedError
+
+
+class LocMemFairQueue(FairQueueBackend):
+    """Per-process state: local development and tests only (the web app and the workers would not share it)."""
+    def __init__(self):
+        self._queues = {}  # (lane, user id) -> [summary ids]
+        self._rings = {lane: [] for lane in LANES}
+        self._running = {}
+        self._flags = {}  # name -> expires at (None: never)
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+
+    def push(self, lane: str, user_id, summary_ids: list):
+        with self._lock:
+            self._append(lane, user_id, summary_ids)
+
+    def _append(self, lane: str, user_id, summary_ids: list):
+        self._queues.setdefault((lane, str(user_id)), []).extend(summary_ids)
+        if str(user_id) not in self._rings[lane]:
+            self._rings[lane].append(str(user_id))
+
+    def ring(self, lane: str) -> list:
+        with self._lock:
+            return list(self._rings[lane])
+
+    def pop(self, lane: str, user_id, count: int, rotate: bool = True) -> list:
+        with self._lock:
+            ring = self._rings[lane]
+            queue = self._queues.get((lane, str(user_id)), [])
+            summary_ids, queue[:count] = queue[:count], []
+            if not queue:
+                self._queues.pop((lane, str(user_id)), None)
+            if str(user_id) in ring and (rotate or not queue):
+                ring.remove(str(user_id))
+                if queue:
+                    ring.append(str(user_id))
+            return summary_ids
+
+    def move(self, summary_id, lane: str, user_id, to_lane: str, to_user_id) -> bool:
+        with self._lock:
+            queue = self._queues.get((lane, str(user_id)), [])
+            kept = [queued for queued in queue if str(queued) != str(summary_id)]
+            if len(kept) == len(queue):
+                return False
+            queue[:] = kept
+            if not queue:
+                self._queues.pop((lane, str(user_id)))
+                self._rings[lane].remove(str(user_id))
+            self._append(to_lane, to_user_id, [summary_id])
+            return True
+
+    def depths(self) -> dict:
+        with self._lock:
+            return {key: len(queue) for key, queue in self._queues.items()}
+
+    def running(self) -> dict:
+        with self._lock:
+            return dict(self._running)
+
+    def start(self, user_id, lane: str, summary_ids: list):
+        with self._lock:
+            now = time.time()
+            self._running.update((summary_id, (str(user_id), lane, now)) for summary_id in summary_ids)
+
+    def finish(self, summary_ids: list):
+        with self._lock:
+            for summary_id in summary_ids:
+                self._running.pop(summary_id, None)
+
+    def acquire_lock(self) -> bool:
+        return self._dispatch_lock.acquire(blocking=False)
+
+    def release_lock(self):
+        self._dispatch_lock.release()
+
+    def _flag(self, name: str, now: float) -> bool:
+        expires_at = self._flags.get(name, 0)
+        if expires_at is not None and expires_at <= now:
+            self._flags.pop(name, None)
+            return False
+        return True
+
+    def mark_dirty(self):
+        with self._lock:
+            self._flags['dirty'] = None
+
+    def take_dirty(self) -> bool:
+        with self._lock:
+            dirty = self._flag('dirty', time.monotonic())
+            self._flags.pop('dirty', None)
+            return dirty
+
+    def is_dirty(self) -> bool:
+        with self._lock:
+            return self._flag('dirty', time.monotonic())
+
+    def claim_recheck(self, ttl: float) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self._flag('recheck', now):
+                return False
+            self._flags['recheck'] = now + ttl
+            return True
+
+    def release_recheck(self):
+        with self._lock:
+            self._flags.pop('recheck', None)
+
+
+class RedisFairQueue(FairQueueBackend):
+    """
+    State shared by the web app and every worker. Each user's ring position is a sorted-set score drawn
+    from a counter: pushing and popping are Lua scripts, so a user is never left out of the ring with jobs waiting.
+    """
+    KEY_PREFIX = 'fair-queue:'
+    PUSH = """
+        redis.call('RPUSH', KEYS[1], unpack(ARGV, 2))
+        if not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+            redis.call('ZADD', KEYS[2], redis.call('INCR', KEYS[3]), ARGV[1])
+        end
+    """
+    POP = """
+        local count = tonumber(ARGV[2])
+        local ids = redis.call('LRANGE', KEYS[1], 0, count - 1)
+        redis.call('LTRIM', KEYS[1], count, -1)
+        if redis.call('LLEN', KEYS[1]) == 0 then
+            redis.call('ZREM', KEYS[2], ARGV[1])
+        elseif ARGV[3] == '1' then
+            redis.call('ZADD', KEYS[2], 'XX', redis.call('INCR', KEYS[3]), ARGV[1])
+        end
+        return ids
+    """
+    MOVE = """
+        if redis.call('LREM', KEYS[1], 0, ARGV[3]) == 0 then
+            return 0
+        end
+        if redis.call('LLEN', KEYS[1]) == 0 then
+            redis.call('ZREM', KEYS[2], ARGV[1])
+        end
+        redis.call('RPUSH', KEYS[3], ARGV[3])
+        if not redis.call('ZSCORE', KEYS[4], ARGV[2]) then
+            redis.call('ZADD', KEYS[4], redis.call('INCR', KEYS[5]), ARGV[2])
+        end
+        return 1
+    """
+    RELEASE_LOCK = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str = None):
+        import redis  # Imported lazily so the locmem backend works without a Redis server
+        self.client = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self._push = self.client.register_script(self.PUSH)
+        self._pop = self.client.register_script(self.POP)
+        self._move = self.client.register_script(self.MOVE)
+        self._release_lock = self.client.register_script(self.RELEASE_LOCK)
+        self._token = uuid.uuid4().hex
+
+    def _key(self, *parts):
+        return self.KEY_PREFIX + ':'.join(str(part) for part in parts)
+
+    def push(self, lane: str, user_id, summary_ids: list):
+        self._push(
+            keys=[self._key('queue', lane, user_id), self._key('ring', lane), self._key('sequence')],
+            args=[user_id, *(str(summary_id) for summary_id in summary_ids)],
+        )
+
+    def ring(self, lane: str) -> list:
+        return self.client.zrange(self._key('ring', lane), 0, -1)
+
+    def pop(self, lane: str, user_id, count: int, rotate: bool = True) -> list:
+        return self._pop(
+            keys=[self._key('queue', lane, user_id), self._key('ring', lane), self._key('sequence')],
+            args=[user_id, count, int(rotate)],
+        )
+
+    def move(self, summary_id, lane: str, user_id, to_lane: str, to_user_id) -> bool:
+        return bool(self._move(
+            keys=[self._key('queue', lane, user_id), self._key('ring', lane),
+                  self._key('queue', to_lane, to_user_id), self._key('ring', to_lane), self._key('sequence')],
+            args=[user_id, to_user_id, str(summary_id)],
+        ))
+
+    def depths(self) -> dict:
+        pipe = self.client.pipeline(transaction=False)
+        keys = [(lane, user_id) for lane in LANES for user_id in self.ring(lane)]
+        for lane, user_id in keys:
+            pipe.llen(self._key('queue', lane, user_id))
+        return {key: depth for key, depth in zip(keys, pipe.execute()) if depth}
+
+    def running(self) -> dict:
+        running = {}
+        for summary_id, value in self.client.hgetall(self._key('running')).items():
+            user_id, lane, started_at = value.split(':')
+            running[summary_id] = (user_id, lane, float(started_at))
+        return running
+
+    def start(self, user_id, lane: str, summary_ids: list):
+        now = time.time()
+        self.client.hset(
+            self._key('running'), mapping={str(summary_id): f"{user_id}:{lane}:{now}" for summary_id in summary_ids},
+        )
+
+    def finish(self, summary_ids: list):
+        if summary_ids:
+            self.client.hdel(self._key('running'), *(str(summary_id) for summary_id in summary_ids))
+
+    def acquire_lock(self) -> bool:
+        return bool(self.client.set(self._key('lock'), self._token, nx=True, ex=LOCK_SECONDS))
+
+    def release_lock(self):
+        self._release_lock(keys=[self._key('lock')], args=[self._token])
+
+    def mark_dirty(self):
+        self.client.set(self._key('dirty'), 1)
+
+    def take_dirty(self) -> bool:
+        return bool(self.client.delete(self._key('dirty')))
+
+    def is_dirty(self) -> bool:
+        return bool(self.client.exists(self._key('dirty')))
+
+    def claim_recheck(self, ttl: float) -> bool:
+        return bool(self.client.set(self._key('recheck'), 1, nx=True, px=max(1, int(ttl * 1000))))
+
+    def release_recheck(self):
+        self.client.delete(self._key('recheck'))
+
+
+FAIR_QUEUE_BACKENDS = {
+    'locmem': LocMemFairQueue,
+    'redis': RedisFairQueue,
+}
+
+
+class FairScheduler:
+    """
+    Starts waiting jobs while there is room:
+    - at most `max_running` jobs in the pipeline, bulk ones on `bulk_share` of those slots at most
+      (the rest is kept for interactive submissions), and `max_running_per_user` per user
+    - lane by lane, in priority order; within a lane, round-robin over the users: one interactive job
+      or one slice of `bulk_slice` bulk jobs (summarized together) per user and turn
+    Jobs that left the pipeline are found by asking `is_active` (the database); a job running for longer than
+    `running_timeout` seconds no longer counts against the caps (its task was lost).
+    """
+    def __init__(self, backend: FairQueueBackend, max_running: int, max_running_per_user: int,
+                 bulk_share: float, bulk_slice: int, running_timeout: float):
+        self.backend = backend
+        self.max_running = max_running
+        self.max_running_per_user = max_running_per_user
+        self.bulk_share = bulk_share
+        self.bulk_slice = bulk_slice
+        self.running_timeout = running_timeout
+
+    def push(self, lane: str, user_id, summary_ids: list):
+        self.backend.push(lane, user_id, summary_ids)
+
+    def promote(self, summary_id, owner_id, user_id) -> bool:
+        """
+        Moves a job still waiting in `owner_id`'s bulk lane to the interactive lane of `user_id`, who is waiting on it
+        (single-flight follower): it no longer waits behind the rest of the import. False if it is not waiting there.
+        """
+        return self.backend.move(summary_id, BULK, owner_id, INTERACTIVE, user_id)
+
+    def dispatch(self, start, is_active) -> int:
+        """
+        Runs dispatch rounds: `start(lane, summary_ids)` is called for every job (or bulk slice) let through,
+        `is_active(summary_ids)` returns the ids (as strings) still in the pipeline. Returns the jobs left waiting.
+
+        One process dispatches at a time. A caller that finds the lock taken leaves the 'dirty' flag behind
+        and the lock holder runs another round for it.
+        """
+        self.backend.mark_dirty()
+        while self.backend.acquire_lock():
+            try:
+                while self.backend.take_dirty():
+                    self.dispatch_round(start, is_active)
+            finally:
+                self.backend.release_lock()
+            # Set between our last round and the release: its caller may have missed the lock
+            if not self.backend.is_dirty():
+                break
+        return sum(self.backend.depths().values())
+
+    def dispatch_round(self, start, is_active):
+        # 1. Jobs that finished (or were lost) free their slots
+        running = self.backend.running()
+        if running:
+            active = is_active(list(running))
+            deadline = time.time() - self.running_timeout
+            finished = [
+                summary_id for summary_id, (_, _, started_at) in running.items()
+                if str(summary_id) not in active or started_at < deadline
+            ]
+            self.backend.finish(finished)
+            for summary_id in finished:
+                del running[summary_id]
+        per_user = Counter(user_id for user_id, _, _ in running.values())
+        per_lane = Counter(lane for _, lane, _ in running.values())
+
+        # 2. Lane by lane, round-robin over the users, while there is room
+        for lane in LANES:
+            quantum = 1 if lane == INTERACTIVE else self.bulk_slice
+            served = True
+            while served and self.room(lane, per_lane) > 0:
+                served = False
+                for user_id in self.backend.ring(lane):
+                    room, user_room = self.room(lane, per_lane), self.max_running_per_user - per_user[user_id]
+                    count = min(quantum, room, user_room)
+                    if count <= 0:
+                        continue
+                    # A turn cut short by the room left is not over: the user stays at the front of the ring
+                    summary_ids = self.backend.pop(lane, user_id, count, rotate=room >= min(quantum, user_room))
+                    if not summary_ids:
+                        continue
+                    try:
+                        start(lane, summary_ids)
+                    except Exception:
+                        # Not started (the broker is down?): back in the queue, at its end
+                        self.backend.push(lane, user_id, summary_ids)
+                        raise
+                    self.backend.start(user_id, lane, summary_ids)
+                    per_user[user_id] += len(summary_ids)
+                    per_lane[lane] += len(summary_ids)
+                    served = True
+
+    def room(self, lane: str, per_lane: Counter) -> int:
+        room = self.max_running - sum(per_lane.values())
+        if lane == BULK:
+            room = min(room, int(self.max_running * self.bulk_share) - per_lane[BULK])
+        return room
+
+    def depths(self) -> dict:
+        return self.backend.depths()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fair_scheduler() -> FairScheduler:
+    """Returns the process-wide scheduler configured by settings.SUMMARY_SCHEDULING."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = settings.SUMMARY_SCHEDULING
+                _scheduler = FairScheduler(
+                    FAIR_QUEUE_BACKENDS[config['BACKEND']](),
+                    max_running=config['MAX_RUNNING'],
+                    max_running_per_user=config['MAX_RUNNING_PER_USER'],
+                    bulk_share=config['BULK_SHARE'],
+                    bulk_slice=config['BULK_SLICE'],
+                    running_timeout=config['RUNNING_TIMEOUT'],
+                )
+    return _scheduler
+
+
+def reset_fair_scheduler():
+    """Drops the process-wide scheduler (used by tests and after settings change)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
+
+
+class QueueMetricsCollector:
+    """
+    summary_queue_depth and summary_jobs_running, by lane and user, read from the fair queue when Prometheus
+    scrapes the web app (the state is shared: one process exports it). The METRICS_MAX_USERS busiest users
+    get a label of their own, the rest add up under 'other'.
+    """
+    def collect(self):
+        config = settings.SUMMARY_SCHEDULING
+        if not config['ENABLED']:
+            return
+        scheduler = get_fair_scheduler()
+        running = Counter((lane, user_id) for user_id, lane, _ in scheduler.backend.running().values())
+        for name, documentation, counts in (
+            ('summary_queue_depth', 'Summary jobs waiting in the fair queue', scheduler.depths()),
+            ('summary_jobs_running', 'Summary jobs let into the pipeline and not finished yet', running),
+        ):
+            metric = GaugeMetricFamily(name, documentation, labels=['lane', 'user'])
+            for (lane, user_id), value in busiest_users(counts, config['METRICS_MAX_USERS']).items():
+                metric.add_metric([lane, user_id], value)
+            yield metric
+
+
+def busiest_users(counts: dict, max_users: int) -> dict:
+    """{(lane, user id): count} with only the `max_users` largest entries; the others summed as (lane, 'other')."""
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    top = dict(ranked[:max_users])
+    for (lane, _), value in ranked[max_users:]:
+        top[(lane, 'other')] = top.get((lane, 'other'), 0) + value
+    return top
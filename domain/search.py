@@ -0,0 +1,43 @@
+# Full-text search over a user's summaries (Postgres tsvector + pg_trgm, see SummaryQuerySet.search)
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import Value
+
+
+def url_words(url: str) -> str:
+    """
+    The URL as plain words ("https://github.com/django/django" -> "https github com django django").
+    Postgres' parser would keep a URL as one host token and one path token, and a search for "django" would miss it.
+    """
+    return re.sub(r'[\W_]+', ' ', url or '').strip()
+
+
+def search_document(url: str, output_summary: str):
+    """
+    Summary.search_vector: the URL (weight A) and the summary (B). Small, so ranking thousands of matches is cheap.
+    It is an expression: Postgres builds the tsvector in the INSERT or UPDATE that stores it.
+    """
+    config = settings.SUMMARY_SEARCH['CONFIG']
+    return (
+        SearchVector(Value(url_words(url)), weight='A', config=config)
+        + SearchVector(Value(output_summary or ''), weight='B', config=config)
+    )
+
+
+def text_document(text: str):
+    """
+    Summary.text_vector: the start of the page text. Matched through its own GIN index but never ranked:
+    it is tens of KB per row, and ts_rank() would have to read (and decompress) it for every match.
+    """
+    if not text:
+        return None
+    # Long pages are cut: to_tsvector's cost grows with the text (and a tsvector is capped at 1 MB)
+    text = text[:settings.SUMMARY_SEARCH['MAX_TEXT_CHARS']]
+    return SearchVector(Value(text), config=settings.SUMMARY_SEARCH['CONFIG'])
+
+
+def search_query(query: str) -> SearchQuery:
+    """The user's query in web-search syntax: words, "quoted phrases", -excluded and OR."""
+    return SearchQuery(query, search_type='websearch', config=settings.SUMMARY_SEARCH['CONFIG'])
@@ -1,111 +1,376 @@
 # "Business Logic" (e.g., Call Google, Parse HTML)
-import requests
-from bs4 import BeautifulSoup
-import os
-from google import genai
+import asyncio
+import json
+import hashlib
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from domain.batching import estimate_tokens, pack_documents
+from domain.chunking import split_segments
+from domain.circuit_breaker import get_circuit_breaker
+from domain.errors import (
+    MissingCredentialsError,
+    SummaryError,
+    classify_model_error,
+    classify_scrape_error,
+)
+from domain.fetcher import FetchedPage, get_fetcher, run_sync
+from domain.genai_client import get_genai_client
+from domain.parsers import get_parser_backend
+from domain.politeness import get_politeness_scheduler
+from domain.telemetry import current_domain, record_model_usage, stage
+
+# The model and prompts used for every summary.
+# Anything cached from a model call is keyed by PROMPT_VERSION, so editing any of them
+# automatically invalidates summaries produced by the old prompt.
+SUMMARY_MODEL = 'gemini-2.5-flash'
+
+SUMMARY_PROMPT_TEMPLATE = """
+        You are an expert research assistant. Please read the following text extracted from a webpage and provide a comprehensive, well-structured summary.
+        
+        Format your response using Markdown:
+        - Start with a bold 1-2 sentence TL;DR.
+        - Follow with 3-5 bullet points covering the key takeaways.
+        - End with a brief conclusion if necessary.
+        
+        TEXT TO SUMMARIZE:
+        {scraped_text}
+        """
+
+# Used by summarize_texts() to summarize several short documents in one request
+BATCH_PROMPT_TEMPLATE = """
+        You are an expert research assistant. Below are {count} texts extracted from different webpages.
+        Each one starts with a line of the form "=== DOCUMENT <n> ===".
+        Summarize EACH document separately. Format every summary using Markdown:
+        - Start with a bold 1-2 sentence TL;DR.
+        - Follow with 3-5 bullet points covering the key takeaways.
+        - End with a brief conclusion if necessary.
+
+        Reply with a JSON array containing one object per document:
+        [{{"document": <n>, "summary": "<markdown summary>"}}, ...]
+
+        DOCUMENTS:
+        {documents}
+        """
+
+# Long documents (see summarize_long_text): every segment is condensed into notes first...
+# The position of the segment is deliberately NOT in the prompt, so its notes can be cached and reused
+SEGMENT_PROMPT_TEMPLATE = """
+        You are an expert research assistant. The following text is one section of a longer document.
+        Write concise notes on it: the key facts, arguments, numbers and conclusions, as Markdown bullet points.
+        Do not add an introduction or a conclusion of your own.
+
+        SECTION:
+        {segment}
+        """
+
+# ...then the notes of all segments are merged into the same summary format as SUMMARY_PROMPT_TEMPLATE
+REDUCE_PROMPT_TEMPLATE = """
+        You are an expert research assistant. Below are notes taken on the {count} consecutive sections of ONE long document.
+        Please write a comprehensive, well-structured summary of the whole document.
+
+        Format your response using Markdown:
+        - Start with a bold 1-2 sentence TL;DR.
+        - Follow with 3-5 bullet points covering the key takeaways.
+        - End with a brief conclusion if necessary.
+
+        NOTES:
+        {notes}
+        """
+
+PROMPT_VERSION = hashlib.sha256(
+    f"{SUMMARY_MODEL}|{SUMMARY_PROMPT_TEMPLATE}|{BATCH_PROMPT_TEMPLATE}|"
+    f"{SEGMENT_PROMPT_TEMPLATE}|{REDUCE_PROMPT_TEMPLATE}".encode('utf-8')
+).hexdigest()[:12]
+
+# Every model call goes through this circuit breaker (domain/circuit_breaker.py)
+MODEL_CIRCUIT = 'gemini'
 
 class ResearchAgent:
-    def get_content_from_url(self, url: str) -> str:
+    def get_content_from_url(self, url: str, reserved: bool = False) -> str:
         """
         Fetches the URL and returns CLEAN, human-readable text.
+        Thin synchronous wrapper around aget_content_from_url() for synchronous callers.
+
+        Asks the per-host politeness scheduler first (unless a slot was already `reserved`).
+        Raises ScrapeError / TransientScrapeError (domain/errors.py), or CircuitOpenError while the host is down.
+        """
+        return self._scrape(url, reserved, lambda: run_sync(self.aget_content_from_url(url)))
+
+    def fetch_page(self, url: str, reserved: bool = False, validators: dict = None, consumer=None) -> FetchedPage:
+        """
+        Downloads the raw HTML, without cleaning it (the fetch stage of the Celery pipeline;
+        the parse stage cleans it on a CPU worker). Same politeness rules and errors as get_content_from_url().
+
+        With the `validators` ({'etag', 'last_modified'}) of the last download, the request is conditional:
+        an unchanged page comes back as FetchedPage(None, not_modified=True) without a body.
+        A streaming parser's extractor given as `consumer` cleans the page while it downloads, and ends the
+        download once its text budget is filled.
         """
+        return self._scrape(url, reserved, lambda: run_sync(self.afetch_page(url, validators, consumer)))
+
+    def _scrape(self, url: str, reserved: bool, fetch):
+        # 1. A host that keeps timing out or answering 5xx gets a break (checked first: no rate slot is spent on it)
+        breaker = get_circuit_breaker(f"scrape:{(urlsplit(url).hostname or '').lower()}")
+        probe = breaker.before_call()
+        # 2. Politeness (a probe told to come back later is given back: nothing was sent)
+        try:
+            self.wait_for_turn(url, reserved)
+        except Exception:
+            breaker.cancel(probe)
+            raise
+        # 3. Fetch
+        return breaker.call(fetch, lambda e: classify_scrape_error(e, url), probe=probe)
+
+    async def afetch_page(self, url: str, validators: dict = None, consumer=None) -> FetchedPage:
+        validators = validators or {}
+        return await get_fetcher().fetch_page(
+            url, etag=validators.get('etag'), last_modified=validators.get('last_modified'), consumer=consumer,
+        )
+
+    def wait_for_turn(self, url: str, reserved: bool = False):
+        """Raises RateLimited when the URL's host has to be left alone for a while."""
+        if settings.SCRAPE_POLITENESS['ENABLED'] and not reserved:
+            get_politeness_scheduler().acquire(url)
+
+    async def aget_content_from_url(self, url: str) -> str:
+        """
+        Async version: downloads the page through the pooled fetch engine and cleans it
+        with the configured parser backend (settings.HTML_PARSER_BACKEND).
+        A streaming backend parses while downloading and stops once it has MAX_DOCUMENT_CHARS of clean text.
+        """
+        limit = settings.SUMMARY_MAP_REDUCE['MAX_DOCUMENT_CHARS']
         try:
-            # 1. Fetch the raw HTML
-            # headers are needed to look like a real browser, otherwise some sites block you
-            headers = {'User-Agent': 'Mozilla/5.0'} 
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            # 2. Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 3. THE CLEANING PHASE
-            # Remove javascript, css, and structural junk
-            for script in soup(["script", "style", "header", "footer", "nav", "aside"]):
-                script.extract() # Rips the tag out of the tree
-
-            # 4. Extract Text
-            # get_text() joins all text, using a space as separator
-            text = soup.get_text(separator=' ')
-            
-            # 5. Normalize Whitespace
-            # "Hello      World" -> "Hello World"
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            clean_text = ' '.join(chunk for chunk in chunks if chunk)
-            
-            # 6. Truncate (Optional but Recommended)
-            # Most LLMs have a limit (e.g., 4000 tokens). 
-            # Let's keep the first ~15,000 characters (approx 3000 words)
-            return clean_text[:15000]
-            
+            # The shared fetcher reuses keep-alive connections and sends a browser-like User-Agent
+            fetcher = get_fetcher()
+            backend = get_parser_backend()
+
+            if backend.streaming:
+                # 1. Fetch & clean at the same time
+                extractor = backend.extractor(limit=limit)
+                await fetcher.fetch_stream(url, extractor)
+                return extractor.result()
+
+            # 1. Fetch the whole page, then clean it in one go (C parsers are fast enough for that)
+            html = await fetcher.fetch_text(url)
+
+            # 2. Clean text, whitespace-normalized and truncated
+            return backend.clean(html, limit=limit)
+
         except Exception as e:
             # In a real app, you might log this error
             print(f"Error scraping {url}: {e}")
-            raise e
+            raise classify_scrape_error(e, url) from e
+
+    async def aget_contents_from_urls(self, urls: list) -> list:
+        """
+        Fetches and cleans many URLs concurrently.
+        Returns results in the same order; a failed URL gives its (typed) exception instead of text.
+        """
+        return await asyncio.gather(*(self.aget_content_from_url(url) for url in urls), return_exceptions=True)
+
+    def _get_client(self):
+        """
+        Returns the worker process's shared GenAI client (see domain/genai_client.py).
+        Raises MissingCredentialsError when no key is configured.
+        """
+        client = get_genai_client()
+        if client is None:
+            raise MissingCredentialsError()
+        return client
+
+    def _call_model(self, call):
+        """
+        Runs `call()` (model requests) behind the model's circuit breaker. Whatever it raises comes out typed:
+        TransientSummaryError (throttled, overloaded, timed out: retry later), SummaryError (give up),
+        or CircuitOpenError when the endpoint is taking a break and nothing was sent.
+        """
+        def timed():
+            # Only calls that were actually sent count in the model's latency
+            with stage('model', **{'gen_ai.request.model': SUMMARY_MODEL}):
+                return call()
+
+        return get_circuit_breaker(MODEL_CIRCUIT).call(timed, classify_model_error)
+
+    def _generate(self, client, prompt: str, on_chunk=None) -> str:
+        """One prompt, one answer; streamed piece by piece to `on_chunk(text)` if given."""
+        def generate():
+            if on_chunk is None:
+                response = client.models.generate_content(model=SUMMARY_MODEL, contents=prompt)
+                record_model_usage(response.usage_metadata)
+                return response.text
+
+            parts = []
+            usage = None
+            for chunk in client.models.generate_content_stream(model=SUMMARY_MODEL, contents=prompt):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    on_chunk(chunk.text)
+                usage = chunk.usage_metadata or usage  # The totals come with the last chunk
+            record_model_usage(usage)
+            return ''.join(parts)
+
+        text = self._call_model(generate)
+        if not text:
+            # Blocked by the safety filters, or cut short
+            raise SummaryError("The model returned an empty summary")
+        return text
 
     def summarize_text(self, scraped_text: str) -> str:
         """
         Sends processed text to the Gemini model and returns a formatted markdown summary.
+        Raises the typed errors of domain/errors.py; it never returns an error message as if it were a summary.
         """
-        # 1. Read the API key securely from Docker Secrets
-        print("Retrieving API key from Docker secrets...", flush=True)  # Debug statement
-        try:
-            # api_key = self.get_docker_secret('google_credentials')
+        # 1. Get an authenticated client
+        client = self._get_client()
 
-            secret_path = f"/run/secrets/google_credentials"
-        
-            if os.path.exists(secret_path):
-                with open(secret_path, "r") as file:
-                    # .strip() is crucial to remove invisible newline characters
-                    api_key = file.read().strip()
-        except Exception as e:
-            print(f"Error retrieving API key: {e}", flush=True)
-            return f"Error retrieving API key: {str(e)}"
+        # 2. Craft the Prompt
+        with stage('prompt'):
+            prompt = SUMMARY_PROMPT_TEMPLATE.format(scraped_text=scraped_text)
 
-        if not api_key:
-            return "Error: Could not locate 'google_credentials' in Docker secrets."
+        # 3. Call the AI Model (Using gemini-2.5-flash for speed and cost-efficiency)
+        print("Sending prompt to Gemini model...", flush=True)
+        return self._generate(client, prompt)
 
-        # 2. Initialize the client
-        print("Initializing Google GenAI client...", flush=True)  # Debug statement
-        client = genai.Client(api_key=api_key)
+    def summarize_text_stream(self, scraped_text: str, on_chunk) -> str:
+        """
+        Same as summarize_text(), but uses the SDK's streaming generation:
+        `on_chunk(text)` is called with every piece as soon as the model produces it.
+        Returns the full summary; raises like summarize_text().
+        """
+        # 1. Get an authenticated client
+        client = self._get_client()
 
-        # 3. Craft the Prompt
-        prompt = f"""
-        You are an expert research assistant. Please read the following text extracted from a webpage and provide a comprehensive, well-structured summary.
-        
-        Format your response using Markdown:
-        - Start with a bold 1-2 sentence TL;DR.
-        - Follow with 3-5 bullet points covering the key takeaways.
-        - End with a brief conclusion if necessary.
-        
-        TEXT TO SUMMARIZE:
-        {scraped_text}
+        # 2. Craft the Prompt (identical to the blocking call, so both share the cache)
+        with stage('prompt'):
+            prompt = SUMMARY_PROMPT_TEMPLATE.format(scraped_text=scraped_text)
+
+        # 3. Relay the answer piece by piece
+        print("Streaming prompt to Gemini model...", flush=True)
+        return self._generate(client, prompt, on_chunk=on_chunk)
+
+    def summarize_texts(self, scraped_texts: list) -> list:
+        """
+        Summarizes several documents with ONE model request and returns the summaries in the same order.
+        Documents the model skipped (or a reply we cannot parse) fall back to summarize_text().
+        Throttling and outages are raised (the whole pack is retried later), not fallen back from.
         """
+        if len(scraped_texts) == 1:
+            return [self.summarize_text(scraped_texts[0])]
+
+        client = self._get_client()
+
+        # 1. Pack every document into a single prompt, each behind a numbered marker
+        with stage('prompt', documents=len(scraped_texts)):
+            documents = '\n\n'.join(
+                f"=== DOCUMENT {number} ===\n{text}" for number, text in enumerate(scraped_texts, start=1)
+            )
+            prompt = BATCH_PROMPT_TEMPLATE.format(count=len(scraped_texts), documents=documents)
 
+        # 2. Ask for JSON so the reply can be split back per document
+        summaries = {}
         try:
-            print("Sending prompt to Gemini model...", flush=True)  
-            # 4. Call the AI Model (Using gemini-2.5-flash for speed and cost-efficiency)
-            response = client.models.generate_content(
-                model='gemini-2.5-flash',
+            print(f"Sending {len(scraped_texts)} packed documents to Gemini model...", flush=True)
+            response = self._call_model(lambda: client.models.generate_content(
+                model=SUMMARY_MODEL,
                 contents=prompt,
-            )            
-            return response.text
-            
-        except Exception as e:
-            print(f"AI Generation failed: {e}")
-            return f"Failed to generate summary due to an API error: {str(e)}"
+                config={'response_mime_type': 'application/json'},
+            ))
+            record_model_usage(response.usage_metadata)
+            for item in json.loads(response.text):
+                if isinstance(item, dict) and isinstance(item.get('summary'), str) and item['summary'].strip():
+                    summaries[item.get('document')] = item['summary']
+        except (SummaryError, TypeError, ValueError) as e:
+            print(f"Batch AI Generation failed, falling back to one call per document: {e}")
+
+        # 3. Split the answer back out (missing ones are retried individually)
+        return [
+            summaries.get(number) or self.summarize_text(text)
+            for number, text in enumerate(scraped_texts, start=1)
+        ]
 
-    def get_docker_secret(self, secret_name: str) -> str:
+    def summarize_long_text(self, scraped_text: str, segment_cache=None, on_chunk=None) -> str:
         """
-        Reads a secret from Docker's default secret directory.
+        Map-reduce summary for documents too long for one prompt:
+
+        1. MAP: split the text into segments (domain/chunking.py) and condense each into notes, concurrently.
+           With a `segment_cache` (SummaryCache), unchanged segments are never sent to the model again.
+        2. REDUCE: merge the notes into the same Markdown format summarize_text() produces.
+           `on_chunk(text)`, if given, receives the final summary piece by piece like summarize_text_stream().
+
+        Raises like summarize_text(). Notes of the segments that succeeded stay cached, so a retry only redoes the rest.
         """
-        secret_path = f"/run/secrets/{secret_name}"
-        
-        if os.path.exists(secret_path):
-            with open(secret_path, "r") as file:
-                # .strip() is crucial to remove invisible newline characters
-                return file.read().strip() 
-        
-        # Fallback for local development if you aren't using swarm/compose secrets locally
-        return os.getenv(secret_name.upper())
\ No newline at end of file
+        client = self._get_client()
+        config = settings.SUMMARY_MAP_REDUCE
+
+        # 1. MAP
+        with stage('prompt'):
+            segments = split_segments(scraped_text, config['SEGMENT_TOKENS'])
+        print(f"Summarizing a long document in {len(segments)} segments...", flush=True)
+        notes = self.summarize_segments(client, segments, segment_cache)
+
+        # 2. The notes of a huge document may still not fit one prompt: condense them again
+        for _ in range(config['MAX_CONDENSE_ROUNDS']):
+            if estimate_tokens('\n\n'.join(notes)) <= config['SEGMENT_TOKENS']:
+                break
+            packs = pack_documents(
+                [{'tokens': estimate_tokens(note), 'notes': note} for note in notes],
+                config['SEGMENT_TOKENS'], max_documents=len(notes),
+            )
+            notes = self.summarize_segments(
+                client, ['\n\n'.join(item['notes'] for item in pack) for pack in packs], segment_cache,
+            )
+
+        # 3. REDUCE
+        with stage('prompt'):
+            prompt = REDUCE_PROMPT_TEMPLATE.format(count=len(notes), notes='\n\n'.join(notes))
+        return self._generate(client, prompt, on_chunk=on_chunk)
+
+    def summarize_segments(self, client, segments: list, segment_cache=None) -> list:
+        """
+        Returns the notes for every segment, in order. Cache lookups happen here (the cache
+        backends are synchronous); only the misses go to the model, concurrently.
+        """
+        notes = [segment_cache.get_for_segment(segment) if segment_cache else None for segment in segments]
+        missing = [index for index, note in enumerate(notes) if note is None]
+
+        if missing:
+            def generate():
+                results = run_sync(self.asummarize_segments(
+                    client, [segments[index] for index in missing], current_domain(),
+                ))
+                for index, result in zip(missing, results):
+                    if not isinstance(result, BaseException):
+                        notes[index] = result
+                        if segment_cache:
+                            segment_cache.store_segment(segments[index], result)
+                # Raised once the good notes are cached: a retry only redoes the failed segments
+                # (a summary with a hole in it is not a summary)
+                errors = [result for result in results if isinstance(result, BaseException)]
+                if errors:
+                    raise errors[0]
+
+            self._call_model(generate)
+        return notes
+
+    async def asummarize_segments(self, client, segments: list, domain: str = '') -> list:
+        """
+        Condenses every segment with the async API, at most MAX_PARALLEL requests at a time.
+        Returns the notes in order; a failed segment gives its exception instead.
+        `domain` labels the token counts (the event loop runs in a thread of its own, without the task's context).
+        """
+        slots = asyncio.Semaphore(settings.SUMMARY_MAP_REDUCE['MAX_PARALLEL'])
+
+        async def summarize(segment):
+            async with slots:
+                response = await client.aio.models.generate_content(
+                    model=SUMMARY_MODEL,
+                    contents=SEGMENT_PROMPT_TEMPLATE.format(segment=segment),
+                )
+            record_model_usage(response.usage_metadata, domain)
+            if not response.text:
+                raise SummaryError("The model returned no notes for a segment")
+            return response.text
+
+        return await asyncio.gather(*(summarize(segment) for segment in segments), return_exceptions=True)
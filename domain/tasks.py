@@ -1,9 +1,77 @@
 # Celery Tasks (The bridge between Queue and Service)
-from celery import shared_task
-from interface_layer.models import Summary  # <--- IMPORTING THE MODEL
+from asgiref.sync import sync_to_async
+from celery import Task, shared_task, chain, chord, group
+from django.conf import settings
+from interface_layer.models import ACTIVE_STATUSES, ContentBlob, Summary  # <--- IMPORTING THE MODEL
 from domain.services import ResearchAgent
+from domain.cache import get_summary_cache
+from domain.batching import estimate_tokens, pack_documents
+from domain.compression import compress_for_prompt
+from domain.content_store import content_hash, save_content
+from domain.page_cache import get_page_cache
+from domain.parsers import get_parser_backend
+from domain.events import publish_status, SummaryStreamWriter
+from domain.politeness import RateLimited
+from domain.scheduling import BULK, get_fair_scheduler
+from domain.near_duplicates import near_duplicate_summary
+from domain.related import embed, get_related_index
+from domain.search import search_document, text_document
+from domain.errors import CircuitOpenError, TransientError
+from domain.telemetry import REUSED, SUMMARIES, annotate_task, observe_queue_wait, stage
+import random
 import time
 
+def is_long_document(text: str) -> bool:
+    """Whether `text` goes through the map-reduce pipeline instead of a single prompt."""
+    return estimate_tokens(text) > settings.SUMMARY_MAP_REDUCE['SINGLE_PASS_TOKENS']
+
+class PipelineTask(Task):
+    """
+    Base of the stages that talk to the outside world. Transient errors (domain/errors.py: throttling,
+    timeouts, 5xx) raised out of the task are retried by Celery with exponential backoff and full jitter.
+    The stages only let them out while retries are left (see retry_later): the last attempt fails the row
+    and hands None on like any other failure, so a chord still hears from every member.
+    """
+    autoretry_for = (TransientError,)
+    retry_backoff = True
+    retry_backoff_max = settings.TASK_RETRY['BACKOFF_MAX']
+    retry_jitter = True
+    max_retries = settings.TASK_RETRY['MAX_RETRIES']
+
+def retry_later(task, error: Exception, summary_id):
+    """
+    Reschedules the task if `error` is worth coming back for (raises celery's Retry, or the error itself
+    for autoretry_for; the worker slot is free in the meantime). Returns if the summary should FAIL.
+
+    Every kind of reschedule counts in task.request.retries, so the limits below are on all of them together.
+    """
+    # 1. The per-host rate limit booked a later fetch slot
+    if isinstance(error, RateLimited):
+        max_reschedules = settings.SCRAPE_POLITENESS['MAX_RESCHEDULES']
+        if task.request.retries >= max_reschedules:
+            return
+        print(f"{error} (summary {summary_id})", flush=True)
+        raise task.retry(
+            args=(summary_id,),
+            kwargs={'reserved': error.reserved},  # A booked slot must not be asked for again
+            countdown=error.retry_after,
+            max_retries=max_reschedules,
+        )
+
+    # 2. The endpoint is taking a break: park until the circuit may close (spread out, so they do not all come back at once)
+    if isinstance(error, CircuitOpenError):
+        max_parks = settings.TASK_RETRY['MAX_PARKS']
+        if task.request.retries >= max_parks:
+            return
+        print(f"{error} (summary {summary_id} parked)", flush=True)
+        jitter = random.uniform(0, settings.CIRCUIT_BREAKER['RESET_TIMEOUT'])
+        raise task.retry(countdown=error.retry_after + jitter, max_retries=max_parks)
+
+    # 3. Throttled, timed out, 5xx: autoretry_for takes it from here (exponential backoff, jittered)
+    if isinstance(error, TransientError) and task.request.retries < task.max_retries:
+        print(f"{error} (summary {summary_id} will be retried)", flush=True)
+        raise error
+
 @shared_task
 def debug_hello_world():
     print("🚀 HELLO FROM CELERY! The task has started.")
@@ -11,35 +79,396 @@ def debug_hello_world():
     print("✅ HELLO FROM CELERY! The task is finished.")
     return "Task Complete"
 
+# ==========================================
+# SINGLE URL PIPELINE: fetch -> parse -> summarize
+# ==========================================
+# Every stage is routed to its own queue (settings.CELERY_TASK_ROUTES) and served by its own
+# worker pool, so network waits, parsing CPU and LLM waits are sized independently.
+
 @shared_task
 def process_summary_task(summary_id):
+    """
+    Entry point for one URL: starts the staged pipeline.
+    Write budget of a successful run: two narrow SELECTs of the row, one of the blob,
+    three narrow UPDATEs (PROCESSING, content, COMPLETED), each conditional on the row still being active,
+    and one SELECT for requests that followed the job (plus one UPDATE if any did).
+    """
+    summary_pipeline(summary_id).apply_async()
+
+async def adelay(task, *args, **kwargs):
+    """
+    task.delay() for async views. kombu has no asyncio transport: the publish runs in a thread of the
+    default pool (thread_sensitive=False, so it does not queue behind the request's ORM calls), off the event loop.
+    """
+    return await sync_to_async(task.delay, thread_sensitive=False)(*args, **kwargs)
+
+def scrape_pipeline(summary_id):
+    """fetch -> parse. Ends with {'id', 'user_id', 'tokens'}, or None if the scrape failed."""
+    return chain(
+        fetch_page_task.s(summary_id),
+        # Raw HTML can be megabytes: compress the message on its way to the parse queue
+        parse_page_task.s().set(compression='zlib'),
+    )
+
+def summary_pipeline(summary_id):
+    return chain(scrape_pipeline(summary_id), summarize_content_task.s())
+
+def fail_summary(summary_id, user_id, error: Exception):
+    print(f"Summary {summary_id} failed: {error}", flush=True)
+    # Ideally, save the error message to a new field or log it
+    if Summary.objects.filter(id=summary_id).fail():
+        SUMMARIES.labels('FAILED').inc()
+        if user_id is not None:
+            publish_status(user_id, summary_id, 'FAILED')
+        settle_followers([Summary(pk=summary_id, status='FAILED')])
+
+def settle_followers(leaders: list) -> list:
+    """
+    Single-flight: requests for the same URL that attached to these finished jobs (instead of starting
+    their own) get the same outcome, and their owners the status event. Returns the ids of those that COMPLETED.
+    """
+    completed = []
+    for summary_id, user_id, status in Summary.objects.settle_followers(leaders):
+        publish_status(user_id, summary_id, status)
+        if status == 'COMPLETED':
+            completed.append(summary_id)
+    return completed
+
+@shared_task(bind=True, base=PipelineTask)
+def fetch_page_task(self, summary_id, reserved=False):
+    """
+    Stage 1 (queue 'fetch', I/O): downloads the raw HTML.
+    With a streaming parser backend the page is cleaned as it arrives instead, and the download ends once
+    MAX_DOCUMENT_CHARS of clean text exist: the parse stage gets the text, not the HTML.
+    `reserved` is set when the task was rescheduled into a booked fetch slot for its host.
+    Never raises: failures are recorded on the row and passed on as None.
+    """
+    summary = None
+    try:
+        # 1. Get the DB Record (only what the job needs, not the big text columns)
+        summary = Summary.objects.only('id', 'user_id', 'url', 'status', 'created_at').get(id=summary_id)
+        annotate_task(summary.url)
+        if not self.request.retries:
+            # From the request to a fetch worker picking it up (later attempts wait on purpose: backoff, booked slots)
+            observe_queue_wait('fetch', summary.created_at)
+        with stage('db_write'):
+            processing = summary.mark_processing()
+        if not processing:
+            # Duplicate or late delivery: the summary already finished
+            print(f"Summary {summary_id} is already {summary.status}, skipping.", flush=True)
+            return None
+        publish_status(summary.user_id, summary.id, summary.status)
+
+        # 2. What we know from the last time this page was scraped (its clean text must still be stored)
+        previous = get_page_cache().get(summary.url)
+        if previous and not ContentBlob.objects.filter(digest=previous['content']).exists():
+            previous = None
+
+        # 3. FETCH (politely: the host may make us come back later; conditionally if we have validators)
+        parser = get_parser_backend()
+        extractor = parser.extractor(limit=settings.SUMMARY_MAP_REDUCE['MAX_DOCUMENT_CHARS']) if parser.streaming else None
+        with stage('fetch', conditional=previous is not None) as span:
+            page = ResearchAgent().fetch_page(summary.url, reserved=reserved, validators=previous, consumer=extractor)
+            span.set_attribute('http.not_modified', page.not_modified)
+        fetched = {
+            'id': str(summary.id), 'user_id': summary.user_id, 'url': summary.url,
+            'etag': page.etag, 'last_modified': page.last_modified,
+            'queued_at': time.time(),  # For the parse stage's queue wait
+        }
+
+        # 4. Unchanged (304, or the very same bytes): nothing to parse, the previous clean text is reused
+        # (a download cut short by the streaming parser is hashed as far as it went)
+        body_hash = None if page.not_modified else content_hash(page.text)
+        if previous and (page.not_modified or body_hash == previous['body_hash']):
+            return {**fetched, 'html': None, 'body_hash': previous['body_hash'],
+                    'content': previous['content'], 'tokens': previous['tokens']}
+        if extractor is not None:
+            return {**fetched, 'html': None, 'text': extractor.result(), 'body_hash': body_hash}
+        return {**fetched, 'html': page.text, 'body_hash': body_hash}
+
+    except Exception as e:
+        # The host needs a break or had a hiccup: come back later rather than fail (or block this worker)
+        # (a retried chain or chord member keeps its place in the pipeline)
+        retry_later(self, e, summary_id)
+        fail_summary(summary_id, summary.user_id if summary else None, e)
+        return None
+
+@shared_task
+def parse_page_task(fetched):
+    """
+    Stage 2 (queue 'parse', CPU): HTML -> clean text, stored in the content store.
+    An unchanged page (no 'html') gets the clean text of its last scrape back, without parsing anything;
+    a page the fetch stage already cleaned (streaming parser, 'text') is only stored.
+    """
+    if fetched is None:
+        return None  # The fetch failed or was skipped
+    annotate_task(fetched['url'])
+    observe_queue_wait('parse', fetched.get('queued_at'))
+    try:
+        if fetched['html'] is None and fetched.get('text') is None:
+            blob, tokens = ContentBlob(digest=fetched['content']), fetched['tokens']
+        else:
+            # 1. CLEAN with the configured parser backend (unless it did so during the download)
+            clean_text = fetched.get('text')
+            if clean_text is None:
+                parser = get_parser_backend()
+                limit = settings.SUMMARY_MAP_REDUCE['MAX_DOCUMENT_CHARS']
+                with stage('parse', parser=parser.name, html_chars=len(fetched['html'])):
+                    clean_text = parser.clean(fetched['html'], limit=limit)
+            # (stored once, compressed, and shared with every other summary of the same text)
+            with stage('db_write'):
+                blob = save_content(clean_text)
+            tokens = estimate_tokens(clean_text)
+
+        # 2. Remember the validators for the next scrape of this page
+        get_page_cache().store(
+            fetched['url'], fetched['etag'], fetched['last_modified'], fetched['body_hash'], blob.digest, tokens,
+        )
+
+        # 3. Attach the clean text; no need to load the row to update it
+        # (the summary cache is keyed by content, so unchanged text also reuses the previous summary)
+        with stage('db_write'):
+            attached = Summary(pk=fetched['id']).attach_content(blob)
+        if not attached:
+            return None
+        return {'id': fetched['id'], 'user_id': fetched['user_id'], 'tokens': tokens, 'queued_at': time.time()}
+
+    except Exception as e:
+        fail_summary(fetched['id'], fetched['user_id'], e)
+        return None
+
+def reused_summary(cache, clean_text: str, summary):
+    """
+    A summary that already exists for this text: the cached one of the exact same text, else the one of a finished
+    near-duplicate page (settings.NEAR_DUPLICATES; cached then for this text too). None if the model is needed.
+    """
+    cached_summary = cache.get_for_content(clean_text)
+    if cached_summary is not None:
+        REUSED.labels('content_cache').inc()
+        return cached_summary
+    if not settings.NEAR_DUPLICATES['ENABLED']:
+        return None
+    with stage('near_duplicates'):
+        cached_summary = near_duplicate_summary(summary.content.simhash)
+    if cached_summary is not None:
+        print(f"Summary {summary.id}: reusing the summary of a near-duplicate page", flush=True)
+        REUSED.labels('near_duplicate').inc()
+        cache.store(summary.url, clean_text, cached_summary)
+    return cached_summary
+
+@shared_task(bind=True, base=PipelineTask)
+def summarize_content_task(self, parsed):
+    """
+    Stage 3 (queue 'summarize', waiting on the model): summarizes the stored text and completes the row.
+    """
+    if parsed is None:
+        return
+    if not self.request.retries:
+        observe_queue_wait('summarize', parsed.get('queued_at'))
+    stream = None
     try:
-        # 1. Get the DB Record
-        summary = Summary.objects.get(id=summary_id)
-        summary.status = 'PROCESSING'
-        summary.save()
+        # 1. The row and its text in one query (rows finished elsewhere are left alone)
+        summary = (
+            Summary.objects.select_related('content')
+            .only('id', 'user_id', 'url', 'status', 'content__digest', 'content__codec', 'content__data', 'content__simhash')
+            .filter(id=parsed['id'], status='PROCESSING')
+            .first()
+        )
+        if summary is None:
+            return
+        annotate_task(summary.url)
+        clean_text = summary.input_content
 
         # 2. Instantiate the Service
         agent = ResearchAgent()
+        cache = get_summary_cache()
+
+        # 3. SUMMARIZE
+        # Another user may already have summarized this exact text with the current prompt,
+        # or a copy of the same article at another URL
+        ai_summary = reused_summary(cache, clean_text, summary)
+        if ai_summary is None:
+            # Boilerplate left in the text is not worth paying for (the cache stays keyed by the clean text)
+            with stage('compress'):
+                prompt_text = compress_for_prompt(clean_text)
+            if settings.SUMMARY_STREAMING:
+                # Relay every chunk through Redis so the browser can show it while the model is still writing
+                stream = SummaryStreamWriter(summary.id)
+                if self.request.retries:
+                    # An earlier attempt may have streamed half a summary
+                    stream.restart()
+            if is_long_document(prompt_text):
+                # Too long for one prompt: segments are summarized in parallel, then merged
+                # (segments seen before, e.g. in an earlier version of the page, come from the cache)
+                ai_summary = agent.summarize_long_text(
+                    prompt_text, segment_cache=cache, on_chunk=stream.write if stream else None,
+                )
+            elif stream:
+                ai_summary = agent.summarize_text_stream(prompt_text, on_chunk=stream.write)
+            else:
+                ai_summary = agent.summarize_text(prompt_text)
+            cache.store(summary.url, clean_text, ai_summary)
+
+        # 4. Finish (unless the row was finished elsewhere in the meantime), for us and anyone who followed the job
+        with stage('db_write'):
+            completed = summary.complete(ai_summary, clean_text)
+        if completed:
+            SUMMARIES.labels('COMPLETED').inc()
+            publish_status(summary.user_id, summary.id, summary.status)
+            index_related_task.delay([summary.id, *settle_followers([summary])])
+        if stream:
+            stream.finish(summary.status)
+
+    except Exception as e:
+        # Throttled or the model is overloaded: try again later (the row stays PROCESSING)
+        retry_later(self, e, parsed['id'])
+        fail_summary(parsed['id'], parsed['user_id'], e)
+        if stream:
+            stream.finish('FAILED')
+
+
+@shared_task
+def index_related_task(summary_ids):
+    """
+    Adds completed summaries to the related-summaries index (domain/related.py).
+    Runs on the default queue: the index takes one writer at a time, and now and then retrains its lists.
+    """
+    rows = Summary.objects.filter(id__in=summary_ids, status='COMPLETED').values_list('id', 'user_id', 'url', 'output_summary')
+    get_related_index().add([(summary_id, user_id, embed(url, output_summary)) for summary_id, user_id, url, output_summary in rows])
+
+
+# ==========================================
+# BATCH PIPELINE (reading lists of many URLs)
+# ==========================================
+
+@shared_task
+def process_summary_batch_task(summary_ids):
+    """
+    Fans a batch out: every URL is fetched and parsed in parallel (chord header),
+    then summarize_batch_task packs the texts into as few model calls as possible.
+    """
+    chord(scrape_pipeline(summary_id) for summary_id in summary_ids)(summarize_batch_task.s())
 
-        # 3. FETCH & CLEAN
-        # The service does the hard work of removing HTML tags
-        clean_text = agent.get_content_from_url(summary.url)
-        
-        # Save the clean text so we can debug later if needed
-        summary.input_content = clean_text 
-        summary.save()
+@shared_task
+def summarize_batch_task(fetched):
+    """
+    Chord callback: groups the scraped documents into packs under the token budget
+    and summarizes every pack in parallel.
+    """
+    config = settings.SUMMARY_BATCH
+    documents = [document for document in fetched if document]
+    single_pass_tokens = settings.SUMMARY_MAP_REDUCE['SINGLE_PASS_TOKENS']
+    short = [document for document in documents if document['tokens'] <= single_pass_tokens]
+    # Long documents are map-reduced on their own (see summarize_pack_task)
+    packs = pack_documents(short, config['TOKEN_BUDGET'], config['MAX_DOCUMENTS_PER_CALL'])
+    packs += [[document] for document in documents if document['tokens'] > single_pass_tokens]
+    if packs:
+        group(summarize_pack_task.s([document['id'] for document in pack]) for pack in packs).apply_async()
+
+@shared_task(bind=True, base=PipelineTask)
+def summarize_pack_task(self, summary_ids):
+    """
+    Summarizes one pack of already-scraped summaries with a single model request.
+    """
+    # The scraped texts come along in the same query (one JOIN instead of one query per blob);
+    # rows another delivery already finished are left alone
+    summaries = list(Summary.objects.filter(id__in=summary_ids, status='PROCESSING').select_related('content'))
+    try:
+        cache = get_summary_cache()
+        texts = {summary.id: summary.input_content for summary in summaries}
+
+        # 1. Anything already in the shared cache (or a near-duplicate of a finished page) does not need the model
+        to_summarize = []
+        for summary in summaries:
+            cached_summary = reused_summary(cache, texts[summary.id], summary)
+            if cached_summary is None:
+                to_summarize.append(summary)
+            else:
+                summary.output_summary = cached_summary
 
-        # 4. SUMMARIZE
-        ai_summary = agent.summarize_text(clean_text)
+        # 2. One model call for the rest of the pack (a long document always comes alone and is map-reduced)
+        if to_summarize:
+            agent = ResearchAgent()
+            with stage('compress', documents=len(to_summarize)):
+                pending_texts = [compress_for_prompt(texts[summary.id]) for summary in to_summarize]
+            if len(pending_texts) == 1 and is_long_document(pending_texts[0]):
+                ai_summaries = [agent.summarize_long_text(pending_texts[0], segment_cache=cache)]
+            else:
+                ai_summaries = agent.summarize_texts(pending_texts)
+            for summary, ai_summary in zip(to_summarize, ai_summaries):
+                summary.output_summary = ai_summary
+                cache.store(summary.url, texts[summary.id], ai_summary)
 
-        # 5. Finish
-        summary.output_summary = ai_summary
-        summary.status = 'COMPLETED'
-        summary.save()
+        # 3. Finish (and index every row for search, in the same UPDATE), unless it failed or finished meanwhile
+        for summary in summaries:
+            summary.search_vector = search_document(summary.url, summary.output_summary)
+            summary.text_vector = text_document(texts[summary.id])
+        with stage('db_write', rows=len(summaries)):
+            summaries = Summary.objects.complete(summaries, ['output_summary', 'search_vector', 'text_vector'])
+        SUMMARIES.labels('COMPLETED').inc(len(summaries))
+        for summary in summaries:
+            publish_status(summary.user_id, summary.id, summary.status)
+        index_related_task.delay([summary.id for summary in summaries] + settle_followers(summaries))
 
     except Exception as e:
-        summary = Summary.objects.get(id=summary_id)
-        summary.status = 'FAILED'
-        # Ideally, save the error message to a new field or log it
-        summary.save()
\ No newline at end of file
+        # The whole pack comes back later (summaries already in the cache are not asked for again)
+        retry_later(self, e, summary_ids)
+        print(f"Batch summarization failed for {summary_ids}: {e}")
+        SUMMARIES.labels('FAILED').inc(Summary.objects.filter(id__in=summary_ids).fail())
+        for summary in summaries:
+            publish_status(summary.user_id, summary.id, 'FAILED')
+        settle_followers([Summary(pk=summary_id, status='FAILED') for summary_id in summary_ids])
+
+
+# ==========================================
+# FAIR SCHEDULING (domain/scheduling.py)
+# ==========================================
+# Submitted jobs wait in per-user queues; they are started (process_summary_task / process_summary_batch_task)
+# when the caps let them through: right away if there is room, else by dispatch_summaries_task, which comes
+# back every RECHECK_SECONDS while anything waits.
+
+def schedule_summaries(lane: str, user_id, summary_ids: list):
+    """Queues new jobs of `user_id` in `lane` (INTERACTIVE: one URL submitted, BULK: a batch) and dispatches."""
+    if not settings.SUMMARY_SCHEDULING['ENABLED']:
+        start_jobs(lane, summary_ids)
+        return
+    get_fair_scheduler().push(lane, user_id, summary_ids)
+    dispatch_summaries()
+
+def promote_leader(follower: Summary):
+    """
+    A single URL submitted that follows a running job (single-flight) waits for that job: if it is still queued in
+    the bulk lane (somebody's import), it moves to the follower's interactive lane and goes ahead of the import.
+    """
+    if not settings.SUMMARY_SCHEDULING['ENABLED'] or follower.leader_id is None:
+        return
+    owner_id = Summary.objects.filter(pk=follower.leader_id).values_list('user_id', flat=True).first()
+    if owner_id is not None and get_fair_scheduler().promote(follower.leader_id, owner_id, follower.user_id):
+        dispatch_summaries()
+
+def dispatch_summaries():
+    """Starts the waiting jobs there is room for; if some still wait, makes sure a recheck is scheduled."""
+    scheduler = get_fair_scheduler()
+    waiting = scheduler.dispatch(start_jobs, active_summary_ids)
+    recheck_seconds = settings.SUMMARY_SCHEDULING['RECHECK_SECONDS']
+    # The flag outlives the countdown: a lost recheck is replaced after a while
+    if waiting and scheduler.backend.claim_recheck(recheck_seconds * 10):
+        dispatch_summaries_task.apply_async(countdown=recheck_seconds)
+
+@shared_task
+def dispatch_summaries_task():
+    scheduler = get_fair_scheduler()
+    scheduler.backend.release_recheck()
+    dispatch_summaries()
+
+def start_jobs(lane: str, summary_ids: list):
+    if lane == BULK:
+        process_summary_batch_task.delay(summary_ids)
+    else:
+        for summary_id in summary_ids:
+            process_summary_task.delay(summary_id)
+
+def active_summary_ids(summary_ids: list) -> set:
+    """The ids (as strings) of the summaries still PENDING or PROCESSING."""
+    rows = Summary.objects.filter(id__in=summary_ids, status__in=ACTIVE_STATUSES).values_list('id', flat=True)
+    return {str(summary_id) for summary_id in rows}
@@ -0,0 +1,278 @@
+# Pipeline instrumentation: OpenTelemetry spans and Prometheus metrics for every stage of a summary
+import contextvars
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from opentelemetry import context as otel_context, propagate, trace
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+tracer = trace.get_tracer('intelliresearchhub.pipeline')
+
+# Scraping and the model take seconds to minutes; parsing and DB writes milliseconds
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+STAGE_SECONDS = Histogram(
+    'summary_stage_seconds', 'Time spent in one stage of the summary pipeline',
+    ['stage', 'domain'], buckets=STAGE_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'summary_queue_wait_seconds', 'Time a summary waited in a queue before its stage started',
+    ['stage'], buckets=QUEUE_BUCKETS,
+)
+MODEL_TOKENS = Counter(
+    'summary_model_tokens', 'Tokens sent to (input) and generated by (output) the model',
+    ['direction', 'domain'],
+)
+TASKS = Counter('summary_tasks', 'Celery tasks run, by final state (SUCCESS, FAILURE, RETRY)', ['task', 'state'])
+SUMMARIES = Counter('summary_results', 'Summaries finished, by status (COMPLETED, FAILED)', ['status'])
+REQUESTS = Counter('summary_requests', 'URLs submitted, by how they were answered (cached, queued, followed)', ['outcome'])
+REUSED = Counter('summary_reuses', 'Scraped pages summarized without the model, by source (content_cache, near_duplicate)', ['source'])
+PROMPT_TOKENS_REMOVED = Counter(
+    'prompt_tokens_removed', 'Estimated tokens dropped from texts before the prompt, by reason '
+    '(repeated, boilerplate, link_list, budget)', ['reason'],
+)
+PROMPT_TOKENS_SAVED = Histogram(
+    'prompt_tokens_saved', 'Estimated tokens dropped from the text of one job before the prompt',
+    buckets=(0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+DB_QUERIES = Counter('db_queries', 'SQL statements executed by this process', ['alias'])
+
+# The domain of the summary being worked on, for the stages that never see its URL (the model calls)
+_current_domain = contextvars.ContextVar('summary_domain', default='')
+
+_domains = set()
+_domains_lock = threading.Lock()
+
+
+def domain_label(url: str) -> str:
+    """
+    The `domain` label for a URL: its host without "www.".
+    Only the first TELEMETRY['MAX_DOMAINS'] hosts of a process get a label of their own, the rest share
+    'other' (one time series per host of the web would swamp Prometheus).
+    """
+    host = (urlsplit(url).hostname or '').lower().rstrip('.')
+    host = host[4:] if host.startswith('www.') else host
+    if not host:
+        return ''
+    if host in _domains:
+        return host
+    with _domains_lock:
+        if len(_domains) >= settings.TELEMETRY['MAX_DOMAINS']:
+            return 'other'
+        _domains.add(host)
+    return host
+
+
+def current_domain() -> str:
+    return _current_domain.get()
+
+
+@contextmanager
+def stage(name: str, url: str = None, **attributes):
+    """
+    Times one stage of the pipeline ('fetch', 'parse', 'prompt', 'model', 'db_write'...):
+    a span named summary.<name> (errors are recorded on it) and an observation of summary_stage_seconds.
+    Without `url`, the domain given to annotate_task() is used.
+    """
+    domain = domain_label(url) if url else current_domain()
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    started = time.perf_counter()
+    with tracer.start_as_current_span(f'summary.{name}', attributes={**attributes, 'url.domain': domain}) as span:
+        try:
+            yield span
+        finally:
+            STAGE_SECONDS.labels(name, domain).observe(time.perf_counter() - started)
+
+
+def annotate_task(url: str):
+    """Tells the running task's span which page it works on: the `domain` of its stages and of its model tokens."""
+    domain = domain_label(url)
+    _current_domain.set(domain)
+    trace.get_current_span().set_attribute('url.domain', domain)
+
+
+def observe_queue_wait(stage_name: str, since):
+    """
+    Records how long a summary waited before `stage_name` started. `since` is when it was queued:
+    the row's created_at for the first stage, or the time.time() the previous stage handed it on.
+    """
+    if since is None:
+        return
+    if isinstance(since, datetime):
+        since = since.timestamp()
+    QUEUE_WAIT_SECONDS.labels(stage_name).observe(max(0.0, time.time() - since))
+
+
+def record_model_usage(usage, domain: str = None):
+    """Counts the tokens of one model response (its usage_metadata) and adds them to the current span."""
+    span = trace.get_current_span()
+    for direction, field in (('input', 'prompt_token_count'), ('output', 'candidates_token_count')):
+        count = getattr(usage, field, None)
+        if isinstance(count, int):
+            MODEL_TOKENS.labels(direction, current_domain() if domain is None else domain).inc(count)
+            span.set_attribute(f'gen_ai.usage.{direction}_tokens', count)
+
+
+def record_prompt_compression(tokens_before: int, tokens_after: int, removed: dict):
+    """Counts the tokens compression dropped from one text (domain/compression.py), and adds them to the current span."""
+    for reason, tokens in removed.items():
+        PROMPT_TOKENS_REMOVED.labels(reason).inc(tokens)
+    PROMPT_TOKENS_SAVED.observe(tokens_before - tokens_after)
+    span = trace.get_current_span()
+    span.set_attribute('prompt.tokens_before', tokens_before)
+    span.set_attribute('prompt.tokens_after', tokens_after)
+
+
+def count_query(execute, sql, params, many, context):
+    DB_QUERIES.labels(context['connection'].alias).inc()
+    return execute(sql, params, many, context)
+
+
+def instrument_connection(sender=None, connection=None, **kwargs):
+    """connection_created handler (interface_layer/apps.py): every statement on the connection is counted."""
+    # The wrapper object outlives its database connection: a reconnect must not count twice
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+# ==========================================
+# CELERY SIGNALS (connected in intelliresearchhub/celery.py)
+# ==========================================
+# Every task gets a span, continued from the trace of whoever sent it (the trace context travels in the
+# message headers), so the fetch, parse and summarize tasks of a summary end up in a single trace.
+
+_task_spans = {}  # task id -> (span, context token, domain token)
+_task_spans_lock = threading.Lock()
+
+
+def inject_trace_headers(headers=None, **kwargs):
+    """before_task_publish"""
+    if headers is not None:
+        propagate.inject(headers)
+
+
+def start_task_span(task_id=None, task=None, **kwargs):
+    """task_prerun"""
+    configure_tracing()
+    domain_token = _current_domain.set('')  # Set by the task itself (annotate_task), undone when it ends
+    parent = propagate.extract(vars(task.request))
+    span = tracer.start_span(f'task {task.name}', context=parent, attributes={'celery.task_id': task_id or ''})
+    token = otel_context.attach(trace.set_span_in_context(span))
+    with _task_spans_lock:
+        _task_spans[task_id] = (span, token, domain_token)
+
+
+def end_task_span(task_id=None, task=None, state=None, **kwargs):
+    """task_postrun: closes the span, and counts the task (throughput and failures)."""
+    TASKS.labels(task.name, state or 'UNKNOWN').inc()
+    with _task_spans_lock:
+        span, token, domain_token = _task_spans.pop(task_id, (None, None, None))
+    if span is not None:
+        span.set_attribute('celery.state', state or '')
+        span.end()
+        otel_context.detach(token)
+        _current_domain.reset(domain_token)
+
+
+# ==========================================
+# EXPOSITION
+# ==========================================
+
+def metrics_registry():
+    """
+    The registry to expose. Prefork workers write their metrics to files in PROMETHEUS_MULTIPROC_DIR,
+    and the exposition adds up every process's files.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple:
+    """(body, content type) of a Prometheus scrape; the fair queue's gauges come with the web app's scrape only."""
+    return generate_latest(metrics_registry()) + generate_latest(queue_metrics_registry()), CONTENT_TYPE_LATEST
+
+
+_queue_registry = None
+
+
+def queue_metrics_registry():
+    global _queue_registry
+    if _queue_registry is None:
+        from domain.scheduling import QueueMetricsCollector
+        _queue_registry = CollectorRegistry()
+        _queue_registry.register(QueueMetricsCollector())
+    return _queue_registry
+
+
+def prepare_multiprocess_dir():
+    """Empties PROMETHEUS_MULTIPROC_DIR before a worker forks its children (files of dead processes would be summed)."""
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def start_worker_metrics_server():
+    """Workers have no Django view: they serve /metrics on TELEMETRY['WORKER_METRICS_PORT'], if set."""
+    from prometheus_client import start_http_server
+
+    port = settings.TELEMETRY['WORKER_METRICS_PORT']
+    if port:
+        start_http_server(port, registry=metrics_registry())
+        print(f"Serving Prometheus metrics on :{port}", flush=True)
+
+
+def mark_process_dead(pid: int):
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+# ==========================================
+# TRACING
+# ==========================================
+
+_tracing_pid = None
+
+
+def configure_tracing():
+    """
+    Exports spans over OTLP/HTTP to TELEMETRY['OTLP_ENDPOINT'] (a collector, Jaeger, Tempo...), if set.
+    Without it the spans cost next to nothing: the OpenTelemetry API hands out no-op spans.
+    Runs once per process, after the fork (the exporter's background thread does not survive one).
+    """
+    global _tracing_pid
+    endpoint = settings.TELEMETRY['OTLP_ENDPOINT']
+    if not endpoint or _tracing_pid == os.getpid():
+        return
+    _tracing_pid = os.getpid()
+    try:
+        # Optional dependencies (the 'tracing' extra)
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("TELEMETRY['OTLP_ENDPOINT'] is set but opentelemetry-sdk is not installed: spans are not exported", flush=True)
+        return
+
+    provider = TracerProvider(resource=Resource.create({'service.name': settings.TELEMETRY['SERVICE_NAME']}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")))
+    trace.set_tracer_provider(provider)
@@ -0,0 +1,27 @@
+from domain.batching import estimate_tokens, pack_documents
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+def test_pack_documents_respects_token_budget():
+    documents = [{'id': i, 'tokens': 400} for i in range(5)]
+
+    packs = pack_documents(documents, token_budget=1000, max_documents=10)
+
+    assert [[d['id'] for d in pack] for pack in packs] == [[0, 1], [2, 3], [4]]
+
+def test_pack_documents_respects_max_documents():
+    documents = [{'id': i, 'tokens': 1} for i in range(5)]
+
+    packs = pack_documents(documents, token_budget=1000, max_documents=2)
+
+    assert [len(pack) for pack in packs] == [2, 2, 1]
+
+def test_pack_documents_oversized_document_gets_its_own_pack():
+    documents = [{'id': 'small', 'tokens': 10}, {'id': 'huge', 'tokens': 5000}, {'id': 'tiny', 'tokens': 5}]
+
+    packs = pack_documents(documents, token_budget=1000, max_documents=10)
+
+    assert [[d['id'] for d in pack] for pack in packs] == [['small'], ['huge'], ['tiny']]
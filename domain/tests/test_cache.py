@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch
+from domain.cache import LocMemBackend, DatabaseBackend, SummaryCache
+from domain.canonical import normalize_url
+from interface_layer.models import SummaryCacheEntry
+
+def test_normalize_url():
+    """Scheme/host case, default ports and fragments must not create different keys."""
+    assert normalize_url("HTTPS://Example.com:443/Article#comments") == "https://example.com/Article"
+    assert normalize_url("http://example.com") == "http://example.com/"
+    assert normalize_url("http://example.com:8080/a?b=1") == "http://example.com:8080/a?b=1"
+
+def test_locmem_lru_eviction():
+    """Once full, the least recently USED key is dropped (not the oldest written)."""
+    backend = LocMemBackend(max_entries=2)
+    backend.set("a", {"v": 1}, ttl=60)
+    backend.set("b", {"v": 2}, ttl=60)
+
+    backend.get("a")  # "a" is now more recent than "b"
+    backend.set("c", {"v": 3}, ttl=60)
+
+    assert backend.get("a") == {"v": 1}
+    assert backend.get("b") is None
+    assert backend.get("c") == {"v": 3}
+
+def test_locmem_ttl_expiry():
+    backend = LocMemBackend(max_entries=10)
+    with patch("domain.cache.time.monotonic", return_value=1000):
+        backend.set("a", {"v": 1}, ttl=30)
+    with patch("domain.cache.time.monotonic", return_value=1029):
+        assert backend.get("a") == {"v": 1}
+    with patch("domain.cache.time.monotonic", return_value=1031):
+        assert backend.get("a") is None
+
+def test_summary_cache_url_and_content_lookup():
+    """
+    A stored summary is found both by URL (before scraping)
+    and by content (a different URL serving the same text).
+    """
+    cache = SummaryCache(LocMemBackend(max_entries=10), ttl=60, version="v1")
+    cache.store("https://example.com/post", "Cleaned Text", "Summary!")
+
+    assert cache.get_for_url("https://EXAMPLE.com/post#top") == "Summary!"
+    assert cache.get_for_content("Cleaned Text") == "Summary!"
+    assert cache.get_for_content("Other Text") is None
+    assert cache.get_for_url("https://example.com/other") is None
+
+def test_summary_cache_is_versioned():
+    """Changing the prompt/model version must invalidate old summaries."""
+    backend = LocMemBackend(max_entries=10)
+    SummaryCache(backend, ttl=60, version="v1").store("https://example.com", "Text", "Old")
+
+    assert SummaryCache(backend, ttl=60, version="v2").get_for_content("Text") is None
+
+@pytest.mark.django_db
+def test_database_backend_roundtrip_and_eviction():
+    backend = DatabaseBackend(max_entries=2)
+    backend.set("a", {"v": 1}, ttl=60)
+    backend.set("b", {"v": 2}, ttl=60)
+    backend.set("c", {"v": 3}, ttl=60)
+
+    assert backend.get("c") == {"v": 3}
+
+    backend.evict()
+    assert SummaryCacheEntry.objects.count() == 2
+    assert backend.get("a") is None  # Least recently used row went first
+
+@pytest.mark.django_db
+def test_database_backend_ignores_expired_rows():
+    backend = DatabaseBackend(max_entries=10)
+    backend.set("a", {"v": 1}, ttl=-1)
+
+    assert backend.get("a") is None
+
+@pytest.mark.django_db
+def test_database_backend_namespaces_do_not_evict_each_other():
+    summaries = DatabaseBackend(max_entries=1)
+    pages = DatabaseBackend(max_entries=1, namespace="page-cache")
+    summaries.set("a", {"v": 1}, ttl=60)
+    pages.set("a", {"v": 2}, ttl=60)
+    pages.set("b", {"v": 3}, ttl=60)
+
+    pages.evict()
+    assert summaries.get("a") == {"v": 1}
+    assert pages.get("a") is None
+    assert pages.get("b") == {"v": 3}
@@ -0,0 +1,26 @@
+import pytest
+from domain.canonical import normalize_url, url_key
+
+@pytest.mark.parametrize("url, expected", [
+    # Tracking parameters go, the others stay (sorted)
+    ("https://a.com/post?utm_source=tw&utm_medium=social&id=7", "https://a.com/post?id=7"),
+    ("https://a.com/post?fbclid=abc&page=2&gclid=x", "https://a.com/post?page=2"),
+    ("https://a.com/search?q=llm&lang=en", "https://a.com/search?lang=en&q=llm"),
+    ("https://a.com/post?flag", "https://a.com/post?flag="),
+    # Trailing slashes, except the root
+    ("https://a.com/docs/intro/", "https://a.com/docs/intro"),
+    ("https://a.com/", "https://a.com/"),
+    ("https://a.com", "https://a.com/"),
+    # Fragments, case of scheme and host, default ports, trailing dot of the host
+    ("HTTPS://A.com.:443/Docs#setup", "https://a.com/Docs"),
+    ("http://a.com:8080/x", "http://a.com:8080/x"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+def test_path_case_is_significant():
+    assert normalize_url("https://a.com/Docs") != normalize_url("https://a.com/docs")
+
+def test_same_page_same_key():
+    assert url_key("https://a.com/post/?utm_campaign=x#top") == url_key("https://A.com/post")
+    assert url_key("https://a.com/post?id=1") != url_key("https://a.com/post?id=2")
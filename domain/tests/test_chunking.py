@@ -0,0 +1,42 @@
+import random
+from domain.batching import estimate_tokens
+from domain.chunking import split_segments
+
+def make_document(sentences=2000, seed=7):
+    rng = random.Random(seed)
+    words = ["model", "attention", "layer", "data", "training", "result", "paper", "token", "graph", "loss"]
+    return " ".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(5, 30))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+def test_segments_cover_the_text_within_budget():
+    text = make_document()
+    segments = split_segments(text, max_tokens=1000)
+
+    assert len(segments) > 1
+    assert " ".join(segments) == text
+    assert all(estimate_tokens(segment) <= 1000 for segment in segments)
+
+def test_an_edit_only_changes_the_segments_around_it():
+    text = make_document()
+    sentences = text.split(". ")
+    sentences[len(sentences) // 2] = "A completely new sentence inserted by the author"
+    edited = ". ".join(sentences)
+
+    before = split_segments(text, max_tokens=1000)
+    after = split_segments(edited, max_tokens=1000)
+
+    # Content-defined boundaries resynchronize right after the edit
+    changed = set(after) - set(before)
+    assert 1 <= len(changed) <= 2
+
+def test_sentence_longer_than_a_segment_is_cut_at_spaces():
+    text = " ".join(["word"] * 5000)  # No sentence end at all
+    segments = split_segments(text, max_tokens=500)
+
+    assert " ".join(segments) == text
+    assert all(estimate_tokens(segment) <= 500 for segment in segments)
+
+def test_short_text_is_one_segment():
+    assert split_segments("Just one sentence. And another.", max_tokens=1000) == ["Just one sentence. And another."]
@@ -0,0 +1,111 @@
+import httpx
+import pytest
+from unittest.mock import patch, Mock
+from domain.circuit_breaker import CircuitBreaker, LocMemCircuitStore
+from domain.errors import (
+    CircuitOpenError,
+    ScrapeError,
+    TransientScrapeError,
+    TransientSummaryError,
+    classify_model_error,
+    classify_scrape_error,
+)
+from domain.fetcher import FetchedPage
+from domain.politeness import RateLimited
+from domain.services import ResearchAgent
+
+def make_breaker(reset_timeout=30):
+    return CircuitBreaker("gemini", LocMemCircuitStore(), failure_threshold=2, window=60,
+                          reset_timeout=reset_timeout, probe_timeout=60)
+
+def overloaded():
+    raise TransientSummaryError("503")
+
+def fail_twice(breaker):
+    for _ in range(2):
+        with pytest.raises(TransientSummaryError):
+            breaker.call(overloaded, classify_model_error)
+
+def test_circuit_opens_after_threshold_and_refuses_calls():
+    breaker = make_breaker()
+    fail_twice(breaker)
+
+    endpoint = Mock()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.call(endpoint, classify_model_error)
+    endpoint.assert_not_called()
+    assert 29 < error.value.retry_after <= 30
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker(reset_timeout=0)
+    fail_twice(breaker)
+
+    # The probe is in flight: everyone else keeps waiting
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # It succeeds: the circuit closes
+    breaker.record_success(probe=True)
+    assert breaker.call(lambda: "ok", classify_model_error) == "ok"
+    assert breaker.before_call() is False
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = make_breaker(reset_timeout=0)
+    fail_twice(breaker)
+    breaker.reset_timeout = 30
+
+    with pytest.raises(TransientSummaryError):
+        breaker.call(overloaded, classify_model_error)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_permanent_errors_do_not_trip_the_circuit():
+    breaker = make_breaker()
+    for _ in range(5):
+        with pytest.raises(ScrapeError):
+            breaker.call(Mock(side_effect=ScrapeError("404")), classify_model_error)
+    assert breaker.before_call() is False
+
+def status_error(code, headers=None):
+    return httpx.HTTPStatusError(str(code), request=Mock(), response=Mock(status_code=code, headers=headers or {}))
+
+@pytest.mark.parametrize("error, expected, retry_after", [
+    (status_error(503, {"Retry-After": "7"}), TransientScrapeError, 7),
+    (status_error(429), TransientScrapeError, None),
+    (status_error(404), ScrapeError, None),
+    (httpx.ReadTimeout("slow"), TransientScrapeError, None),
+])
+def test_scrape_errors_are_classified(error, expected, retry_after):
+    classified = classify_scrape_error(error, "https://a.com/")
+    assert type(classified) is expected
+    assert getattr(classified, "retry_after", None) == retry_after
+
+def test_a_host_that_keeps_timing_out_gets_a_break(settings):
+    settings.CIRCUIT_BREAKER = {**settings.CIRCUIT_BREAKER, "FAILURE_THRESHOLD": 2}
+    with patch.object(ResearchAgent, "afetch_page", side_effect=httpx.ConnectTimeout("down")) as mock_fetch:
+        for _ in range(2):
+            with pytest.raises(TransientScrapeError):
+                ResearchAgent().fetch_page("https://down.com/a")
+        with pytest.raises(CircuitOpenError):
+            ResearchAgent().fetch_page("https://down.com/b")
+
+        # Other hosts are not affected
+        with pytest.raises(TransientScrapeError):
+            ResearchAgent().fetch_page("https://other.com/")
+    assert mock_fetch.call_count == 3
+
+def test_a_probe_held_back_by_politeness_is_given_back(settings):
+    settings.CIRCUIT_BREAKER = {**settings.CIRCUIT_BREAKER, "FAILURE_THRESHOLD": 1, "RESET_TIMEOUT": 0}
+    with patch.object(ResearchAgent, "afetch_page", side_effect=httpx.ConnectTimeout("down")):
+        with pytest.raises(TransientScrapeError):
+            ResearchAgent().fetch_page("https://flaky.com/a")  # Trips the circuit, at once half-open
+
+    with patch.object(ResearchAgent, "wait_for_turn", side_effect=RateLimited("flaky.com", 2.5, reserved=True)):
+        with pytest.raises(RateLimited):
+            ResearchAgent().fetch_page("https://flaky.com/b")
+
+    # The next caller gets to probe, instead of CircuitOpenError until PROBE_TIMEOUT
+    with patch.object(ResearchAgent, "afetch_page", return_value=FetchedPage("<p>Back</p>")) as mock_fetch:
+        assert ResearchAgent().fetch_page("https://flaky.com/c").text == "<p>Back</p>"
+    mock_fetch.assert_called_once()
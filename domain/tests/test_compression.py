@@ -0,0 +1,71 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+
+from domain.batching import estimate_tokens
+from domain.compression import compress, compress_for_prompt
+from domain.content_store import save_content
+from interface_layer.models import Summary
+
+ARTICLE = (
+    "The city council approved the new transit plan on Tuesday, after months of debate. "
+    "It adds three bus lines and extends the tram to the airport by 2028. "
+    "Critics say the budget, which is close to a billion euros, is far too optimistic."
+)
+PAGE = (
+    "We use cookies to improve your experience. Home | News | Politics | Transit. "
+    + ARTICLE
+    + " Share this article. Read the full plan on the council's website, where it was published in May. "
+    "Share this article. Copyright 2026 City News. All rights reserved."
+)
+
+
+def test_boilerplate_link_lists_and_repeats_are_dropped():
+    compressed, removed = compress(PAGE, token_budget=10000, max_trim_ratio=0.25)
+
+    assert compressed == ARTICLE + " Read the full plan on the council's website, where it was published in May."
+    assert set(removed) == {'boilerplate', 'link_list', 'repeated'}
+    # An article without any is left exactly as it was (sentences differing in their numbers are no repeats)
+    text = f"{ARTICLE} Sales rose 5% in 2024. Sales rose 7% in 2025."
+    assert compress(text, token_budget=10000, max_trim_ratio=0.25) == (text, {})
+
+
+def test_a_text_slightly_over_the_budget_loses_its_least_dense_sentences():
+    caption = "Photo: Jane Doe, Reuters."
+    text = f"{ARTICLE} {caption} The first tram should run in 2027."
+    budget = estimate_tokens(text) - 5
+
+    compressed, removed = compress(text, token_budget=budget, max_trim_ratio=0.25)
+    assert compressed == f"{ARTICLE} The first tram should run in 2027."
+    assert removed == {'budget': estimate_tokens(caption) + 1}
+    # Far over the budget: kept whole, for the map-reduce pipeline
+    assert compress(text, token_budget=budget // 2, max_trim_ratio=0.25) == (text, {})
+
+
+def test_compress_for_prompt_can_be_turned_off(settings):
+    assert compress_for_prompt(PAGE) != PAGE
+    settings.PROMPT_COMPRESSION = {**settings.PROMPT_COMPRESSION, 'ENABLED': False}
+    assert compress_for_prompt(PAGE) == PAGE
+
+
+@pytest.mark.django_db
+def test_check_prompt_compression_compares_new_summaries_with_the_stored_ones(capsys):
+    user = get_user_model().objects.create_user(username="parity")
+    Summary.objects.create(user=user, url="https://news.example/transit", status="COMPLETED",
+                           output_summary="Council approves transit plan: bus lines, airport tram.",
+                           content=save_content(PAGE))
+
+    call_command("check_prompt_compression", "--dry-run")
+    assert "1 texts" in capsys.readouterr().out
+
+    with patch("interface_layer.management.commands.check_prompt_compression.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.summarize_text.side_effect = lambda text: (
+            "Council approves transit plan: bus lines, airport tram." if text == PAGE else "Cookies and sports news."
+        )
+        with pytest.raises(CommandError):
+            call_command("check_prompt_compression")
+        MockAgentClass.return_value.summarize_text.side_effect = lambda text: "Council approves transit plan."
+        call_command("check_prompt_compression")
+    assert "similarity to the stored summaries" in capsys.readouterr().out
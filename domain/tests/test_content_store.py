@@ -0,0 +1,72 @@
+import pytest
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from domain import content_store
+from domain.content_store import compress, decompress, save_content, delete_unreferenced_content
+from interface_layer.models import ContentBlob, Summary
+
+User = get_user_model()
+
+TEXT = "Welcome to the Article. This is the real content. " * 200
+
+@pytest.mark.parametrize("codec", ["zstd", "zlib"])
+def test_compress_roundtrip(codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+        stored_codec, data = compress(TEXT)
+    else:
+        with patch.object(content_store, "zstandard", None):
+            stored_codec, data = compress(TEXT)
+
+    assert stored_codec == codec
+    assert len(data) < len(TEXT) // 10
+    assert decompress(stored_codec, data) == TEXT
+
+def test_decompress_rejects_unknown_codec():
+    with pytest.raises(ValueError):
+        decompress("brotli", b"")
+
+@pytest.mark.django_db
+def test_same_text_is_stored_once():
+    """Every user summarizing the same page shares one compressed blob."""
+    user = User.objects.create_user(username="tester")
+    first = Summary.objects.create(user=user, url="http://a.com", content=save_content(TEXT))
+    second = Summary.objects.create(user=user, url="http://mirror.com", content=save_content(TEXT))
+
+    assert ContentBlob.objects.count() == 1
+    assert first.content_id == second.content_id
+
+@pytest.mark.django_db
+def test_input_content_is_loaded_lazily(django_assert_num_queries):
+    user = User.objects.create_user(username="tester")
+    Summary.objects.create(user=user, url="http://a.com", content=save_content(TEXT))
+
+    with django_assert_num_queries(1):
+        summary = Summary.objects.get(url="http://a.com")  # The blob is not part of this query
+    with django_assert_num_queries(1):
+        assert summary.input_content == TEXT
+
+@pytest.mark.django_db
+def test_delete_unreferenced_content():
+    user = User.objects.create_user(username="tester")
+    Summary.objects.create(user=user, url="http://a.com", content=save_content("Kept"))
+    save_content("Orphan")
+
+    assert delete_unreferenced_content() == 0  # Too recent: a worker may be about to attach it
+    assert delete_unreferenced_content(timedelta(0)) == 1
+    assert ContentBlob.objects.get().text == "Kept"
+
+
+@pytest.mark.django_db
+def test_delete_unreferenced_content_command():
+    ContentBlob.objects.filter(digest=save_content("Orphan").digest).update(created_at=timezone.now() - timedelta(days=1))
+    save_content("Just saved")
+
+    out = StringIO()
+    call_command("delete_unreferenced_content", stdout=out)
+    assert "Deleted 1 " in out.getvalue()
+    assert ContentBlob.objects.get().text == "Just saved"
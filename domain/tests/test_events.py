@@ -0,0 +1,51 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+from domain.events import EventHub, QUEUE_SIZE, channel_for, publish_status
+
+def test_publish_status_uses_the_users_channel(event_publisher):
+    publish_status(7, "abc", "COMPLETED")
+
+    event_publisher.publish.assert_called_once_with(
+        "summary-events:7", json.dumps({"id": "abc", "status": "COMPLETED"})
+    )
+
+def test_publish_status_never_raises(event_publisher):
+    """A Redis outage must not fail the Celery task that is publishing."""
+    event_publisher.publish.side_effect = ConnectionError("Redis is down")
+    publish_status(7, "abc", "FAILED")
+
+def make_hub():
+    hub = EventHub(url="redis://unused")
+    hub._read_forever = AsyncMock()  # No Redis: messages are dispatched by hand
+    return hub
+
+def test_hub_routes_events_to_that_users_listeners():
+    async def scenario():
+        hub = make_hub()
+        mine, also_mine, theirs = hub.add_listener(1), hub.add_listener(1), hub.add_listener(2)
+
+        hub.dispatch(channel_for(1).encode(), b'{"id": "a", "status": "PROCESSING"}')
+
+        assert mine.get_nowait() == {"id": "a", "status": "PROCESSING"}
+        assert also_mine.get_nowait() == {"id": "a", "status": "PROCESSING"}
+        assert theirs.empty()
+
+        hub.remove_listener(1, mine)
+        hub.remove_listener(1, also_mine)
+        hub.dispatch(channel_for(1), '{"id": "b", "status": "COMPLETED"}')  # Nobody listening: ignored
+        assert 1 not in hub._listeners and "1" not in hub._listeners
+
+    asyncio.run(scenario())
+
+def test_hub_drops_oldest_event_for_a_slow_listener():
+    async def scenario():
+        hub = make_hub()
+        queue = hub.add_listener(1)
+        for i in range(QUEUE_SIZE + 1):
+            hub.dispatch(channel_for(1), json.dumps({"id": str(i), "status": "PROCESSING"}))
+
+        assert queue.qsize() == QUEUE_SIZE
+        assert queue.get_nowait()["id"] == "1"
+
+    asyncio.run(scenario())
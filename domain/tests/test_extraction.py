@@ -0,0 +1,61 @@
+import pytest
+from domain.extraction import clean_html, StreamingTextExtractor
+
+# Tricky markup where a naive streaming parser would drift from BeautifulSoup's output
+PARITY_CASES = [
+    "<html><head><title>Test</title><style>p {}</style></head><body><p>Hello <b>big</b> world</p></body></html>",
+    "<div><nav>Menu <a>Home</a></div> after the nav",  # </div> also closes the unclosed <nav>
+    "<p>text</p><aside>side<aside>nested</aside>still side</aside><p>back</p>",
+    "<p>A&amp;B &copy; &#150; &#x41; &unknown; &#9999999;</p>",
+    "<p>line one\n   line two\t\ttabbed   spaced</p>",
+    "<pre>   \n   </pre><p>a</p> \t <p>b</p>",
+    "<ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby><template>hidden</template>shown",
+    "<p>a<br>b</br>c<br/>d<img></img>e</p>",
+    "<!DOCTYPE html><!-- comment --><p>x<![CDATA[cdata]]>y</p><?php echo 1 ?>",
+    "<footer>Copyright</footer><header/>kept <nav/>too",
+    "unclosed <nav> everything after is navigation",
+]
+
+def stream(html, limit=15000, chunk_size=7):
+    extractor = StreamingTextExtractor(limit=limit)
+    for i in range(0, len(html), chunk_size):
+        if extractor.feed(html[i:i + chunk_size]):
+            break
+    return extractor.result()
+
+@pytest.mark.parametrize("html", PARITY_CASES)
+def test_streaming_matches_reference_cleaning(html):
+    assert stream(html) == clean_html(html)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 100000])
+def test_streaming_is_independent_of_chunk_boundaries(chunk_size):
+    html = "".join(PARITY_CASES)
+    assert stream(html, chunk_size=chunk_size) == clean_html(html)
+
+def test_streaming_stops_early_at_the_limit():
+    """feed() reports done long before the end of a huge page, with the same truncated text."""
+    paragraph = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n"
+    html = paragraph * 20000
+
+    extractor = StreamingTextExtractor(limit=500)
+    consumed = 0
+    for i in range(0, len(html), 1024):
+        consumed += 1024
+        if extractor.feed(html[i:i + 1024]):
+            break
+
+    assert extractor.done
+    assert consumed < len(html) // 100
+    assert extractor.result() == clean_html(html, limit=500)
+
+def test_streaming_stops_early_on_minified_pages():
+    """Pages without a single line break must still terminate early."""
+    html = "<p>Lorem ipsum dolor sit amet.</p>" * 20000
+
+    extractor = StreamingTextExtractor(limit=500)
+    for i in range(0, len(html), 1024):
+        if extractor.feed(html[i:i + 1024]):
+            break
+
+    assert extractor.done
+    assert extractor.result() == clean_html(html, limit=500)
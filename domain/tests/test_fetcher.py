@@ -0,0 +1,163 @@
+import asyncio
+import httpx
+import pytest
+from domain.fetcher import AsyncFetcher, get_fetcher, run_sync
+
+def make_fetcher(handler, **kwargs):
+    return AsyncFetcher(transport=httpx.MockTransport(handler), **kwargs)
+
+def test_fetch_text_sends_browser_user_agent():
+    seen = {}
+
+    def handler(request):
+        seen['user_agent'] = request.headers['User-Agent']
+        return httpx.Response(200, text="<p>Hello</p>")
+
+    async def scenario():
+        fetcher = make_fetcher(handler)
+        try:
+            return await fetcher.fetch_text("http://example.com/")
+        finally:
+            await fetcher.aclose()
+
+    assert asyncio.run(scenario()) == "<p>Hello</p>"
+    assert seen['user_agent'] == 'Mozilla/5.0'
+
+def test_fetch_text_raises_on_http_error():
+    async def scenario():
+        fetcher = make_fetcher(lambda request: httpx.Response(404))
+        try:
+            await fetcher.fetch_text("http://example.com/missing")
+        finally:
+            await fetcher.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scenario())
+
+def test_fetch_text_stops_reading_at_max_bytes():
+    """A huge body is cut off at max_bytes instead of being fully buffered."""
+    async def scenario():
+        fetcher = make_fetcher(lambda request: httpx.Response(200, content=b"a" * 10_000), max_bytes=100)
+        try:
+            return await fetcher.fetch_text("http://example.com/big")
+        finally:
+            await fetcher.aclose()
+
+    assert len(asyncio.run(scenario())) == 100
+
+def test_fetch_page_is_conditional_with_validators():
+    seen = {}
+
+    def handler(request):
+        seen.update(request.headers)
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304, headers={'ETag': '"v1"'})
+        return httpx.Response(200, text="<p>New</p>", headers={'ETag': '"v2"', 'Last-Modified': 'Tue, 01 Sep 2026 10:00:00 GMT'})
+
+    async def scenario(etag):
+        fetcher = make_fetcher(handler)
+        try:
+            return await fetcher.fetch_page("http://example.com/", etag=etag, last_modified='Mon, 31 Aug 2026 10:00:00 GMT')
+        finally:
+            await fetcher.aclose()
+
+    unchanged = asyncio.run(scenario('"v1"'))
+    assert unchanged.not_modified and unchanged.text is None
+    assert seen['if-modified-since'] == 'Mon, 31 Aug 2026 10:00:00 GMT'
+    # The 304 keeps the Last-Modified we already had
+    assert unchanged.last_modified == 'Mon, 31 Aug 2026 10:00:00 GMT'
+
+    changed = asyncio.run(scenario('"old"'))
+    assert (changed.text, changed.etag, changed.not_modified) == ("<p>New</p>", '"v2"', False)
+
+def test_per_host_concurrency_is_bounded():
+    """No more than max_per_host requests may be in flight against one host."""
+    in_flight = {'now': 0, 'peak': 0}
+
+    async def handler(request):
+        in_flight['now'] += 1
+        in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+        await asyncio.sleep(0.01)
+        in_flight['now'] -= 1
+        return httpx.Response(200, text="ok")
+
+    async def scenario():
+        fetcher = make_fetcher(handler, max_per_host=3)
+        try:
+            return await fetcher.fetch_many([f"http://example.com/{i}" for i in range(12)])
+        finally:
+            await fetcher.aclose()
+
+    results = asyncio.run(scenario())
+    assert results == ["ok"] * 12
+    assert in_flight['peak'] == 3
+
+def test_per_host_semaphores_are_dropped_once_unused():
+    """A long-lived fetcher does not keep one semaphore for every host it ever saw."""
+    async def handler(request):
+        return httpx.Response(200, text="ok")
+
+    async def scenario():
+        fetcher = make_fetcher(handler)
+        try:
+            await fetcher.fetch_many([f"http://host{i}.example.com/" for i in range(50)])
+            await fetcher.fetch_page("http://page.example.com/")
+            return len(fetcher._host_slots)
+        finally:
+            await fetcher.aclose()
+
+    assert asyncio.run(scenario()) == 0
+
+def test_sync_callers_reuse_one_fetcher():
+    """Synchronous callers share the background loop, and therefore one connection pool."""
+    async def current_fetcher():
+        return get_fetcher()
+
+    assert run_sync(current_fetcher()) is run_sync(current_fetcher())
+
+def test_fetch_stream_stops_when_consumer_is_done():
+    """Once the consumer has enough, the rest of the body is not read."""
+    class TakeTwoChunks:
+        def __init__(self):
+            self.chunks = []
+
+        def feed(self, text):
+            self.chunks.append(text)
+            return len(self.chunks) == 2
+
+    async def body():
+        for _ in range(100):
+            yield b"x" * 1000
+
+    async def scenario():
+        consumer = TakeTwoChunks()
+        fetcher = make_fetcher(lambda request: httpx.Response(200, content=body()))
+        try:
+            await fetcher.fetch_stream("http://example.com/huge", consumer)
+        finally:
+            await fetcher.aclose()
+        return consumer
+
+    assert len(asyncio.run(scenario()).chunks) == 2
+
+def test_fetch_page_stops_once_the_streaming_parser_has_its_text():
+    """The raw page is only read up to where the extractor's text budget filled up."""
+    from domain.extraction import StreamingTextExtractor, clean_html
+
+    paragraphs = [f"<p>Paragraph {i} of a very long page.</p>".encode() for i in range(1000)]
+
+    async def body():
+        for paragraph in paragraphs:
+            yield paragraph
+
+    async def scenario(extractor):
+        fetcher = make_fetcher(lambda request: httpx.Response(200, content=body()))
+        try:
+            return await fetcher.fetch_page("http://example.com/long", consumer=extractor)
+        finally:
+            await fetcher.aclose()
+
+    extractor = StreamingTextExtractor(limit=200)
+    page = asyncio.run(scenario(extractor))
+    assert len(page.text) < 500
+    assert extractor.result() == clean_html(b"".join(paragraphs).decode(), 200)
@@ -0,0 +1,65 @@
+import os
+from unittest.mock import Mock
+from domain import genai_client
+from domain.genai_client import GenAIClientManager
+
+def make_manager(tmp_path, key="key-1"):
+    (tmp_path / "google_credentials").write_text(key + "\n")
+    factory = Mock(side_effect=lambda api_key: Mock(api_key=api_key))
+    return GenAIClientManager(secrets_dir=str(tmp_path), client_factory=factory), factory
+
+def test_client_is_built_once_and_reused(tmp_path):
+    manager, factory = make_manager(tmp_path)
+
+    first = manager.get_client()
+    second = manager.get_client()
+
+    assert first is second
+    assert first.api_key == "key-1"
+    factory.assert_called_once_with("key-1")
+
+def test_rotated_secret_gives_a_new_client(tmp_path):
+    manager, factory = make_manager(tmp_path)
+    old_client = manager.get_client()
+
+    secret = tmp_path / "google_credentials"
+    secret.write_text("key-2-rotated\n")
+    os.utime(secret, ns=(0, 1))  # Make sure the mtime differs even on coarse filesystem clocks
+
+    new_client = manager.get_client()
+
+    assert new_client.api_key == "key-2-rotated"
+    old_client.close.assert_called_once()
+
+def test_touched_secret_with_same_key_keeps_the_client(tmp_path):
+    manager, factory = make_manager(tmp_path)
+    client = manager.get_client()
+
+    os.utime(tmp_path / "google_credentials", ns=(0, 1))
+
+    assert manager.get_client() is client
+    assert factory.call_count == 1
+
+def test_env_var_fallback_and_missing_key(tmp_path, monkeypatch):
+    factory = Mock()
+    manager = GenAIClientManager(secrets_dir=str(tmp_path), client_factory=factory)
+
+    monkeypatch.delenv("GOOGLE_CREDENTIALS", raising=False)
+    assert manager.get_client() is None
+
+    monkeypatch.setenv("GOOGLE_CREDENTIALS", "env-key")
+    manager.get_client()
+    factory.assert_called_once_with("env-key")
+
+def test_forked_child_starts_without_the_parents_client(tmp_path, monkeypatch):
+    manager, factory = make_manager(tmp_path)
+    monkeypatch.setattr(genai_client, "_manager", manager)
+    parent_client = genai_client.get_genai_client()
+
+    # What os.register_at_fork runs in the child
+    genai_client._reset_after_fork()
+
+    child_client = genai_client.get_genai_client()
+    assert child_client is not parent_client
+    assert child_client.api_key == "key-1"
+    parent_client.close.assert_not_called()  # Its sockets still belong to the parent
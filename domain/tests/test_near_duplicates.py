@@ -0,0 +1,65 @@
+import random
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from domain.content_store import save_content
+from domain.near_duplicates import BANDS, bands, hamming, near_duplicate_summary, simhash
+from interface_layer.models import Summary
+
+User = get_user_model()
+
+
+def article(seed: int, words: int = 2000) -> str:
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return ' '.join(rng.choice(vocabulary) for _ in range(words))
+
+
+def syndicated_copy(text: str) -> str:
+    """The same article with a partner's header and footer, and one word changed"""
+    words = text.split()
+    words[len(words) // 2] = "changed"
+    return "Originally published by our partner. " + ' '.join(words) + " Share this story."
+
+
+def test_simhash_of_a_copy_is_a_few_bits_away():
+    text = article(1)
+    assert hamming(simhash(text), simhash(syndicated_copy(text))) <= 3
+    assert hamming(simhash(text), simhash(article(2))) > 10
+    assert simhash("Too short to fingerprint.") is None
+
+
+def test_a_copy_within_the_distance_shares_a_band():
+    fingerprint = simhash(article(3))
+    for bits in ([0], [5, 40], [1, 17, 63]):
+        other = fingerprint
+        for bit in bits:
+            other ^= 1 << bit
+        assert set(bands(fingerprint)) & set(bands(other))
+    assert len(bands(fingerprint)) == BANDS
+
+
+@pytest.mark.django_db
+def test_near_duplicate_summary_finds_the_finished_copy():
+    user = User.objects.create_user(username="syndicated")
+    original = save_content(article(7))
+    Summary.objects.create(user=user, url="https://news.example/story", status="COMPLETED",
+                           output_summary="The story, summarized.", content=original)
+
+    mirror = save_content(syndicated_copy(article(7)))
+    assert mirror.digest != original.digest
+    assert near_duplicate_summary(mirror.simhash) == "The story, summarized."
+    assert near_duplicate_summary(save_content(article(5)).simhash) is None
+
+
+@pytest.mark.django_db
+def test_near_duplicate_summary_ignores_unfinished_copies(settings):
+    user = User.objects.create_user(username="running")
+    original = save_content(article(6))
+    Summary.objects.create(user=user, url="https://news.example/running", status="PROCESSING", content=original)
+
+    assert near_duplicate_summary(save_content(syndicated_copy(article(6))).simhash) is None
+    settings.NEAR_DUPLICATES = {**settings.NEAR_DUPLICATES, 'MAX_DISTANCE': 0}
+    Summary.objects.filter(content=original).update(status="COMPLETED", output_summary="Done.")
+    assert near_duplicate_summary(original.simhash) == "Done."
@@ -0,0 +1,53 @@
+import pathlib
+import pytest
+from domain.parsers import BACKENDS, get_parser_backend, LexborBackend, LxmlBackend, StreamingBackend
+
+# Real-world shaped pages (scripts, nav, entities, <pre>, tables, ruby...) with the text
+# clean_html() produces for them. Regenerate an .expected file only on purpose!
+GOLDEN_DIR = pathlib.Path(__file__).parent / "golden"
+GOLDEN_PAGES = sorted(GOLDEN_DIR.glob("*.html"))
+
+def make_backend(name):
+    backend_class = BACKENDS[name]
+    if not backend_class.available():
+        pytest.skip(f"{backend_class.requires} is not installed")
+    return backend_class()
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+@pytest.mark.parametrize("page", GOLDEN_PAGES, ids=lambda page: page.stem)
+def test_backend_matches_golden_text(name, page):
+    backend = make_backend(name)
+    expected = page.with_suffix(".expected").read_text(encoding="utf-8").rstrip("\n")
+
+    assert backend.clean(page.read_text(encoding="utf-8")) == expected
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_truncates_to_limit(name):
+    backend = make_backend(name)
+    html = "<p>Lorem ipsum dolor sit amet.</p>\n" * 1000
+
+    assert backend.clean(html, limit=100) == BACKENDS["html.parser"]().clean(html, limit=100)
+    assert len(backend.clean(html, limit=100)) == 100
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_handles_empty_page(name):
+    assert make_backend(name).clean("") == ""
+
+def test_get_parser_backend_by_name(settings):
+    settings.HTML_PARSER_BACKEND = "stream"
+    assert isinstance(get_parser_backend(), StreamingBackend)
+    assert get_parser_backend("stream").streaming
+
+def test_auto_prefers_the_fastest_installed_backend(settings):
+    settings.HTML_PARSER_BACKEND = "auto"
+
+    if LexborBackend.available():
+        assert isinstance(get_parser_backend(), LexborBackend)
+    elif LxmlBackend.available():
+        assert isinstance(get_parser_backend(), LxmlBackend)
+    else:
+        assert isinstance(get_parser_backend(), StreamingBackend)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_parser_backend("regex")
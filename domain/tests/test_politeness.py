@@ -0,0 +1,103 @@
+import httpx
+import pytest
+from unittest.mock import patch, AsyncMock, Mock
+from celery.exceptions import Retry
+from domain.politeness import (
+    LocMemTokenBucket,
+    PolitenessScheduler,
+    RateLimited,
+    RobotsCache,
+    reset_politeness_scheduler,
+)
+from domain.services import ResearchAgent
+
+ROBOTS_WITH_DELAY = """
+User-agent: *
+Crawl-delay: 10
+Disallow: /private/
+"""
+
+def make_scheduler(rate=1.0, burst=2, max_wait=60):
+    return PolitenessScheduler(LocMemTokenBucket(), RobotsCache(ttl=3600, max_hosts=10), rate, burst, max_wait)
+
+@pytest.fixture
+def robots_txt():
+    """robots.txt downloads return this mock's value (a 404 by default)"""
+    not_found = httpx.HTTPStatusError("404", request=Mock(), response=Mock(status_code=404))
+    with patch("domain.politeness._fetch_robots", new=AsyncMock(side_effect=not_found)) as mock_fetch:
+        yield mock_fetch
+
+@pytest.fixture
+def polite_scraping(settings):
+    settings.SCRAPE_POLITENESS = {**settings.SCRAPE_POLITENESS, "ENABLED": True, "RATE": 1, "BURST": 1}
+    reset_politeness_scheduler()
+    yield
+    reset_politeness_scheduler()
+
+def test_bucket_books_later_slots_instead_of_refusing_everyone():
+    bucket = LocMemTokenBucket()
+
+    assert bucket.reserve("a.com", rate=1, burst=2, max_wait=60) == (0, True)
+    assert bucket.reserve("a.com", rate=1, burst=2, max_wait=60) == (0, True)
+    # Burst used up: each caller gets the next free second
+    first_wait, _ = bucket.reserve("a.com", rate=1, burst=2, max_wait=60)
+    second_wait, _ = bucket.reserve("a.com", rate=1, burst=2, max_wait=60)
+    assert 0.9 < first_wait <= 1
+    assert 1.9 < second_wait <= 2
+    # Other hosts have their own bucket
+    assert bucket.reserve("b.com", rate=1, burst=2, max_wait=60) == (0, True)
+
+def test_bucket_does_not_book_beyond_max_wait():
+    bucket = LocMemTokenBucket()
+    for _ in range(4):
+        bucket.reserve("a.com", rate=1, burst=1, max_wait=3)
+
+    assert bucket.reserve("a.com", rate=1, burst=1, max_wait=3) == (3, False)
+
+def test_crawl_delay_slows_the_host_down(robots_txt):
+    robots_txt.side_effect = None
+    robots_txt.return_value = ROBOTS_WITH_DELAY
+    scheduler = make_scheduler(rate=5, burst=10)
+
+    assert scheduler.limits_for("https://slow.com/a") == (0.1, 1)
+    scheduler.acquire("https://slow.com/a")
+    with pytest.raises(RateLimited) as error:
+        scheduler.acquire("https://slow.com/b")
+    assert 9 < error.value.retry_after <= 10
+
+    # Parsed once, then served from memory
+    robots_txt.assert_awaited_once_with("https://slow.com/robots.txt")
+
+def test_missing_robots_txt_means_default_limits(robots_txt):
+    assert make_scheduler(rate=2, burst=3).limits_for("https://fast.com/") == (2, 3)
+
+def test_agent_asks_the_scheduler_unless_a_slot_is_reserved(polite_scraping, robots_txt):
+    agent = ResearchAgent()
+    with patch.object(ResearchAgent, "aget_content_from_url", new=AsyncMock(return_value="Text")):
+        assert agent.get_content_from_url("https://busy.com/1") == "Text"
+
+        with pytest.raises(RateLimited):
+            agent.get_content_from_url("https://busy.com/2")
+
+        assert agent.get_content_from_url("https://busy.com/2", reserved=True) == "Text"
+
+@pytest.mark.django_db
+def test_rate_limited_task_is_rescheduled_not_failed():
+    from django.contrib.auth import get_user_model
+    from domain.tasks import fetch_page_task
+    from interface_layer.models import Summary
+
+    user = get_user_model().objects.create_user(username="polite")
+    summary = Summary.objects.create(user=user, url="https://busy.com/article")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch.object(fetch_page_task, "retry", side_effect=Retry()) as mock_retry:
+        MockAgentClass.return_value.fetch_page.side_effect = RateLimited("busy.com", 2.5, reserved=True)
+
+        with pytest.raises(Retry):
+            fetch_page_task(summary.id)
+
+    assert mock_retry.call_args.kwargs["countdown"] == 2.5
+    assert mock_retry.call_args.kwargs["kwargs"] == {"reserved": True}
+    summary.refresh_from_db()
+    assert summary.status == "PROCESSING"
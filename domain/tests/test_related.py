@@ -0,0 +1,106 @@
+import uuid
+
+import numpy as np
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from domain.related import RelatedIndex, embed, get_related_index
+from interface_layer.models import Summary
+
+TOPICS = [
+    "transformer attention models tokens",
+    "sourdough bread baking flour",
+    "football league match goals",
+    "volcano eruption lava magma",
+]
+
+
+def make_index(path, **kwargs):
+    return RelatedIndex(str(path), 512, probes=kwargs.pop('probes', 2), exact_rows=kwargs.pop('exact_rows', 10), **kwargs)
+
+
+def word(i):
+    """A made-up word of letters only (embed() skips digits)"""
+    return ''.join('abcdefghijklmnopqrstuvwxyz'[int(digit)] for digit in f"{i:03d}") + 'x'
+
+
+def topic_rows(count, owner_id=1):
+    """(summary_id, owner_id, vector) rows cycling through TOPICS, each with a word of its own"""
+    return [
+        (uuid.uuid4(), owner_id, embed(f"https://example.com/{word(i)}", TOPICS[i % len(TOPICS)]))
+        for i in range(count)
+    ]
+
+
+def test_embed_is_normalized_and_ignores_stop_words():
+    vector = embed("https://example.com/python", "The Python guide for the rest of us")
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert np.array_equal(vector, embed("https://example.com/python", "python guide rest us"))
+    assert not embed("", "").any()
+
+
+def test_search_returns_the_owners_nearest_rows(tmp_path):
+    index = make_index(tmp_path)
+    rows = topic_rows(8)
+    theirs = (uuid.uuid4(), 2, embed("https://x.example", TOPICS[0]))
+    index.add(rows + [theirs])
+
+    results = index.search(embed("https://q.example", "attention in transformer models"), 1, k=2)
+    assert {summary_id for summary_id, _ in results} == {rows[0][0], rows[4][0]}
+    assert theirs[0] not in [summary_id for summary_id, _ in index.search(embed("", TOPICS[0]), 1, k=10)]
+    assert index.search(embed("", TOPICS[0]), 3, k=10) == []
+
+
+def test_index_is_persisted_and_read_by_other_instances(tmp_path):
+    writer = make_index(tmp_path)
+    rows = topic_rows(4)
+    writer.add(rows[:2])
+    reader = make_index(tmp_path)
+    assert len(reader.search(rows[0][2], 1, k=10)) == 2
+
+    # Rows added later show up in the reader's next search
+    writer.add(rows[2:])
+    assert reader.search(rows[2][2], 1, k=1)[0][0] == rows[2][0]
+
+
+def test_growing_and_training_keeps_every_row(tmp_path):
+    index = make_index(tmp_path, initial_capacity=8, min_train_rows=32, probes=2, exact_rows=0)
+    rows = topic_rows(100)
+    for start in range(0, len(rows), 7):  # Trained at 35 rows, then again at 70
+        index.add(rows[start:start + 7])
+
+    assert index.meta['count'] == 100 and index.meta['trained_at'] == 70
+    assert len(index.arrays['centroids']) == 8
+    # Every row is found through its list (a query equal to the row is closest to that row's centroid)
+    for summary_id, owner_id, vector in rows[::10]:
+        assert index.search(vector, owner_id, k=1)[0][0] == summary_id
+    # Only the current generation is left on disk
+    assert sorted(path.name for path in tmp_path.iterdir() if path.suffix == '.npy')[0] == f"centroids-{index.meta['generation']}.npy"
+    assert len([path for path in tmp_path.iterdir() if path.suffix == '.npy']) == 6
+
+
+def test_a_row_indexed_twice_is_returned_once_and_exclude_skips_it(tmp_path):
+    index = make_index(tmp_path)
+    rows = topic_rows(4)
+    index.add(rows)
+    index.add(rows[:1])
+
+    results = index.search(rows[0][2], 1, k=4)
+    assert [summary_id for summary_id, _ in results].count(rows[0][0]) == 1
+    assert rows[0][0] not in [summary_id for summary_id, _ in index.search(rows[0][2], 1, k=4, exclude=rows[0][0])]
+
+    index.clear()
+    assert index.search(rows[0][2], 1, k=4) == []
+
+
+@pytest.mark.django_db
+def test_build_related_index_command_indexes_completed_summaries():
+    user = get_user_model().objects.create_user(username="historian")
+    done = Summary.objects.create(user=user, url="https://example.com/lava", status="COMPLETED", output_summary=TOPICS[3])
+    Summary.objects.create(user=user, url="https://example.com/pending")
+
+    call_command("build_related_index")
+    call_command("build_related_index")  # Starts over: no duplicates
+    assert get_related_index().meta['count'] == 1
+    assert get_related_index().search(embed("", "lava magma"), user.id, k=5)[0][0] == done.id
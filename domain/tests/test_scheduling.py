@@ -0,0 +1,132 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from domain.scheduling import BULK, INTERACTIVE, FairScheduler, LocMemFairQueue, busiest_users
+from domain.tasks import dispatch_summaries_task, schedule_summaries
+from domain.telemetry import render_metrics
+from interface_layer.models import Summary
+
+User = get_user_model()
+
+
+def make_scheduler(**kwargs):
+    config = {'max_running': 6, 'max_running_per_user': 4, 'bulk_share': 0.5, 'bulk_slice': 2, 'running_timeout': 3600}
+    return FairScheduler(LocMemFairQueue(), **{**config, **kwargs})
+
+
+class Pipeline:
+    """Records what the scheduler starts; every job stays active until finish()ed"""
+    def __init__(self):
+        self.started = []
+        self.active = set()
+
+    def start(self, lane, summary_ids):
+        self.started.append((lane, list(summary_ids)))
+        self.active.update(summary_ids)
+
+    def is_active(self, summary_ids):
+        return {summary_id for summary_id in summary_ids if summary_id in self.active}
+
+    def finish(self, *summary_ids):
+        self.active.difference_update(summary_ids)
+
+
+def test_users_take_turns_and_interactive_jobs_go_first():
+    scheduler, pipeline = make_scheduler(), Pipeline()
+    scheduler.push(BULK, 1, [f"heavy-{i}" for i in range(1000)])
+    scheduler.push(BULK, 2, ["light-0", "light-1", "light-2"])
+    scheduler.push(INTERACTIVE, 3, ["single"])
+
+    waiting = scheduler.dispatch(pipeline.start, pipeline.is_active)
+    # Bulk jobs get half of the 6 slots, a slice of 2 per user and turn: the second slice of user 2 has no room
+    assert pipeline.started == [
+        (INTERACTIVE, ["single"]),
+        (BULK, ["heavy-0", "heavy-1"]),
+        (BULK, ["light-0"]),
+    ]
+    assert waiting == 998 + 2
+
+    # A finished job frees its slot, for the user whose turn it is
+    pipeline.finish("heavy-0", "heavy-1")
+    scheduler.dispatch(pipeline.start, pipeline.is_active)
+    assert pipeline.started[3:] == [(BULK, ["light-1", "light-2"])]
+
+
+def test_per_user_cap_and_room_kept_for_interactive_jobs():
+    scheduler, pipeline = make_scheduler(bulk_share=1.0), Pipeline()
+    scheduler.push(INTERACTIVE, 1, [f"a-{i}" for i in range(10)])
+    scheduler.push(BULK, 2, [f"b-{i}" for i in range(10)])
+
+    scheduler.dispatch(pipeline.start, pipeline.is_active)
+    started = [summary_id for _, summary_ids in pipeline.started for summary_id in summary_ids]
+    assert started == ["a-0", "a-1", "a-2", "a-3", "b-0", "b-1"]  # 4 per user, 6 in all
+    assert scheduler.depths() == {(INTERACTIVE, '1'): 6, (BULK, '2'): 8}
+
+
+def test_jobs_pushed_during_a_dispatch_are_started_by_it():
+    """A caller finding the lock taken leaves the dirty flag: the lock holder runs another round for it."""
+    scheduler, pipeline = make_scheduler(), Pipeline()
+
+    def start(lane, summary_ids):
+        pipeline.start(lane, summary_ids)
+        if summary_ids == ["first"]:
+            scheduler.push(INTERACTIVE, 2, ["second"])
+            assert scheduler.dispatch(pipeline.start, pipeline.is_active) == 1  # Locked: left for the holder
+
+    scheduler.push(INTERACTIVE, 1, ["first"])
+    assert scheduler.dispatch(start, pipeline.is_active) == 0
+    assert pipeline.started == [(INTERACTIVE, ["first"]), (INTERACTIVE, ["second"])]
+
+
+def test_a_promoted_bulk_job_moves_to_the_interactive_lane():
+    scheduler, pipeline = make_scheduler(bulk_share=0.0), Pipeline()
+    scheduler.push(BULK, 1, ["import-0", "import-1"])
+    scheduler.dispatch(pipeline.start, pipeline.is_active)
+    assert pipeline.started == []  # No room for bulk jobs at all
+
+    assert scheduler.promote("import-1", 1, 2)
+    assert not scheduler.promote("import-1", 1, 2)  # No longer waiting there
+    assert scheduler.dispatch(pipeline.start, pipeline.is_active) == 1
+    assert pipeline.started == [(INTERACTIVE, ["import-1"])]
+    assert scheduler.depths() == {(BULK, '1'): 1}
+
+
+def test_lost_jobs_stop_counting_after_the_timeout():
+    scheduler, pipeline = make_scheduler(max_running=1), Pipeline()
+    scheduler.push(INTERACTIVE, 1, ["lost", "next"])
+    scheduler.dispatch(pipeline.start, pipeline.is_active)
+    assert scheduler.dispatch(pipeline.start, pipeline.is_active) == 1
+
+    scheduler.running_timeout = 0
+    time.sleep(0.01)
+    assert scheduler.dispatch(pipeline.start, pipeline.is_active) == 0
+    assert pipeline.started[-1] == (INTERACTIVE, ["next"])
+
+
+def test_busiest_users_keep_their_label():
+    counts = {(BULK, '1'): 900, (BULK, '2'): 5, (BULK, '3'): 3, (INTERACTIVE, '2'): 1}
+    assert busiest_users(counts, 2) == {(BULK, '1'): 900, (BULK, '2'): 5, (BULK, 'other'): 3, (INTERACTIVE, 'other'): 1}
+
+
+@pytest.mark.django_db
+def test_waiting_jobs_are_started_by_the_recheck_task(settings):
+    settings.SUMMARY_SCHEDULING = {**settings.SUMMARY_SCHEDULING, 'MAX_RUNNING_PER_USER': 2}
+    user = User.objects.create_user(username="importer")
+    summaries = [Summary.objects.create(user=user, url=f"https://example.com/{i}") for i in range(3)]
+
+    with patch("domain.tasks.process_summary_task.delay") as mock_task, \
+         patch("domain.tasks.dispatch_summaries_task.apply_async") as mock_recheck:
+        for summary in summaries:
+            schedule_summaries(INTERACTIVE, user.id, [summary.id])
+        assert [call.args[0] for call in mock_task.call_args_list] == [summaries[0].id, summaries[1].id]
+        mock_recheck.assert_called_once_with(countdown=settings.SUMMARY_SCHEDULING['RECHECK_SECONDS'])
+        assert f'summary_queue_depth{{lane="interactive",user="{user.id}"}} 1.0' in render_metrics()[0].decode()
+
+        # The first job is done: the recheck lets the third one in
+        Summary.objects.filter(id=summaries[0].id).update(status='COMPLETED')
+        dispatch_summaries_task()
+        assert mock_task.call_args.args[0] == summaries[2].id
+        assert mock_recheck.call_count == 1  # Nothing waits any more
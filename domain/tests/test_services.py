@@ -1,6 +1,14 @@
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock, ANY
 from domain.services import ResearchAgent
+from domain.fetcher import run_sync
+from domain.errors import (
+    CircuitOpenError,
+    MissingCredentialsError,
+    SummaryError,
+    TransientSummaryError,
+)
+from google.genai import errors as genai_errors
 
 # 1. Define some "Fake" HTML input to test our cleaning logic
 # This includes scripts, styles, and extra whitespace we want to remove.
@@ -27,18 +35,21 @@ MOCK_HTML_CONTENT = """
 # It should strictly be the H1 and the P text.
 EXPECTED_CLEAN_TEXT = "Welcome to the Article This is the real content."
 
-def test_get_content_cleaning_logic():
+@pytest.fixture
+def streaming_parser(settings):
+    """Pins the streaming extractor, whose pages arrive through fetch_stream()."""
+    settings.HTML_PARSER_BACKEND = "stream"
+
+def test_get_content_cleaning_logic(streaming_parser):
     """
     Verifies that HTML tags, scripts, and navbars are stripped correctly.
     """
-    # PATCH: We intercept 'requests.get' inside the 'domain.services' module
-    with patch("domain.services.requests.get") as mock_get:
+    # PATCH: We intercept the shared fetcher used inside the 'domain.services' module
+    with patch("domain.services.get_fetcher") as mock_get_fetcher:
         
-        # Setup the "Fake" Response
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.text = MOCK_HTML_CONTENT
-        mock_get.return_value = mock_response
+        # Setup the "Fake" Response (streamed into the extractor in one chunk)
+        mock_fetcher = mock_get_fetcher.return_value
+        mock_fetcher.fetch_stream = AsyncMock(side_effect=lambda url, consumer: consumer.feed(MOCK_HTML_CONTENT))
 
         # Execute
         agent = ResearchAgent()
@@ -46,7 +57,7 @@ def test_get_content_cleaning_logic():
         
         # Assert
         # 1. Did we actually call the URL?
-        mock_get.assert_called_with("http://fake-url.com", headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+        mock_fetcher.fetch_stream.assert_called_with("http://fake-url.com", ANY)
         
         # 2. Did we clean the text?
         assert "console.log" not in result  # Script should be gone
@@ -58,16 +69,14 @@ def test_get_content_cleaning_logic():
         # (This depends on exactly how strict your cleaning logic is)
         assert "   " not in result 
 
-def test_get_content_network_error():
+def test_get_content_network_error(streaming_parser):
     """
     Verifies that the code raises an error if the URL is broken.
     """
-    with patch("domain.services.requests.get") as mock_get:
+    with patch("domain.services.get_fetcher") as mock_get_fetcher:
         # Setup a fake error (e.g., 404 Not Found)
-        mock_response = Mock()
-        mock_response.status_code = 404
-        mock_response.raise_for_status.side_effect = Exception("404 Error")
-        mock_get.return_value = mock_response
+        mock_fetcher = mock_get_fetcher.return_value
+        mock_fetcher.fetch_stream = AsyncMock(side_effect=Exception("404 Error"))
         
         agent = ResearchAgent()
         
@@ -75,4 +84,172 @@ def test_get_content_network_error():
         with pytest.raises(Exception) as excinfo:
             agent.get_content_from_url("http://broken-url.com")
         
-        assert "404 Error" in str(excinfo.value)
\ No newline at end of file
+        assert "404 Error" in str(excinfo.value)
+
+def test_get_contents_from_urls_keeps_order_and_errors(streaming_parser):
+    """
+    The batch variant returns one result per URL, in order,
+    with the exception in place of the text for a failed URL.
+    """
+    async def fake_fetch(url, consumer):
+        if "broken" in url:
+            raise Exception("404 Error")
+        consumer.feed(MOCK_HTML_CONTENT)
+
+    with patch("domain.services.get_fetcher") as mock_get_fetcher:
+        mock_get_fetcher.return_value.fetch_stream = AsyncMock(side_effect=fake_fetch)
+
+        agent = ResearchAgent()
+        results = run_sync(agent.aget_contents_from_urls(["http://a.com", "http://broken.com"]))
+
+    assert "Welcome to the Article" in results[0]
+    assert isinstance(results[1], Exception)
+
+@pytest.mark.parametrize("backend", ["html.parser", "lxml", "selectolax"])
+def test_get_content_with_whole_page_backend(settings, backend):
+    """Non-streaming backends download the whole page with fetch_text() and clean it afterwards."""
+    if backend != "html.parser":
+        pytest.importorskip(backend)
+    settings.HTML_PARSER_BACKEND = backend
+
+    with patch("domain.services.get_fetcher") as mock_get_fetcher:
+        mock_fetcher = mock_get_fetcher.return_value
+        mock_fetcher.fetch_text = AsyncMock(return_value=MOCK_HTML_CONTENT)
+
+        result = ResearchAgent().get_content_from_url("http://fake-url.com")
+
+    mock_fetcher.fetch_text.assert_called_with("http://fake-url.com")
+    assert result == "Test Page " + EXPECTED_CLEAN_TEXT
+
+def test_summarize_texts_splits_packed_reply():
+    """
+    Several documents go out in ONE request and the JSON reply is split back per document.
+    A document the model skipped is retried on its own.
+    """
+    agent = ResearchAgent()
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client, \
+         patch.object(ResearchAgent, "summarize_text", return_value="Single summary") as mock_single:
+        mock_client = mock_get_client.return_value
+        mock_client.models.generate_content.return_value = Mock(
+            text='[{"document": 1, "summary": "Summary A"}, {"document": 3, "summary": "Summary C"}]'
+        )
+
+        result = agent.summarize_texts(["Text A", "Text B", "Text C"])
+
+    assert result == ["Summary A", "Single summary", "Summary C"]
+    assert mock_client.models.generate_content.call_count == 1
+    prompt = mock_client.models.generate_content.call_args.kwargs['contents']
+    assert "=== DOCUMENT 2 ===\nText B" in prompt
+    mock_single.assert_called_once_with("Text B")
+
+def test_summarize_texts_falls_back_on_unparseable_reply():
+    agent = ResearchAgent()
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client, \
+         patch.object(ResearchAgent, "summarize_text", side_effect=lambda text: f"Summary of {text}"):
+        mock_get_client.return_value.models.generate_content.return_value = Mock(text="not json")
+
+        result = agent.summarize_texts(["A", "B"])
+
+    assert result == ["Summary of A", "Summary of B"]
+
+def test_summarize_text_stream_relays_chunks():
+    """Every generated piece is handed over immediately; the full text is returned at the end."""
+    received = []
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        mock_get_client.return_value.models.generate_content_stream.return_value = iter(
+            [Mock(text="**TL;DR** "), Mock(text=None), Mock(text="Streaming works.")]
+        )
+
+        result = ResearchAgent().summarize_text_stream("Text", on_chunk=received.append)
+
+    assert received == ["**TL;DR** ", "Streaming works."]
+    assert result == "**TL;DR** Streaming works."
+
+def test_summarize_text_stream_raises_typed_api_errors():
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        generate = mock_get_client.return_value.models.generate_content_stream
+
+        generate.side_effect = genai_errors.ServerError(503, {"error": {"message": "overloaded"}})
+        with pytest.raises(TransientSummaryError):
+            ResearchAgent().summarize_text_stream("Text", on_chunk=lambda text: None)
+
+        generate.side_effect = genai_errors.ClientError(400, {"error": {"message": "bad request"}})
+        with pytest.raises(SummaryError):
+            ResearchAgent().summarize_text_stream("Text", on_chunk=lambda text: None)
+
+def test_summarize_text_without_credentials():
+    with patch("domain.services.get_genai_client", return_value=None):
+        with pytest.raises(MissingCredentialsError):
+            ResearchAgent().summarize_text("Text")
+
+def test_model_circuit_opens_after_repeated_overloads(settings):
+    settings.CIRCUIT_BREAKER = {**settings.CIRCUIT_BREAKER, "FAILURE_THRESHOLD": 3}
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        generate = mock_get_client.return_value.models.generate_content
+        generate.side_effect = genai_errors.ServerError(503, {"error": {"message": "overloaded"}})
+
+        for _ in range(3):
+            with pytest.raises(TransientSummaryError):
+                ResearchAgent().summarize_text("Text")
+        with pytest.raises(CircuitOpenError):
+            ResearchAgent().summarize_text("Text")
+
+    # The 4th call never reached the endpoint
+    assert generate.call_count == 3
+
+@pytest.fixture
+def small_segments(settings):
+    """Segments of ~25 tokens, so a few sentences already make a 'long' document."""
+    settings.SUMMARY_MAP_REDUCE = {**settings.SUMMARY_MAP_REDUCE, "SEGMENT_TOKENS": 25, "MAX_PARALLEL": 2}
+
+LONG_TEXT = " ".join(f"Sentence number {i} of the long report talks about topic {i}." for i in range(12))
+
+def test_summarize_long_text_maps_segments_then_reduces(small_segments):
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        mock_client = mock_get_client.return_value
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=lambda model, contents: Mock(text="- a note"))
+        mock_client.models.generate_content.return_value = Mock(text="**TL;DR** The whole report.")
+
+        result = ResearchAgent().summarize_long_text(LONG_TEXT)
+
+    assert result == "**TL;DR** The whole report."
+    # One async call per segment, one blocking call to merge the notes
+    assert mock_client.aio.models.generate_content.await_count > 1
+    reduce_prompt = mock_client.models.generate_content.call_args.kwargs["contents"]
+    assert "- a note" in reduce_prompt
+
+def test_summarize_long_text_only_recomputes_changed_segments(small_segments):
+    from domain.cache import get_summary_cache
+    cache = get_summary_cache()
+
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        mock_client = mock_get_client.return_value
+        mock_client.aio.models.generate_content = AsyncMock(return_value=Mock(text="- a note"))
+        mock_client.models.generate_content.return_value = Mock(text="Summary")
+
+        ResearchAgent().summarize_long_text(LONG_TEXT, segment_cache=cache)
+        first_run = mock_client.aio.models.generate_content.await_count
+
+        edited = LONG_TEXT.replace("topic 11.", "a brand new topic.")
+        ResearchAgent().summarize_long_text(edited, segment_cache=cache)
+
+    assert mock_client.aio.models.generate_content.await_count == first_run + 1
+
+def test_summarize_long_text_raises_on_failed_segments(small_segments):
+    from domain.cache import get_summary_cache
+    cache = get_summary_cache()
+    throttled = genai_errors.ClientError(429, {"error": {"message": "quota"}})
+
+    with patch.object(ResearchAgent, "_get_client") as mock_get_client:
+        mock_client = mock_get_client.return_value
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=[Mock(text="- a note"), throttled] + [Mock(text="- a note")] * 50)
+
+        with pytest.raises(TransientSummaryError):
+            ResearchAgent().summarize_long_text(LONG_TEXT, segment_cache=cache)
+        mock_client.models.generate_content.assert_not_called()
+
+        # The retry only sends the segment that failed (plus the condense pass over the notes, which never ran)
+        first_run = mock_client.aio.models.generate_content.await_count
+        mock_client.models.generate_content.return_value = Mock(text="Summary")
+        assert ResearchAgent().summarize_long_text(LONG_TEXT, segment_cache=cache) == "Summary"
+    assert mock_client.aio.models.generate_content.await_count == first_run + 2
@@ -1,11 +1,31 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from domain.tasks import process_summary_task
+from domain.tasks import (
+    process_summary_task,
+    process_summary_batch_task,
+    fetch_page_task,
+    summarize_pack_task,
+)
+from domain.content_store import save_content
+from domain.fetcher import FetchedPage
+from domain.related import embed, get_related_index
+from domain.errors import CircuitOpenError, SummaryError, TransientSummaryError
 from interface_layer.models import Summary
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+@pytest.fixture(autouse=True)
+def eager_celery():
+    """
+    Runs .delay()/chains/chords/groups inline, in this thread, like a real worker would
+    (process_summary_task() only starts the fetch -> parse -> summarize chain).
+    """
+    from intelliresearchhub.celery import app
+    app.conf.task_always_eager = True
+    yield app
+    app.conf.task_always_eager = False
+
 # This fixture creates a real DB record for us to test with
 @pytest.fixture
 def pending_summary(db):
@@ -27,7 +47,7 @@ def test_process_summary_success(pending_summary):
         
         # 1. Setup the Mock Behavior
         mock_agent_instance = MockAgentClass.return_value
-        mock_agent_instance.get_content_from_url.return_value = "Cleaned Text Content"
+        mock_agent_instance.fetch_page.return_value = FetchedPage("Cleaned Text Content")
         mock_agent_instance.summarize_text.return_value = "Final AI Summary"
         
         # 2. Run the Task DIRECTLY (Synchronously)
@@ -44,7 +64,9 @@ def test_process_summary_success(pending_summary):
         assert pending_summary.output_summary == "Final AI Summary"
         
         # 4. Verify the Service was called correctly
-        mock_agent_instance.get_content_from_url.assert_called_with("http://test-task.com")
+        mock_agent_instance.fetch_page.assert_called_with(
+            "http://test-task.com", reserved=False, validators=None, consumer=None,
+        )
         mock_agent_instance.summarize_text.assert_called_with("Cleaned Text Content")
 
 @pytest.mark.django_db
@@ -56,7 +78,7 @@ def test_process_summary_failure(pending_summary):
         
         # 1. Setup the Mock to CRASH
         mock_agent_instance = MockAgentClass.return_value
-        mock_agent_instance.get_content_from_url.side_effect = Exception("Website Down")
+        mock_agent_instance.fetch_page.side_effect = Exception("Website Down")
         
         # 2. Run the Task
         process_summary_task(pending_summary.id)
@@ -65,4 +87,420 @@ def test_process_summary_failure(pending_summary):
         pending_summary.refresh_from_db()
         
         assert pending_summary.status == "FAILED"
-        # Optional: You might want to assert that input_content is empty or partial
\ No newline at end of file
+        # Optional: You might want to assert that input_content is empty or partial
+
+@pytest.mark.django_db
+def test_process_summary_publishes_status_transitions(pending_summary):
+    """Open dashboards learn about every transition without polling."""
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.tasks.publish_status") as mock_publish:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        MockAgentClass.return_value.summarize_text.return_value = "Final AI Summary"
+
+        process_summary_task(pending_summary.id)
+
+    user_id = pending_summary.user_id
+    assert [c.args for c in mock_publish.call_args_list] == [
+        (user_id, pending_summary.id, "PROCESSING"),
+        (user_id, pending_summary.id, "COMPLETED"),
+    ]
+
+@pytest.mark.django_db
+def test_process_summary_streams_chunks_through_redis(pending_summary, settings, event_publisher):
+    """In streaming mode every chunk goes to the summary's Redis stream; the end marker comes after the save."""
+    settings.SUMMARY_STREAMING = True
+
+    def fake_stream(text, on_chunk):
+        on_chunk("Final ")
+        on_chunk("AI Summary")
+        return "Final AI Summary"
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        MockAgentClass.return_value.summarize_text_stream.side_effect = fake_stream
+
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.output_summary == "Final AI Summary"
+    MockAgentClass.return_value.summarize_text.assert_not_called()
+
+    pipe = event_publisher.pipeline.return_value
+    key = f"summary-stream:{pending_summary.id}"
+    assert [c.args for c in pipe.xadd.call_args_list] == [
+        (key, {"chunk": "Final "}),
+        (key, {"chunk": "AI Summary"}),
+        (key, {"done": "COMPLETED"}),
+    ]
+
+@pytest.mark.django_db
+def test_process_summary_reuses_cached_summary(pending_summary):
+    """
+    If the scraped text was already summarized (by anyone), the AI must not be called again.
+    """
+    from domain.cache import get_summary_cache
+    get_summary_cache().store("http://another-url.com", "Cleaned Text Content", "Cached AI Summary")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+
+        process_summary_task(pending_summary.id)
+
+        pending_summary.refresh_from_db()
+        assert pending_summary.status == "COMPLETED"
+        assert pending_summary.output_summary == "Cached AI Summary"
+        mock_agent_instance.summarize_text.assert_not_called()
+
+@pytest.mark.django_db
+def test_process_summary_reuses_the_summary_of_a_near_duplicate(pending_summary):
+    """A syndicated copy of a finished page (a few words differ) gets that page's summary, without the AI."""
+    from domain.cache import get_summary_cache
+    from domain.tests.test_near_duplicates import article, syndicated_copy
+
+    Summary.objects.create(user=pending_summary.user, url="https://news.example/story", status="COMPLETED",
+                           output_summary="The story, summarized.", content=save_content(article(1)))
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage(syndicated_copy(article(1)))
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "COMPLETED"
+    assert pending_summary.output_summary == "The story, summarized."
+    MockAgentClass.return_value.summarize_text.assert_not_called()
+    # Cached for the copy's own text: the next copy is an exact hit
+    assert get_summary_cache().get_for_content(syndicated_copy(article(1))) == "The story, summarized."
+
+@pytest.mark.django_db
+def test_process_summary_sends_the_compressed_text_to_the_model(pending_summary):
+    """Boilerplate stays out of the prompt; the cache is still keyed by the clean text."""
+    from domain.cache import get_summary_cache
+    page = "We use cookies to improve your experience. The tram reaches the airport in 2028."
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage(page)
+        MockAgentClass.return_value.summarize_text.return_value = "Tram summary"
+        process_summary_task(pending_summary.id)
+
+    MockAgentClass.return_value.summarize_text.assert_called_once_with("The tram reaches the airport in 2028.")
+    assert get_summary_cache().get_for_content(page) == "Tram summary"
+
+@pytest.mark.django_db
+def test_process_summary_fails_on_a_refused_prompt(pending_summary):
+    """A permanent model error fails the row at once: nothing is cached, nothing is saved as a summary."""
+    from domain.cache import get_summary_cache
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        mock_agent_instance.summarize_text.side_effect = SummaryError("Model API error 400: bad request")
+
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "FAILED"
+    assert pending_summary.output_summary is None
+    assert mock_agent_instance.summarize_text.call_count == 1
+    assert get_summary_cache().get_for_content("Cleaned Text Content") is None
+
+@pytest.mark.django_db
+def test_throttled_summary_is_retried(pending_summary):
+    """A 429 is retried (eager mode runs the retry inline) instead of failing the row."""
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        mock_agent_instance.summarize_text.side_effect = [TransientSummaryError("429"), "Summary after the retry"]
+
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "COMPLETED"
+    assert pending_summary.output_summary == "Summary after the retry"
+
+@pytest.mark.django_db
+def test_summary_fails_once_retries_are_used_up(pending_summary, settings):
+    from domain.tasks import summarize_content_task
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        mock_agent_instance.summarize_text.side_effect = TransientSummaryError("503")
+
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "FAILED"
+    assert mock_agent_instance.summarize_text.call_count == summarize_content_task.max_retries + 1
+
+@pytest.mark.django_db
+def test_open_circuit_parks_the_task(pending_summary):
+    from celery.exceptions import Retry
+    from domain.tasks import summarize_content_task
+
+    Summary.objects.filter(id=pending_summary.id).update(status="PROCESSING", content=save_content("Cleaned Text Content"))
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch.object(summarize_content_task, "retry", side_effect=Retry()) as mock_retry:
+        MockAgentClass.return_value.summarize_text.side_effect = CircuitOpenError("gemini", 12)
+
+        with pytest.raises(Retry):
+            summarize_content_task({"id": str(pending_summary.id), "user_id": pending_summary.user_id})
+
+    assert mock_retry.call_args.kwargs["countdown"] >= 12
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "PROCESSING"
+
+
+@pytest.mark.django_db
+def test_streaming_parser_cleans_the_page_while_it_downloads(pending_summary, settings):
+    """The fetch stage feeds the page to the extractor (which can end the download): the parse stage only stores it."""
+    settings.HTML_PARSER_BACKEND = "stream"
+
+    def fetch_page(url, reserved, validators, consumer):
+        consumer.feed("<p>Cleaned <b>Text</b> Content</p>")
+        return FetchedPage("<p>Cleaned <b>Text</b> Content</p>")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.parsers.StreamingBackend.clean") as mock_clean:
+        MockAgentClass.return_value.fetch_page.side_effect = fetch_page
+        MockAgentClass.return_value.summarize_text.return_value = "Final AI Summary"
+        process_summary_task(pending_summary.id)
+
+    mock_clean.assert_not_called()
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "COMPLETED"
+    assert pending_summary.input_content == "Cleaned Text Content"
+
+@pytest.mark.django_db
+def test_unchanged_page_reuses_clean_text_and_summary(pending_summary):
+    """A 304 on the second scrape: nothing is parsed and the summary comes from the cache."""
+    second = Summary.objects.create(user=pending_summary.user, url=pending_summary.url)
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.tasks.get_parser_backend") as mock_parser:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_parser.return_value.streaming = False
+        mock_parser.return_value.clean.return_value = "Cleaned Text Content"
+        mock_agent_instance.fetch_page.return_value = FetchedPage("<html>...</html>", etag='"v1"')
+        mock_agent_instance.summarize_text.return_value = "Final AI Summary"
+        process_summary_task(pending_summary.id)
+
+        mock_agent_instance.fetch_page.return_value = FetchedPage(None, etag='"v1"', not_modified=True)
+        process_summary_task(second.id)
+
+    assert mock_agent_instance.fetch_page.call_args.kwargs["validators"]["etag"] == '"v1"'
+    assert mock_parser.return_value.clean.call_count == 1
+    assert mock_agent_instance.summarize_text.call_count == 1
+    second.refresh_from_db()
+    assert second.status == "COMPLETED"
+    assert second.input_content == "Cleaned Text Content"
+    assert second.output_summary == "Final AI Summary"
+
+@pytest.mark.django_db
+def test_same_body_without_validators_is_not_parsed_again(pending_summary):
+    second = Summary.objects.create(user=pending_summary.user, url=pending_summary.url)
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.tasks.get_parser_backend") as mock_parser:
+        mock_parser.return_value.streaming = False
+        mock_parser.return_value.clean.return_value = "Cleaned Text Content"
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage("<html>same</html>")
+        MockAgentClass.return_value.summarize_text.return_value = "Final AI Summary"
+        process_summary_task(pending_summary.id)
+        process_summary_task(second.id)
+
+    assert mock_parser.return_value.clean.call_count == 1
+    second.refresh_from_db()
+    assert second.status == "COMPLETED"
+
+@pytest.mark.django_db
+def test_followers_get_the_leaders_result(pending_summary):
+    """Single-flight: three users, one URL, one scrape and one model call."""
+    leader, is_leader = Summary.objects.create_or_follow(pending_summary.user, "https://news.com/story?utm_source=x")
+    others = [User.objects.create_user(username=f"reader{i}") for i in range(2)]
+    followers = [Summary.objects.create_or_follow(user, "https://NEWS.com/story/#comments") for user in others]
+
+    assert is_leader
+    assert [(summary.leader_id, is_leader) for summary, is_leader in followers] == [(leader.id, False)] * 2
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage("Story text")
+        MockAgentClass.return_value.summarize_text.return_value = "Story summary"
+        process_summary_task(leader.id)
+
+    assert MockAgentClass.return_value.fetch_page.call_count == 1
+    assert MockAgentClass.return_value.summarize_text.call_count == 1
+    for summary, _ in followers:
+        summary.refresh_from_db()
+        assert (summary.status, summary.output_summary, summary.input_content) == ("COMPLETED", "Story summary", "Story text")
+
+    # Every copy is in the related-summaries index, for its own user
+    query = embed("https://news.com/story", "Story summary")
+    for summary in [leader] + [summary for summary, _ in followers]:
+        assert [summary_id for summary_id, _ in get_related_index().search(query, summary.user_id, k=5)] == [summary.id]
+
+    # The job is over: the next request starts a new one
+    assert Summary.objects.create_or_follow(others[0], "https://news.com/story")[1]
+
+@pytest.mark.django_db
+def test_followers_fail_with_the_leader(pending_summary, event_publisher):
+    leader, _ = Summary.objects.create_or_follow(pending_summary.user, "https://down.com/")
+    follower, _ = Summary.objects.create_or_follow(User.objects.create_user(username="reader"), "https://down.com/")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.side_effect = Exception("Website Down")
+        process_summary_task(leader.id)
+
+    follower.refresh_from_db()
+    assert follower.status == "FAILED"
+    assert f'"id": "{follower.id}", "status": "FAILED"' in str(event_publisher.publish.call_args_list)
+
+@pytest.fixture
+def scraped_batch(db):
+    user = User.objects.create_user(username="batch_tester")
+    return [
+        Summary.objects.create(user=user, url=f"http://batch-{i}.com", status="PROCESSING", content=save_content(f"Text {i}"))
+        for i in range(3)
+    ]
+
+@pytest.mark.django_db
+def test_summarize_pack_task_uses_one_model_call(scraped_batch):
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.summarize_texts.side_effect = lambda texts: [f"Sum of {t}" for t in texts]
+
+        summarize_pack_task([str(summary.id) for summary in scraped_batch])
+
+        mock_agent_instance.summarize_texts.assert_called_once()
+        for summary in scraped_batch:
+            summary.refresh_from_db()
+            assert summary.status == "COMPLETED"
+            assert summary.output_summary == f"Sum of {summary.input_content}"
+
+@pytest.mark.django_db
+def test_summarize_pack_task_leaves_rows_that_failed_meanwhile(scraped_batch):
+    failed = scraped_batch[0]
+
+    def summarize_texts(texts):
+        failed.fail()  # E.g. given up on by another delivery while the model was busy
+        return [f"Sum of {t}" for t in texts]
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.tasks.publish_status") as mock_publish:
+        MockAgentClass.return_value.summarize_texts.side_effect = summarize_texts
+        summarize_pack_task([str(summary.id) for summary in scraped_batch])
+
+    statuses = dict(Summary.objects.filter(id__in=[summary.id for summary in scraped_batch]).values_list('id', 'status'))
+    assert statuses == {summary.id: "FAILED" if summary == failed else "COMPLETED" for summary in scraped_batch}
+    assert failed.id not in [call.args[1] for call in mock_publish.call_args_list]
+
+@pytest.mark.django_db
+def test_fetch_page_task_failure_does_not_raise(pending_summary):
+    """A failing chord member would fail the whole chord, so the task reports None instead."""
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.side_effect = Exception("Website Down")
+
+        assert fetch_page_task(pending_summary.id) is None
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "FAILED"
+
+@pytest.mark.django_db
+def test_process_summary_batch_task_end_to_end(eager_celery):
+    """
+    Runs the whole chord eagerly: 3 scrapes, then the texts are packed into one model call.
+    """
+    user = User.objects.create_user(username="batch_e2e")
+    summaries = [Summary.objects.create(user=user, url=f"http://e2e-{i}.com") for i in range(3)]
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.side_effect = lambda url, reserved, validators, consumer: FetchedPage(f"Text of {url}")
+        mock_agent_instance.summarize_texts.side_effect = lambda texts: [f"Summary of {t}" for t in texts]
+
+        process_summary_batch_task([summary.id for summary in summaries])
+
+        assert mock_agent_instance.summarize_texts.call_count == 1
+
+    for summary in summaries:
+        summary.refresh_from_db()
+        assert summary.status == "COMPLETED"
+        assert summary.output_summary == f"Summary of Text of {summary.url}"
+
+@pytest.mark.django_db
+def test_process_summary_map_reduces_long_documents(pending_summary, settings):
+    settings.SUMMARY_MAP_REDUCE = {**settings.SUMMARY_MAP_REDUCE, "SINGLE_PASS_TOKENS": 10}
+    long_text = "A very long scraped document that no longer fits in a single prompt."
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        mock_agent_instance = MockAgentClass.return_value
+        mock_agent_instance.fetch_page.return_value = FetchedPage(long_text)
+        mock_agent_instance.summarize_long_text.return_value = "Merged AI Summary"
+
+        process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.output_summary == "Merged AI Summary"
+    assert pending_summary.input_content == long_text  # Kept whole, not truncated
+    mock_agent_instance.summarize_text.assert_not_called()
+    assert mock_agent_instance.summarize_long_text.call_args.args == (long_text,)
+
+@pytest.mark.django_db
+def test_process_summary_write_budget(pending_summary, django_assert_num_queries):
+    """
+    Across the three stages: a narrow SELECT of the row (fetch), a SELECT of the (already stored) blob (parse),
+    the row with its text (summarize), three narrow UPDATEs: PROCESSING, content, COMPLETED,
+    and the look for requests that followed the job. (Indexing it for related summaries is a task of its own.)
+    """
+    save_content("Cleaned Text Content")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass, \
+         patch("domain.tasks.index_related_task.delay") as mock_index:
+        MockAgentClass.return_value.fetch_page.return_value = FetchedPage("Cleaned Text Content")
+        MockAgentClass.return_value.summarize_text.return_value = "Final AI Summary"
+
+        with django_assert_num_queries(7) as captured:
+            process_summary_task(pending_summary.id)
+
+    mock_index.assert_called_once_with([pending_summary.id])
+
+    updates = [query["sql"] for query in captured.captured_queries if query["sql"].startswith("UPDATE")]
+    assert len(updates) == 3
+    # Every write is conditional on the row's current status
+    assert all('"status"' in sql.split("WHERE", 1)[1] for sql in updates)
+
+@pytest.mark.django_db
+def test_duplicate_delivery_does_not_overwrite_a_finished_summary(pending_summary):
+    Summary.objects.filter(id=pending_summary.id).update(status="COMPLETED", output_summary="Done before")
+
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        process_summary_task(pending_summary.id)
+
+    MockAgentClass.return_value.fetch_page.assert_not_called()
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "COMPLETED"
+    assert pending_summary.output_summary == "Done before"
+
+@pytest.mark.django_db
+def test_failure_path_is_a_single_update(pending_summary, django_assert_num_queries):
+    with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+        MockAgentClass.return_value.fetch_page.side_effect = Exception("Website Down")
+
+        # SELECT, UPDATE -> PROCESSING, UPDATE -> FAILED, SELECT followers
+        with django_assert_num_queries(4):
+            process_summary_task(pending_summary.id)
+
+    pending_summary.refresh_from_db()
+    assert pending_summary.status == "FAILED"
+
+@pytest.mark.parametrize("task_name, queue", [
+    ("domain.tasks.fetch_page_task", "fetch"),
+    ("domain.tasks.parse_page_task", "parse"),
+    ("domain.tasks.summarize_content_task", "summarize"),
+    ("domain.tasks.summarize_pack_task", "summarize"),
+    ("domain.tasks.process_summary_task", "celery"),
+])
+def test_pipeline_stages_are_routed_to_their_own_queue(eager_celery, task_name, queue):
+    route = eager_celery.amqp.router.route({}, task_name)
+    assert route["queue"].name == queue
@@ -0,0 +1,89 @@
+import pytest
+from unittest.mock import patch, MagicMock
+from prometheus_client import REGISTRY
+from domain import telemetry
+from domain.fetcher import FetchedPage
+from domain.services import ResearchAgent
+from domain.tasks import process_summary_task
+from domain.telemetry import domain_label, record_model_usage, stage
+from interface_layer.models import Summary
+from django.contrib.auth import get_user_model
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.fixture(autouse=True)
+def fresh_domains(monkeypatch):
+    """No domain labels handed out yet, and none left over by tasks called directly (without their signals)"""
+    monkeypatch.setattr(telemetry, "_domains", set())
+    token = telemetry._current_domain.set("")
+    yield
+    telemetry._current_domain.reset(token)
+
+def test_stage_is_timed_per_domain_even_when_it_fails():
+    before = sample("summary_stage_seconds_count", stage="fetch", domain="example.com")
+    with stage("fetch", url="https://www.example.com/a"):
+        pass
+    with pytest.raises(ValueError):
+        with stage("fetch", url="https://example.com/b"):
+            raise ValueError("boom")
+    assert sample("summary_stage_seconds_count", stage="fetch", domain="example.com") == before + 2
+
+def test_domain_labels_are_capped(settings):
+    settings.TELEMETRY = {**settings.TELEMETRY, "MAX_DOMAINS": 2}
+    assert [domain_label(f"https://{host}/") for host in ("a.com", "b.com", "c.com", "a.com")] == [
+        "a.com", "b.com", "other", "a.com",
+    ]
+
+def test_model_usage_is_counted_and_mocks_are_ignored():
+    before = sample("summary_model_tokens_total", direction="input", domain="news.org")
+    record_model_usage(MagicMock(prompt_token_count=120, candidates_token_count=30), domain="news.org")
+    record_model_usage(MagicMock(), domain="news.org")  # No real numbers: nothing counted
+    record_model_usage(None, domain="news.org")
+    assert sample("summary_model_tokens_total", direction="input", domain="news.org") == before + 120
+
+def test_summarize_text_times_the_model_call_and_counts_its_tokens():
+    client = MagicMock()
+    client.models.generate_content.return_value = MagicMock(
+        text="Summary", usage_metadata=MagicMock(prompt_token_count=50, candidates_token_count=7),
+    )
+    before = sample("summary_model_tokens_total", direction="output", domain="")
+    calls = sample("summary_stage_seconds_count", stage="model", domain="")
+    with patch.object(ResearchAgent, "_get_client", return_value=client):
+        assert ResearchAgent().summarize_text("text") == "Summary"
+    assert sample("summary_model_tokens_total", direction="output", domain="") == before + 7
+    assert sample("summary_stage_seconds_count", stage="model", domain="") == calls + 1
+
+@pytest.mark.django_db
+def test_pipeline_records_every_stage(settings):
+    from intelliresearchhub.celery import app
+    app.conf.task_always_eager = True
+    user = get_user_model().objects.create_user(username="telemetry_tester")
+    summary = Summary.objects.create(user=user, url="https://blog.example.org/post", status="PENDING")
+    stages = ("fetch", "parse", "db_write")
+    before = {name: sample("summary_stage_seconds_count", stage=name, domain="blog.example.org") for name in stages}
+    waits = sample("summary_queue_wait_seconds_count", stage="fetch")
+    completed = sample("summary_results_total", status="COMPLETED")
+    runs = sample("summary_tasks_total", task="domain.tasks.fetch_page_task", state="SUCCESS")
+    try:
+        with patch("domain.tasks.ResearchAgent") as MockAgentClass:
+            MockAgentClass.return_value.fetch_page.return_value = FetchedPage("<p>Hello</p>")
+            MockAgentClass.return_value.summarize_text.return_value = "Summary"
+            process_summary_task(summary.id)
+    finally:
+        app.conf.task_always_eager = False
+
+    # mark_processing, save_content, attach_content and complete are the DB writes
+    assert sample("summary_stage_seconds_count", stage="db_write", domain="blog.example.org") == before["db_write"] + 4
+    for name in ("fetch", "parse"):
+        assert sample("summary_stage_seconds_count", stage=name, domain="blog.example.org") == before[name] + 1
+    assert sample("summary_queue_wait_seconds_count", stage="fetch") == waits + 1
+    assert sample("summary_results_total", status="COMPLETED") == completed + 1
+    assert sample("summary_tasks_total", task="domain.tasks.fetch_page_task", state="SUCCESS") == runs + 1
+
+@pytest.mark.django_db
+def test_sql_statements_are_counted():
+    before = sample("db_queries_total", alias="default")
+    get_user_model().objects.filter(username="nobody").exists()
+    Summary.objects.count()
+    assert sample("db_queries_total", alias="default") == before + 2
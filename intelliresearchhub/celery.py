@@ -1,6 +1,15 @@
 # core/celery.py
 import os
 from celery import Celery
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+)
 
 # 1. Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'intelliresearchhub.settings')
@@ -13,4 +22,42 @@ app = Celery('intelliresearchhub')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # 4. Auto-discover tasks in all installed apps (looks for tasks.py)
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+# 5. Every prefork child builds its GenAI client (and reads the key) once, before its first task
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    from domain.genai_client import get_client_manager
+    get_client_manager().warm_up()
+
+# 6. Telemetry (domain/telemetry.py): a span per task, continued across the pipeline, and the task counters
+@before_task_publish.connect
+def inject_trace_headers(**kwargs):
+    from domain.telemetry import inject_trace_headers
+    inject_trace_headers(**kwargs)
+
+@task_prerun.connect
+def start_task_span(**kwargs):
+    from domain.telemetry import start_task_span
+    start_task_span(**kwargs)
+
+@task_postrun.connect
+def end_task_span(**kwargs):
+    from domain.telemetry import end_task_span
+    end_task_span(**kwargs)
+
+# 7. Prometheus: every worker serves the metrics of all its processes (prefork children write them to files)
+@worker_init.connect
+def prepare_metrics(**kwargs):
+    from domain.telemetry import prepare_multiprocess_dir
+    prepare_multiprocess_dir()
+
+@worker_ready.connect
+def serve_metrics(**kwargs):
+    from domain.telemetry import start_worker_metrics_server
+    start_worker_metrics_server()
+
+@worker_process_shutdown.connect
+def forget_process_metrics(pid=None, **kwargs):
+    from domain.telemetry import mark_process_dead
+    mark_process_dead(pid)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Full-text and trigram search (domain/search.py)
 
     # Third-party apps
     'rest_framework',
@@ -171,9 +172,199 @@ if REDIS_PASSWORD:
 else:
     # Localhost Development Style (No Password)
     CELERY_BROKER_URL = f"redis://{REDIS_HOST}:6379/0"
+# (CELERY_BROKER_URL in the environment wins, e.g. memory:// for benchmarks/bench_api_views.py)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', CELERY_BROKER_URL)
 
 CELERY_RESULT_BACKEND = 'django-db'
 
+# One queue per pipeline stage (domain/tasks.py), each consumed by its own worker pool
+# (see the worker-* services in docker-compose.yaml):
+# - fetch: network waits -> thread pool, high concurrency (all threads share one asyncio fetch loop)
+# - parse: HTML cleaning is CPU-bound -> prefork, one process per core
+# - summarize: waits on Gemini for seconds -> thread pool, high concurrency
+# Everything else (dispatch, chord callbacks) stays on the default 'celery' queue.
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'domain.tasks.fetch_page_task': {'queue': 'fetch'},
+    'domain.tasks.parse_page_task': {'queue': 'parse'},
+    'domain.tasks.summarize_content_task': {'queue': 'summarize'},
+    'domain.tasks.summarize_pack_task': {'queue': 'summarize'},
+}
+
+# Application data (caches, pub/sub, locks) lives in its own Redis DB, apart from the Celery broker
+if REDIS_PASSWORD:
+    REDIS_URL = f"redis://:{REDIS_PASSWORD}@{REDIS_HOST}:6379/1"
+else:
+    REDIS_URL = f"redis://{REDIS_HOST}:6379/1"
+
+# --- SUMMARY CACHE ---
+# Finished summaries are shared between users, keyed by normalized URL + content hash + prompt version.
+# BACKEND: 'locmem' (per-process, dev/tests), 'redis' (shared) or 'database' (Postgres table)
+SUMMARY_CACHE = {
+    'BACKEND': os.environ.get('SUMMARY_CACHE_BACKEND', 'locmem'),
+    'TTL': int(os.environ.get('SUMMARY_CACHE_TTL', 60 * 60 * 24)),  # seconds
+    'MAX_ENTRIES': int(os.environ.get('SUMMARY_CACHE_MAX_ENTRIES', 10000)),
+}
+
+# --- PAGE CACHE ---
+# Validators (ETag, Last-Modified, body hash) of every scraped page, so a re-check of an unchanged page
+# is a conditional request and reuses the clean text (and the summary) from last time.
+# BACKEND: same choices as SUMMARY_CACHE; 'database' keeps it in Postgres across restarts
+PAGE_CACHE = {
+    'BACKEND': os.environ.get('PAGE_CACHE_BACKEND', 'locmem'),
+    'TTL': int(os.environ.get('PAGE_CACHE_TTL', 60 * 60 * 24 * 30)),  # seconds
+    'MAX_ENTRIES': int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 100000)),
+}
+
+# --- SEARCH ---
+# GET /my-summaries/search/?q=...: Postgres full-text search over URL, summary and page text,
+# plus fuzzy (pg_trgm) matching on the URL. All GIN-indexed (see Summary.Meta.indexes).
+SUMMARY_SEARCH = {
+    'CONFIG': os.environ.get('SEARCH_CONFIG', 'english'),  # text search configuration (stemming, stop words)
+    'MAX_TEXT_CHARS': int(os.environ.get('SEARCH_MAX_TEXT_CHARS', 100000)),  # page text indexed per summary
+}
+
+# --- NEAR-DUPLICATE PAGES ---
+# The same article at another URL (AMP version, syndication partner, tracking redirect) reuses the summary of its
+# finished copy instead of calling the model: SimHash fingerprints of the clean text (domain/near_duplicates.py).
+NEAR_DUPLICATES = {
+    'ENABLED': os.environ.get('NEAR_DUPLICATES_ENABLED', 'True') == 'True',
+    'MAX_DISTANCE': int(os.environ.get('NEAR_DUPLICATES_MAX_DISTANCE', 3)),  # differing bits out of 64 (at most 3)
+    'MIN_WORDS': int(os.environ.get('NEAR_DUPLICATES_MIN_WORDS', 100)),  # shorter texts are not fingerprinted
+}
+
+# --- RELATED SUMMARIES ---
+# GET /summarize/<id>/related/: the user's summaries closest in content to this one, without calling the model.
+# Hashed TF-IDF vectors in a memory-mapped IVF index on disk (domain/related.py), filled by the workers as
+# summaries complete: PATH must be shared by the web app and the workers (the project volume in docker-compose).
+RELATED_INDEX = {
+    'PATH': os.environ.get('RELATED_INDEX_PATH', str(BASE_DIR / 'var' / 'related_index')),
+    'DIMENSIONS': int(os.environ.get('RELATED_INDEX_DIMENSIONS', 512)),  # hashed word buckets per vector
+    'PROBES': int(os.environ.get('RELATED_INDEX_PROBES', 8)),  # IVF lists scanned per search
+    'EXACT_ROWS': int(os.environ.get('RELATED_INDEX_EXACT_ROWS', 10000)),  # smaller histories are scanned in full
+    'MAX_K': int(os.environ.get('RELATED_MAX_K', 50)),  # results per request
+}
+
+# --- SCRAPING ---
+# Limits for the async fetch engine (domain/fetcher.py); one pool per worker process
+FETCHER = {
+    'MAX_CONNECTIONS': int(os.environ.get('FETCHER_MAX_CONNECTIONS', 200)),  # fetches in flight per process
+    'MAX_PER_HOST': int(os.environ.get('FETCHER_MAX_PER_HOST', 8)),
+    'TIMEOUT': float(os.environ.get('FETCHER_TIMEOUT', 10)),  # seconds
+    'MAX_BYTES': int(os.environ.get('FETCHER_MAX_BYTES', 5 * 1024 * 1024)),  # body size cap
+}
+
+# --- ASYNC API VIEWS ---
+# Submit, status and list endpoints served by async-native views (interface_layer/views.py) instead of the
+# DRF ones, which hold a thread per request under uvicorn. Opt-in: benchmarks/bench_api_views.py has the async
+# status and list views slower than the DRF ones so far.
+ASYNC_API_VIEWS = os.environ.get('ASYNC_API_VIEWS', 'False') == 'True'
+
+# --- STREAMING SUMMARIES ---
+# When on, single-URL jobs stream the model's answer chunk by chunk through Redis
+# to GET /summarize/<id>/stream/ (needs a Redis server shared by web and worker).
+SUMMARY_STREAMING = os.environ.get('SUMMARY_STREAMING', 'False') == 'True'
+
+# --- SCRAPE POLITENESS ---
+# Token bucket per host, consulted before every scrape (domain/politeness.py).
+# A busy host makes the task come back later (Celery countdown) instead of hammering it or blocking a worker.
+# 'locmem' buckets are per process; use 'redis' when several workers scrape.
+SCRAPE_POLITENESS = {
+    'ENABLED': os.environ.get('SCRAPE_POLITENESS', 'True') == 'True',
+    'BACKEND': os.environ.get('SCRAPE_RATE_LIMIT_BACKEND', 'locmem'),
+    'RATE': float(os.environ.get('SCRAPE_RATE_PER_HOST', 1)),  # fetches per second per host
+    'BURST': int(os.environ.get('SCRAPE_BURST_PER_HOST', 4)),
+    'MAX_WAIT': int(os.environ.get('SCRAPE_MAX_WAIT', 600)),  # seconds; fetches are not booked further ahead
+    'MAX_RESCHEDULES': 100,  # per task, then the summary FAILS
+    'ROBOTS_TTL': 60 * 60,  # seconds a parsed robots.txt is kept in memory
+    'ROBOTS_MAX_HOSTS': 1000,
+}
+
+# --- RETRIES & CIRCUIT BREAKERS ---
+# Transient errors (throttling, timeouts, 5xx) are retried by the pipeline tasks with exponential backoff and full jitter
+TASK_RETRY = {
+    'MAX_RETRIES': int(os.environ.get('TASK_MAX_RETRIES', 5)),  # then the summary FAILS
+    'BACKOFF_MAX': 600,  # seconds; cap of the backoff
+    'MAX_PARKS': 200,  # reschedules while a circuit is open, per task
+}
+# The model API and every scraped host get a breaker: after FAILURE_THRESHOLD transient failures within WINDOW seconds,
+# calls are refused for RESET_TIMEOUT seconds (tasks park meanwhile), then one probe call tests the endpoint.
+CIRCUIT_BREAKER = {
+    'BACKEND': os.environ.get('CIRCUIT_BREAKER_BACKEND', 'locmem'),  # 'redis' to share the state between workers
+    'FAILURE_THRESHOLD': int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5)),
+    'WINDOW': 60,
+    'RESET_TIMEOUT': int(os.environ.get('CIRCUIT_RESET_TIMEOUT', 30)),
+    'PROBE_TIMEOUT': 60,  # seconds one probe call may take before another caller may probe
+}
+
+# --- TELEMETRY ---
+# Every stage of the pipeline is timed (domain/telemetry.py): OpenTelemetry spans, and Prometheus histograms
+# served at /metrics/ by the web app and on WORKER_METRICS_PORT by every worker.
+TELEMETRY = {
+    'SERVICE_NAME': os.environ.get('OTEL_SERVICE_NAME', 'intelliresearchhub'),
+    'OTLP_ENDPOINT': os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT', ''),  # e.g. http://otel-collector:4318; empty: spans are not exported
+    'WORKER_METRICS_PORT': int(os.environ.get('WORKER_METRICS_PORT', 0)),  # 0: workers do not serve metrics
+    'MAX_DOMAINS': int(os.environ.get('METRICS_MAX_DOMAINS', 200)),  # hosts with their own `domain` label, per process
+}
+
+# --- HTML PARSER ---
+# Backend for the cleaning phase: 'auto', 'selectolax', 'lxml', 'stream' or 'html.parser' (see domain/parsers.py).
+# 'auto' uses the fastest one installed (pip install "intelligent-research-hub[fast-parsers]").
+# Trade-off: only 'stream' cleans while downloading and ends the download once MAX_DOCUMENT_CHARS of clean text
+# exist; the C parsers (selectolax, lxml) download up to FETCHER['MAX_BYTES'] and parse the whole body, ~5x faster
+# (benchmarks/bench_parsers.py). The early stop only pays off for pages with more text than that budget.
+HTML_PARSER_BACKEND = os.environ.get('HTML_PARSER_BACKEND', 'auto')
+
+# --- BATCH SUMMARIES ---
+# POST /summarize/batch/ packs several short documents into one model request
+SUMMARY_BATCH = {
+    'MAX_URLS': int(os.environ.get('SUMMARY_BATCH_MAX_URLS', 500)),  # per request
+    'TOKEN_BUDGET': int(os.environ.get('SUMMARY_BATCH_TOKEN_BUDGET', 24000)),  # input tokens per model call
+    'MAX_DOCUMENTS_PER_CALL': int(os.environ.get('SUMMARY_BATCH_MAX_DOCUMENTS', 8)),
+}
+
+# --- LONG DOCUMENTS ---
+# Texts over SINGLE_PASS_TOKENS are split into segments, summarized in parallel and merged (map-reduce)
+SUMMARY_MAP_REDUCE = {
+    'MAX_DOCUMENT_CHARS': int(os.environ.get('SUMMARY_MAX_DOCUMENT_CHARS', 400000)),  # clean text kept per page
+    'SINGLE_PASS_TOKENS': int(os.environ.get('SUMMARY_SINGLE_PASS_TOKENS', 3750)),  # ~15,000 characters
+    'SEGMENT_TOKENS': int(os.environ.get('SUMMARY_SEGMENT_TOKENS', 4000)),  # max input tokens per segment call
+    'MAX_PARALLEL': int(os.environ.get('SUMMARY_MAX_PARALLEL_SEGMENTS', 8)),  # segment calls in flight per task
+    'MAX_CONDENSE_ROUNDS': 3,
+}
+
+# --- FAIR SCHEDULING ---
+# Submitted jobs wait in per-user queues (domain/scheduling.py) and are let into the pipeline round-robin across
+# users, interactive submissions before bulk imports, under the caps below. The queue must be shared by the web app
+# and the workers: turn it on together with BACKEND 'redis' (with 'locmem', the workers' rechecks would read their own,
+# empty queue and the waiting jobs would never start). Off, jobs go straight to Celery.
+SUMMARY_SCHEDULING = {
+    'ENABLED': os.environ.get('SUMMARY_SCHEDULING_ENABLED', 'False') == 'True',
+    'BACKEND': os.environ.get('SUMMARY_SCHEDULING_BACKEND', 'locmem'),
+    'MAX_RUNNING': int(os.environ.get('SUMMARY_MAX_RUNNING', 64)),  # jobs in the pipeline, all users together
+    # Half the pipeline: a user alone still imports at speed, a newcomer still finds free slots
+    'MAX_RUNNING_PER_USER': int(os.environ.get('SUMMARY_MAX_RUNNING_PER_USER', 32)),
+    'BULK_SHARE': float(os.environ.get('SUMMARY_BULK_SHARE', 0.75)),  # of MAX_RUNNING bulk jobs may take
+    # Bulk jobs let in together (one batch task: packed into shared model calls)
+    'BULK_SLICE': SUMMARY_BATCH['MAX_DOCUMENTS_PER_CALL'],
+    'RECHECK_SECONDS': float(os.environ.get('SUMMARY_SCHEDULING_RECHECK', 1)),  # while jobs wait for room
+    'RUNNING_TIMEOUT': 60 * 60,  # seconds; a job running longer no longer counts against the caps (lost task)
+    'METRICS_MAX_USERS': 50,  # users with their own label in the queue metrics
+}
+
+# --- PROMPT COMPRESSION ---
+# Before a text goes into a prompt, what the tag stripping left behind (repeated blocks, cookie banners, link lists)
+# is dropped, and a text slightly over TOKEN_BUDGET loses its least dense sentences to fit it (domain/compression.py).
+# The cache stays keyed by the clean text. Checked against stored summaries with `manage.py check_prompt_compression`.
+PROMPT_COMPRESSION = {
+    'ENABLED': os.environ.get('PROMPT_COMPRESSION_ENABLED', 'True') == 'True',
+    'TOKEN_BUDGET': int(os.environ.get('PROMPT_TOKEN_BUDGET', SUMMARY_MAP_REDUCE['SINGLE_PASS_TOKENS'])),
+    # Share of a text that may be trimmed to fit the budget; longer texts are map-reduced whole
+    'MAX_TRIM_RATIO': float(os.environ.get('PROMPT_MAX_TRIM_RATIO', 0.25)),
+    # check_prompt_compression fails if summaries of the compressed texts are this much further from the stored ones
+    'PARITY_TOLERANCE': float(os.environ.get('PROMPT_PARITY_TOLERANCE', 0.05)),
+}
+
 # Where to redirect after login
 LOGIN_REDIRECT_URL = 'dashboard' 
 
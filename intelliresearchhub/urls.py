@@ -14,21 +14,35 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from interface_layer import views
 from django.views.generic.base import TemplateView
 
+# The busiest endpoints come in two flavours: async-native views, or the DRF (sync) ones (settings.ASYNC_API_VIEWS)
+if settings.ASYNC_API_VIEWS:
+    submit_view, detail_view, list_view = views.amake_summary_request, views.aget_summary_status, views.aget_summaries
+else:
+    submit_view, detail_view, list_view = views.make_summary_request, views.get_summary_status, views.get_summaries
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # Add Django's built-in auth URLs (Login/Logout/Password Reset)
     path('accounts/', include('django.contrib.auth.urls')),
     # Enables the "Log in" button in the API interface
     path('api-auth/', include('rest_framework.urls')),
-    path('summarize/', views.make_summary_request, name='submit-summary'),
-    path('summarize/<uuid:summary_id>/', views.get_summary_status, name='get-summary-detail'),
-    path('my-summaries/', views.get_summaries, name='list-summaries'),
+    path('summarize/', submit_view, name='submit-summary'),
+    path('summarize/batch/', views.make_batch_summary_request, name='submit-summary-batch'),
+    path('summarize/events/', views.summary_events, name='summary-events'),
+    path('summarize/<uuid:summary_id>/', detail_view, name='get-summary-detail'),
+    path('summarize/<uuid:summary_id>/content/', views.get_summary_content, name='get-summary-content'),
+    path('summarize/<uuid:summary_id>/stream/', views.stream_summary, name='stream-summary'),
+    path('summarize/<uuid:summary_id>/related/', views.get_related_summaries, name='get-related-summaries'),
+    path('my-summaries/', list_view, name='list-summaries'),
+    path('my-summaries/search/', views.search_summaries, name='search-summaries'),
 
     path('register/', views.register_view, name='register'),
     path('dashboard/', views.dashboard_view, name='dashboard'), # Your frontend from before
+    path('metrics/', views.metrics_view, name='metrics'),  # Prometheus
 ]
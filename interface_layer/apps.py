@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class InterfaceLayerConfig(AppConfig):
     name = 'interface_layer'
+
+    def ready(self):
+        # Every SQL statement is counted (db_queries_total, see domain/telemetry.py)
+        from django.db.backends.signals import connection_created
+        from domain.telemetry import instrument_connection
+        connection_created.connect(instrument_connection)
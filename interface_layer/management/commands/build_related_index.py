@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from domain.related import embed, get_related_index
+from interface_layer.models import Summary
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the related-summaries index (domain/related.py) from every completed summary. "
+        "Run it once after deploying the index, or after its files were lost."
+    )
+
+    def handle(self, *args, **options):
+        index = get_related_index()
+        index.clear()
+        rows = (
+            Summary.objects.filter(status='COMPLETED')
+            .values_list('id', 'user_id', 'url', 'output_summary')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        batch, total = [], 0
+        for summary_id, user_id, url, output_summary in rows:
+            batch.append((summary_id, user_id, embed(url, output_summary)))
+            if len(batch) >= BATCH_SIZE:
+                index.add(batch)
+                total += len(batch)
+                batch = []
+        index.add(batch)
+        total += len(batch)
+        self.stdout.write(f"Indexed {total} summaries.")
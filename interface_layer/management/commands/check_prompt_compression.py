@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from domain.batching import estimate_tokens
+from domain.compression import compress
+from domain.related import embed
+from domain.services import ResearchAgent
+from domain.tasks import is_long_document
+from interface_layer.models import Summary
+
+
+def summarize(agent, text: str) -> str:
+    return agent.summarize_long_text(text) if is_long_document(text) else agent.summarize_text(text)
+
+
+class Command(BaseCommand):
+    help = (
+        "Quality parity check of prompt compression (domain/compression.py) on the latest completed summaries. "
+        "Every text compression changes is summarized again, as is and compressed, and both new summaries are "
+        "compared with the stored one. Fails if the compressed ones are further from it by more than "
+        "PROMPT_COMPRESSION['PARITY_TOLERANCE'] on average."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=20, help="Summaries to check (two model calls each)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the tokens saved, without the model")
+
+    def handle(self, *args, sample, dry_run, **options):
+        config = settings.PROMPT_COMPRESSION
+        summaries = (
+            Summary.objects.filter(status='COMPLETED', content__isnull=False)
+            .exclude(output_summary=None)
+            .select_related('content')
+            .order_by('-updated_at')[:sample]
+        )
+        agent = ResearchAgent()
+
+        # 1. Compress every text; summarize the changed ones again both ways
+        count = tokens_before = tokens_after = 0
+        as_is, compressed = [], []
+        for summary in summaries:
+            text = summary.input_content
+            compressed_text, _ = compress(text, config['TOKEN_BUDGET'], config['MAX_TRIM_RATIO'])
+            count += 1
+            tokens_before += estimate_tokens(text)
+            tokens_after += estimate_tokens(compressed_text)
+            if dry_run or compressed_text == text:
+                continue  # The same prompt: nothing to compare
+            stored = embed('', summary.output_summary)
+            as_is.append(float(stored @ embed('', summarize(agent, text))))
+            compressed.append(float(stored @ embed('', summarize(agent, compressed_text))))
+
+        saved = tokens_before - tokens_after
+        self.stdout.write(
+            f"{count} texts: {tokens_before} -> {tokens_after} estimated tokens "
+            f"({saved / max(1, tokens_before):.1%} saved)"
+        )
+        if not as_is:
+            return
+
+        # 2. Cosine similarity (domain/related.py vectors) of the new summaries to the stored ones
+        as_is_mean, compressed_mean = sum(as_is) / len(as_is), sum(compressed) / len(compressed)
+        self.stdout.write(
+            f"{len(as_is)} compressed texts summarized again: similarity to the stored summaries "
+            f"{as_is_mean:.3f} as is, {compressed_mean:.3f} compressed"
+        )
+        if compressed_mean < as_is_mean - config['PARITY_TOLERANCE']:
+            raise CommandError("Summaries of the compressed texts are further from the stored ones than the tolerance")
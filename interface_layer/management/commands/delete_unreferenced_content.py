@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from domain.content_store import delete_unreferenced_content
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the stored page texts (ContentBlob) no summary uses any more, e.g. after users deleted their "
+        "history. Meant for a periodic job (cron, a scheduled container)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help="Minutes a text is kept regardless: a worker saves it just before attaching it to its summary",
+        )
+
+    def handle(self, *args, min_age, **options):
+        deleted = delete_unreferenced_content(timedelta(minutes=min_age))
+        self.stdout.write(f"Deleted {deleted} unreferenced texts.")
@@ -0,0 +1,92 @@
+# Moves the inline Summary.input_content text into the deduplicated ContentBlob table
+
+import hashlib
+import zlib
+
+from django.db import migrations
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 500
+
+
+# Frozen copies of the domain/content_store.py helpers as they were when this migration was written:
+# later changes there must not change what it does.
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress(text: str) -> tuple:
+    raw = text.encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=3).compress(raw)
+    return 'zlib', zlib.compress(raw, 6)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This content is zstd-compressed; install the 'zstandard' package to read it")
+        raw = zstandard.ZstdDecompressor().decompress(bytes(data))
+    elif codec == 'zlib':
+        raw = zlib.decompress(bytes(data))
+    else:
+        raise ValueError(f"Unknown content codec {codec!r}")
+    return raw.decode('utf-8')
+
+
+def move_to_blobs(apps, schema_editor):
+    Summary = apps.get_model('interface_layer', 'Summary')
+    ContentBlob = apps.get_model('interface_layer', 'ContentBlob')
+
+    rows = (
+        Summary.objects.filter(input_content__isnull=False, content__isnull=True)
+        .only('id', 'input_content')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for summary in rows:
+        batch.append(summary)
+        if len(batch) >= BATCH_SIZE:
+            _save_batch(ContentBlob, Summary, batch)
+            batch = []
+    if batch:
+        _save_batch(ContentBlob, Summary, batch)
+
+
+def _save_batch(ContentBlob, Summary, summaries):
+    # 1. One blob per distinct text (many users often scraped the same page)
+    blobs = {}
+    for summary in summaries:
+        digest = content_hash(summary.input_content)
+        if digest not in blobs:
+            codec, data = compress(summary.input_content)
+            blobs[digest] = ContentBlob(digest=digest, codec=codec, data=data, size=len(summary.input_content))
+        summary.content_id = digest
+
+    # 2. A blob may already exist from an earlier batch
+    ContentBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+    Summary.objects.bulk_update(summaries, ['content'])
+
+
+def restore_inline_text(apps, schema_editor):
+    Summary = apps.get_model('interface_layer', 'Summary')
+
+    for summary in Summary.objects.filter(content__isnull=False).select_related('content').iterator(chunk_size=BATCH_SIZE):
+        summary.input_content = decompress(summary.content.codec, summary.content.data)
+        summary.save(update_fields=['input_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0003_contentblob_summary_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_blobs, restore_inline_text),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:51
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0004_move_input_content_to_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='summary',
+            name='input_content',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:54
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing rows were filled with the migration time; their creation time is a better guess
+    Summary = apps.get_model('interface_layer', 'Summary')
+    Summary.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0005_remove_summary_input_content'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summary',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='summary',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='summary_user_created_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
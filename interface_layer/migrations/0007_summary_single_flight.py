@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0006_summary_updated_at_and_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summary',
+            name='leader',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='interface_layer.summary'),
+        ),
+        migrations.AddField(
+            model_name='summary',
+            name='url_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='summary',
+            constraint=models.UniqueConstraint(condition=models.Q(('leader__isnull', True), ('status__in', ('PENDING', 'PROCESSING')), models.Q(('url_key', ''), _negated=True)), fields=('url_key',), name='summary_one_job_per_url'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Full-text and trigram search over summaries (SummaryQuerySet.search): the search columns,
+# a backfill of the summaries completed before them, then the GIN indexes.
+# Generated by Django 6.0.1 on 2026-10-18 12:38
+
+import re
+import zlib
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 500
+# SUMMARY_SEARCH's defaults when this migration was written
+SEARCH_CONFIG = 'english'
+MAX_TEXT_CHARS = 100000
+
+
+# Frozen copies of the domain/search.py and domain/content_store.py helpers as they were when this migration
+# was written: later changes there (or to the settings) must not change what it does.
+
+def url_words(url: str) -> str:
+    return re.sub(r'[\W_]+', ' ', url or '').strip()
+
+
+def search_document(url: str, output_summary: str):
+    return (
+        SearchVector(Value(url_words(url)), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(output_summary or ''), weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def text_document(text: str):
+    if not text:
+        return None
+    return SearchVector(Value(text[:MAX_TEXT_CHARS]), config=SEARCH_CONFIG)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This content is zstd-compressed; install the 'zstandard' package to read it")
+        raw = zstandard.ZstdDecompressor().decompress(bytes(data))
+    elif codec == 'zlib':
+        raw = zlib.decompress(bytes(data))
+    else:
+        raise ValueError(f"Unknown content codec {codec!r}")
+    return raw.decode('utf-8')
+
+
+def index_completed_summaries(apps, schema_editor):
+    Summary = apps.get_model('interface_layer', 'Summary')
+
+    rows = (
+        Summary.objects.filter(status='COMPLETED', search_vector__isnull=True)
+        .select_related('content')
+        .only('id', 'url', 'output_summary', 'content__codec', 'content__data')
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for summary in rows:
+        text = decompress(summary.content.codec, summary.content.data) if summary.content else None
+        summary.search_vector = search_document(summary.url, summary.output_summary)
+        summary.text_vector = text_document(text)
+        batch.append(summary)
+        if len(batch) >= BATCH_SIZE:
+            Summary.objects.bulk_update(batch, ['search_vector', 'text_vector'])
+            batch = []
+    if batch:
+        Summary.objects.bulk_update(batch, ['search_vector', 'text_vector'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0007_summary_single_flight'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='summary',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='summary',
+            name='text_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(index_completed_summaries, migrations.RunPython.noop),
+        # The indexes are built after the backfill: one pass over the table instead of one update per row
+        migrations.AddIndex(
+            model_name='summary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='summary_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='summary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['text_vector'], name='summary_text_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='summary',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['url'], name='summary_url_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Near-duplicate pages: SimHash fingerprints of the stored texts (domain/near_duplicates.py),
+# computed for the blobs saved before this migration, then indexed.
+# Generated by Django 6.0.1 on 2026-10-18 12:38
+
+import hashlib
+import re
+import zlib
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import numpy as np
+from django.db import migrations, models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BATCH_SIZE = 500
+# NEAR_DUPLICATES['MIN_WORDS'] default when this migration was written
+MIN_WORDS = 100
+WORD_RE = re.compile(r'\w+')
+SHINGLE_WORDS = 3
+BANDS = 4
+BAND_BITS = 64 // BANDS
+MASK = (1 << 64) - 1
+
+
+# Frozen copies of the domain/near_duplicates.py and domain/content_store.py helpers as they were when this
+# migration was written: later changes there (or to the settings) must not change what it does.
+
+def simhash(text: str):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+    bits = np.unpackbits(np.frombuffer(hashes, dtype=np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int(np.packbits(votes).view('<i8')[0])
+
+
+def bands(fingerprint: int) -> list:
+    unsigned = fingerprint & MASK
+    return [(band << BAND_BITS) | ((unsigned >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)) for band in range(BANDS)]
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This content is zstd-compressed; install the 'zstandard' package to read it")
+        raw = zstandard.ZstdDecompressor().decompress(bytes(data))
+    elif codec == 'zlib':
+        raw = zlib.decompress(bytes(data))
+    else:
+        raise ValueError(f"Unknown content codec {codec!r}")
+    return raw.decode('utf-8')
+
+
+def fingerprint_blobs(apps, schema_editor):
+    ContentBlob = apps.get_model('interface_layer', 'ContentBlob')
+
+    rows = ContentBlob.objects.filter(simhash__isnull=True).only('digest', 'codec', 'data').iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for blob in rows:
+        fingerprint = simhash(decompress(blob.codec, blob.data))
+        if fingerprint is None:
+            continue
+        blob.simhash, blob.simhash_bands = fingerprint, bands(fingerprint)
+        batch.append(blob)
+        if len(batch) >= BATCH_SIZE:
+            ContentBlob.objects.bulk_update(batch, ['simhash', 'simhash_bands'])
+            batch = []
+    if batch:
+        ContentBlob.objects.bulk_update(batch, ['simhash', 'simhash_bands'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('interface_layer', '0008_summary_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentblob',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='contentblob',
+            name='simhash_bands',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, null=True),
+        ),
+        migrations.RunPython(fingerprint_blobs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contentblob',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['simhash_bands'], name='contentblob_simhash_idx'),
+        ),
+    ]
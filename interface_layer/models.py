@@ -1,8 +1,198 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchRank, SearchVectorField, TrigramWordSimilarity
+from django.db.models import F, FloatField, Q, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
 import uuid
 
+from domain.canonical import url_key
+from domain.content_store import CODEC_CHOICES, decompress
+from domain.search import search_document, search_query, text_document
+
+class ContentBlob(models.Model):
+    """
+    One scraped page text, stored ONCE no matter how many summaries use it.
+    Compressed (zstd when available) and keyed by the sha256 of the text.
+    Write it through domain.content_store.save_content().
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    codec = models.CharField(max_length=8, choices=CODEC_CHOICES)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()  # Length of the uncompressed text, in characters
+    created_at = models.DateTimeField(auto_now_add=True)
+    # SimHash of the text and its LSH bands (domain/near_duplicates.py), to find mirrors and syndicated copies;
+    # empty for texts too short to fingerprint
+    simhash = models.BigIntegerField(blank=True, null=True)
+    simhash_bands = ArrayField(models.BigIntegerField(), blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['simhash_bands'], name='contentblob_simhash_idx'),
+        ]
+
+    @property
+    def text(self) -> str:
+        return decompress(self.codec, self.data)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} chars)"
+
+# A job in one of these can still move on; COMPLETED and FAILED are final
+ACTIVE_STATUSES = ('PENDING', 'PROCESSING')
+
+# How often create_or_follow() looks for a leader again after losing a race
+SINGLE_FLIGHT_ATTEMPTS = 3
+
+class SummaryQuerySet(models.QuerySet):
+    def fail(self) -> int:
+        """Marks every still-active summary in the queryset FAILED (one UPDATE). Returns how many changed."""
+        return self.filter(status__in=ACTIVE_STATUSES).update(status='FAILED', updated_at=timezone.now())
+
+    def complete(self, summaries: list, fields: list) -> list:
+        """
+        PROCESSING -> COMPLETED for many summaries at once, saving `fields` from each instance along with the status.
+        Rows that moved on meanwhile (failed, or finished by another delivery) are left alone.
+        Returns the summaries that were completed. One locking SELECT, one UPDATE.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            running = set(
+                self.filter(pk__in=[summary.pk for summary in summaries], status='PROCESSING')
+                .select_for_update().values_list('pk', flat=True)
+            )
+            completed = [summary for summary in summaries if summary.pk in running]
+            for summary in completed:
+                summary.status = 'COMPLETED'
+                summary.updated_at = now
+            self.filter(status='PROCESSING').bulk_update(completed, [*fields, 'status', 'updated_at'])
+        return completed
+
+    # Single-flight: while a URL is being summarized, further requests for it (from any user)
+    # "follow" that job instead of starting their own, and get its outcome when it finishes.
+    def active_leaders(self, keys):
+        """The running jobs (leaders) for these url_keys, as {url_key: id}."""
+        leaders = self.filter(url_key__in=keys, leader__isnull=True, status__in=ACTIVE_STATUSES)
+        return dict(leaders.values_list('url_key', 'id'))
+
+    def create_or_follow(self, user, url: str) -> tuple:
+        """
+        Creates a PENDING summary of `url` for `user`, following the running job for the same canonical URL if there is one.
+        Returns (summary, is_leader): only a leader's job has to be enqueued.
+        """
+        key = url_key(url)
+        for _ in range(SINGLE_FLIGHT_ATTEMPTS):
+            leader_id = self.active_leaders([key]).get(key)
+            try:
+                with transaction.atomic():
+                    summary = self.create(user=user, url=url, url_key=key, leader_id=leader_id)
+            except IntegrityError:
+                continue  # Another request became the leader since we looked: follow it
+            if leader_id is None or self.filter(pk=leader_id, status__in=ACTIVE_STATUSES).exists():
+                return summary, leader_id is None
+            # The leader finished between our lookup and our insert, maybe without settling us
+            summary.refresh_from_db(fields=['status'])
+            if summary.status not in ACTIVE_STATUSES:
+                return summary, False
+            summary.delete()
+        # Still racing after a few attempts: run a job of our own, outside single-flight
+        return self.create(user=user, url=url), True
+
+    async def acreate_or_follow(self, user, url: str) -> tuple:
+        """Async version of create_or_follow() (its transactions run in a thread, like Django's own a-methods)."""
+        return await sync_to_async(self.create_or_follow)(user, url)
+
+    def bulk_create_or_follow(self, user, urls: list, cached: dict = None) -> tuple:
+        """
+        create_or_follow() for a whole reading list, with one lookup and one INSERT.
+        URLs in `cached` ({url: summary}) are created COMPLETED right away.
+        Returns (summaries in the order of `urls`, ids of the leaders to enqueue).
+        """
+        cached = cached or {}
+        keys = [url_key(url) for url in urls]
+        leaders = self.active_leaders([key for url, key in zip(urls, keys) if url not in cached])
+
+        summaries, leader_ids = [], []
+        for url, key in zip(urls, keys):
+            if url in cached:
+                summaries.append(Summary(
+                    user=user, url=url, status='COMPLETED', output_summary=cached[url],
+                    search_vector=search_document(url, cached[url]),
+                ))
+                continue
+            summary = Summary(user=user, url=url, url_key=key, leader_id=leaders.get(key))
+            if summary.leader_id is None:
+                # The first copy of a URL in the list leads, later copies follow it
+                leaders[key] = summary.id
+                leader_ids.append(summary.id)
+            summaries.append(summary)
+
+        try:
+            with transaction.atomic():
+                self.bulk_create(summaries)
+        except IntegrityError:
+            # Lost a race with a concurrent request for one of the URLs: settle them one by one
+            summaries, leader_ids = [], []
+            for url in urls:
+                if url in cached:
+                    summaries.append(self.create(
+                        user=user, url=url, status='COMPLETED', output_summary=cached[url],
+                        search_vector=search_document(url, cached[url]),
+                    ))
+                    continue
+                summary, is_leader = self.create_or_follow(user, url)
+                summaries.append(summary)
+                if is_leader:
+                    leader_ids.append(summary.id)
+        return summaries, leader_ids
+
+    def settle_followers(self, leaders: list) -> list:
+        """
+        Gives the followers of these finished jobs the same outcome (status, output_summary, content and search index).
+        Returns (id, user_id, status) for every follower that changed, to notify their owners.
+        One SELECT, plus one UPDATE per job that had followers.
+        """
+        leaders = {leader.pk: leader for leader in leaders}
+        followers = list(
+            self.filter(leader_id__in=list(leaders), status__in=ACTIVE_STATUSES).values_list('id', 'user_id', 'leader_id')
+        )
+        now = timezone.now()
+        for leader_id, leader in leaders.items():
+            ids = [summary_id for summary_id, _, followed in followers if followed == leader_id]
+            if ids:
+                self.filter(id__in=ids, status__in=ACTIVE_STATUSES).update(
+                    status=leader.status, output_summary=leader.output_summary,
+                    content_id=leader.content_id, updated_at=now,
+                    # Copied inside the UPDATE: the page text behind it is not parsed again
+                    search_vector=Subquery(self.filter(pk=leader_id).values('search_vector')[:1]),
+                    text_vector=Subquery(self.filter(pk=leader_id).values('text_vector')[:1]),
+                )
+        return [(summary_id, user_id, leaders[followed].status) for summary_id, user_id, followed in followers]
+
+    def search(self, query: str):
+        """
+        Summaries matching `query`, best first (`rank`, then newest):
+        - full text: its words in the URL or the summary (search_vector), or in the page text (text_vector)
+        - fuzzy URL: `query` close to a piece of the URL, typos included (pg_trgm word similarity)
+        Any match is enough (each one is GIN-indexed).
+        The rank only reads the small search_vector (plus the URL similarity), so a match found in the
+        page text alone ranks below the ones in the URL or summary.
+        Rows still running are not indexed yet, but their URL can be found.
+        """
+        tsquery = search_query(query)
+        matches = Q(search_vector=tsquery) | Q(text_vector=tsquery) | Q(url__trigram_word_similar=query)
+        # Cast from real to double precision: the pagination cursor compares it with a Python float
+        return self.filter(matches).annotate(
+            rank=Cast(
+                Coalesce(SearchRank(F('search_vector'), tsquery), 0.0) + TrigramWordSimilarity(query, 'url'),
+                FloatField(),
+            ),
+        ).order_by('-rank', '-created_at', '-id')
+
 class Summary(models.Model):
     # 1. Primary Key
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -34,19 +224,116 @@ class Summary(models.Model):
     )
     
     # 5. Content
-    # Storing input_content is great for debugging (seeing what the AI saw)
-    input_content = models.TextField(blank=True, null=True) 
+    # Storing the input is great for debugging (seeing what the AI saw).
+    # The text itself lives in the shared, compressed ContentBlob table, so list queries stay small.
+    content = models.ForeignKey(
+        ContentBlob,
+        on_delete=models.PROTECT,  # Other summaries may share the same blob
+        related_name='summaries',
+        blank=True,
+        null=True,
+    )
     output_summary = models.TextField(blank=True, null=True) 
+    # Search index (domain/search.py), set when the summary completes:
+    # words of the URL and the summary (ranked), and of the page text (matched only)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    text_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    # 6. Single-flight (see SummaryQuerySet.create_or_follow)
+    # sha256 of the canonical URL (domain/canonical.py); empty for rows outside single-flight
+    url_key = models.CharField(max_length=64, blank=True, default='')
+    # The running job this request attached to, instead of scraping and summarizing the URL again
+    leader = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name='followers',
+        blank=True,
+        null=True,
+    )
     
-    # 6. Timestamps
+    # 7. Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
+    # Drives the list API's ETag/Last-Modified. auto_now only fires on save(),
+    # so .update(), bulk_update() and save(update_fields=...) must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = SummaryQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at'] # Default ordering: newest first
+        indexes = [
+            # Backs "my summaries, newest first" and its keyset pagination on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='summary_user_created_idx'),
+            # Back SummaryQuerySet.search(): full text, and pg_trgm trigrams of the URL (fuzzy matches)
+            GinIndex(fields=['search_vector'], name='summary_search_idx'),
+            GinIndex(fields=['text_vector'], name='summary_text_search_idx'),
+            GinIndex(fields=['url'], opclasses=['gin_trgm_ops'], name='summary_url_trgm_idx'),
+        ]
+        constraints = [
+            # At most one running job per canonical URL; the partial index also serves active_leaders()
+            models.UniqueConstraint(
+                fields=['url_key'],
+                condition=models.Q(leader__isnull=True, status__in=ACTIVE_STATUSES) & ~models.Q(url_key=''),
+                name='summary_one_job_per_url',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.url} ({self.status})"
 
+    @property
+    def input_content(self):
+        """
+        The clean text the AI saw. Loaded (and decompressed) only when accessed.
+        """
+        return self.content.text if self.content_id else None
+
+    # 8. State transitions (used by the Celery tasks)
+    # Each one is ONE narrow, conditional UPDATE (... WHERE id = %s AND status IN (...)):
+    # only the changed columns are written, and a late or duplicate task delivery
+    # can never overwrite a summary that already finished.
+    def _transition(self, allowed_statuses: tuple, **changes) -> bool:
+        changes['updated_at'] = timezone.now()
+        updated = Summary.objects.filter(pk=self.pk, status__in=allowed_statuses).update(**changes)
+        if updated:
+            # Keep this instance in sync with the row
+            for field, value in changes.items():
+                setattr(self, field, value)
+        return bool(updated)
+
+    def mark_processing(self) -> bool:
+        """PENDING -> PROCESSING. A redelivered task may pick up a row that is still PROCESSING."""
+        return self._transition(ACTIVE_STATUSES, status='PROCESSING')
+
+    def attach_content(self, blob: ContentBlob) -> bool:
+        """Links the scraped text while the job is running."""
+        return self._transition(('PROCESSING',), content=blob)
+
+    def complete(self, output_summary: str, text: str = None) -> bool:
+        """PROCESSING -> COMPLETED, with the summary text; `text` (the page) is indexed for search along with it."""
+        return self._transition(
+            ('PROCESSING',), status='COMPLETED', output_summary=output_summary,
+            search_vector=search_document(self.url, output_summary), text_vector=text_document(text),
+        )
+
+    def fail(self) -> bool:
+        """PENDING/PROCESSING -> FAILED."""
+        return self._transition(ACTIVE_STATUSES, status='FAILED')
+
+class SummaryCacheEntry(models.Model):
+    """
+    Storage for the "database" backend of the shared summary cache (domain/cache.py) and of the page cache.
+    Each row is one cache key -> JSON value pair with its own expiry.
+    """
+    key = models.CharField(max_length=128, primary_key=True)
+    value = models.JSONField()
+    expires_at = models.DateTimeField(db_index=True)
+    # Used to evict the least recently used rows when the table grows past MAX_ENTRIES
+    last_accessed = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
 class CustomUser(AbstractUser):
     # You can add custom fields here whenever you want!
 
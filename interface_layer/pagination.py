@@ -0,0 +1,118 @@
+import base64
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Keyset ("seek") pagination on (created_at, id), newest first.
+
+    Instead of OFFSET, each page starts right after the last row of the previous one,
+    so page 1000 costs the same as page 1 (one range scan on the (user, -created_at, -id) index).
+    The response body stays a plain list; the next page is advertised in a `Link: <...>; rel="next"` header.
+    """
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+
+    def __init__(self, request):
+        # A DRF Request, or a plain HttpRequest (the async views)
+        self.request = request
+        self.query_params = getattr(request, 'query_params', request.GET)
+        self.limit = self.get_page_size()
+        self.has_next = False
+
+    def get_page_size(self) -> int:
+        try:
+            size = int(self.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def page_queryset(self, queryset):
+        """
+        Orders and slices the queryset down to this page (plus one row, to know if there is a next page).
+        """
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, last_id = self.decode_cursor(cursor)
+            # (created_at, id) < (cursor): the plain created_at__lte keeps it an index range scan
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id),
+                created_at__lte=created_at,
+            )
+        return queryset[:self.limit + 1]
+
+    def paginate(self, rows: list) -> list:
+        """Drops the extra look-ahead row fetched by page_queryset()."""
+        self.has_next = len(rows) > self.limit
+        self.last_row = rows[self.limit - 1] if self.has_next else None
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_row))
+
+    def add_link_header(self, response):
+        next_link = self.get_next_link()
+        if next_link:
+            response['Link'] = f'<{next_link}>; rel="next"'
+        return response
+
+    @staticmethod
+    def encode_cursor(row) -> str:
+        raw = f"{row.created_at.isoformat()}|{row.id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            created_at, last_id = raw.split('|')
+            return datetime.fromisoformat(created_at), uuid.UUID(last_id)
+        except (ValueError, UnicodeError):
+            raise NotFound('Invalid cursor.')
+
+
+class RankedPagination(KeysetPagination):
+    """
+    Keyset pagination of search results, best match first: on (rank, created_at, id) instead of (created_at, id).
+    The queryset must be annotated with `rank` (SummaryQuerySet.search).
+    """
+    ordering = ('-rank', '-created_at', '-id')
+
+    def page_queryset(self, queryset):
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.query_params.get(self.cursor_query_param)
+        if cursor:
+            rank, created_at, last_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(rank__lt=rank)
+                | Q(rank=rank, created_at__lt=created_at)
+                | Q(rank=rank, created_at=created_at, id__lt=last_id)
+            )
+        return queryset[:self.limit + 1]
+
+    @staticmethod
+    def encode_cursor(row) -> str:
+        # repr() round-trips the float exactly, so the next page starts right after this row
+        raw = f"{row.rank!r}|{row.created_at.isoformat()}|{row.id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            rank, created_at, last_id = raw.split('|')
+            return float(rank), datetime.fromisoformat(created_at), uuid.UUID(last_id)
+        except (ValueError, UnicodeError):
+            raise NotFound('Invalid cursor.')
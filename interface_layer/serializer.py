@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from .models import Summary
 
 class SummaryRequestSerializer(serializers.ModelSerializer):
@@ -8,7 +9,26 @@ class SummaryRequestSerializer(serializers.ModelSerializer):
         # We only want the URL from the user. 
         # ID, status, and output are generated by the system.
 
+class SummaryBatchRequestSerializer(serializers.Serializer):
+    # A reading list: every entry is validated exactly like the single-URL endpoint
+    urls = serializers.ListField(child=serializers.URLField(), allow_empty=False)
+
+    def validate_urls(self, urls):
+        max_urls = settings.SUMMARY_BATCH['MAX_URLS']
+        if len(urls) > max_urls:
+            raise serializers.ValidationError(f"A batch can contain at most {max_urls} URLs.")
+        return urls
+
 class SummaryDetailSerializer(serializers.ModelSerializer):
+    """
+    Pass `fields=[...]` to only serialize a subset (e.g. the list view's ?fields=id,url,status).
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Summary
-        fields = ['id', 'url', 'status', 'output_summary', 'created_at']
\ No newline at end of file
+        fields = ['id', 'url', 'status', 'output_summary', 'created_at', 'updated_at']
\ No newline at end of file
@@ -5,6 +5,7 @@ from interface_layer.models import Summary
 # Use this helper to get your CustomUser model dynamically
 User = get_user_model()
 
+
 @pytest.mark.django_db  # <--- Crucial: Allows the test to create a temporary DB
 def test_create_custom_user():
     """
@@ -21,6 +22,7 @@ def test_create_custom_user():
     assert user.check_password("securepassword123") is True
     assert str(user) == "testuser"
 
+
 @pytest.mark.django_db
 def test_create_summary(db):
     """
@@ -44,6 +46,7 @@ def test_create_summary(db):
     assert summary.user == user # Relationship check
     assert summary.celery_task_id is None # Should be empty initially
 
+
 @pytest.mark.django_db
 def test_user_summary_relationship():
     """
@@ -57,4 +60,91 @@ def test_user_summary_relationship():
     
     # Check if the 'related_name' works
     assert user.summaries.count() == 2
-    assert user.summaries.first().url == "http://site2.com" # Checks ordering (newest first)
\ No newline at end of file
+    assert user.summaries.first().url == "http://site2.com" # Checks ordering (newest first)
+
+
+@pytest.mark.django_db
+def test_summary_transitions_cannot_reopen_a_finished_summary():
+    """complete()/fail() only apply to active rows, so a stale task delivery changes nothing."""
+    user = User.objects.create_user(username="transitions")
+    summary = Summary.objects.create(user=user, url="http://site.com")
+
+    assert summary.mark_processing()
+    assert summary.complete("The summary")
+
+    stale = Summary.objects.get(id=summary.id)
+    assert not stale.mark_processing()
+    assert not stale.fail()
+    assert Summary.objects.filter(id=summary.id).fail() == 0
+
+    summary.refresh_from_db()
+    assert summary.status == "COMPLETED"
+    assert summary.output_summary == "The summary"
+
+
+@pytest.mark.django_db
+def test_summary_transition_only_writes_its_columns(django_assert_num_queries):
+    user = User.objects.create_user(username="narrow")
+    summary = Summary.objects.create(user=user, url="http://site.com")
+
+    with django_assert_num_queries(1) as captured:
+        summary.mark_processing()
+
+    sql = captured.captured_queries[0]["sql"]
+    assert sql.startswith("UPDATE")
+    assert "output_summary" not in sql and '"url"' not in sql
+
+
+def completed(user, url, output_summary, text=None):
+    summary = Summary.objects.create(user=user, url=url)
+    summary.mark_processing()
+    summary.complete(output_summary, text)
+    return summary
+
+
+@pytest.mark.django_db
+def test_search_finds_words_in_url_summary_and_page_text():
+    user = User.objects.create_user(username="searcher")
+    in_url = completed(user, "https://blog.example/quantum-computing", "An essay.")
+    in_summary = completed(user, "https://a.example/1", "Quantum computers explained.")
+    in_text = completed(user, "https://b.example/2", "A history of physics.", "Late chapters cover quantum tunnelling.")
+    completed(user, "https://c.example/3", "Cooking pasta.")
+
+    # The URL (weight A, and a trigram match) ranks above the summary (B); the page text is matched, not ranked
+    assert [summary.id for summary in Summary.objects.search("quantum")] == [in_url.id, in_summary.id, in_text.id]
+    assert Summary.objects.search("quantum").get(id=in_text.id).rank == 0
+
+
+@pytest.mark.django_db
+def test_search_finds_running_summaries_by_url_only():
+    user = User.objects.create_user(username="runner")
+    running = Summary.objects.create(user=user, url="https://d.example/quantum")
+    running.mark_processing()
+
+    assert [summary.id for summary in Summary.objects.search("quantum")] == [running.id]
+    assert not Summary.objects.search("physics").exists()
+
+
+@pytest.mark.django_db
+def test_search_matches_urls_with_typos():
+    user = User.objects.create_user(username="fuzzy")
+    page = completed(user, "https://github.com/django/django", "A web framework.")
+    completed(user, "https://example.org/recipes", "Cooking.")
+
+    assert [summary.id for summary in Summary.objects.search("githb")] == [page.id]
+
+
+@pytest.mark.django_db
+def test_followers_inherit_the_search_index_of_their_leader():
+    user = User.objects.create_user(username="leader")
+    other = User.objects.create_user(username="follower")
+    leader, _ = Summary.objects.create_or_follow(user, "https://news.example/story")
+    follower, is_leader = Summary.objects.create_or_follow(other, "https://news.example/story")
+    assert not is_leader
+
+    leader.mark_processing()
+    leader.complete("Elections were held.", "Turnout reached a record high.")
+    Summary.objects.settle_followers([leader])
+
+    assert [summary.id for summary in Summary.objects.filter(user=other).search("turnout")] == [follower.id]
+    assert [summary.id for summary in Summary.objects.filter(user=other).search("elections")] == [follower.id]
@@ -1,10 +1,17 @@
+import asyncio
+import base64
+import importlib
+import uuid
 import pytest
-from django.urls import reverse
+from django.conf import settings as django_settings
+from django.test import override_settings
+from django.urls import clear_url_caches, reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch
 from django.contrib.auth import get_user_model
 from interface_layer.models import Summary
+from domain.content_store import save_content
 
 User = get_user_model()
 
@@ -20,14 +27,26 @@ def user(db):
 
 @pytest.fixture
 def auth_client(api_client, user):
-    """Returns a client that is already logged in."""
-    api_client.force_authenticate(user=user)
+    """Returns a client that is already logged in (with a session: the async views are not DRF views)."""
+    api_client.force_login(user)
     return api_client
 
+def reload_urls():
+    importlib.reload(importlib.import_module(django_settings.ROOT_URLCONF))
+    clear_url_caches()
+
+@pytest.fixture(params=["async", "sync"])
+def api_views(request):
+    """Runs the test against both flavours of the submit / status / list endpoints (settings.ASYNC_API_VIEWS)"""
+    with override_settings(ASYNC_API_VIEWS=request.param == "async"):
+        reload_urls()
+        yield request.param
+    reload_urls()
+
 # --- TESTS ---
 
 @pytest.mark.django_db
-def test_create_summary_success(auth_client, user):
+def test_create_summary_success(auth_client, user, api_views):
     """
     Verifies that a valid POST request:
     1. Returns HTTP 202 Accepted
@@ -39,12 +58,12 @@ def test_create_summary_success(auth_client, user):
 
     # PATCH: We intercept the Celery task.
     # We don't want to actually start a worker process.
-    with patch('interface_layer.views.process_summary_task.delay') as mock_task:
+    with patch('domain.tasks.process_summary_task.delay') as mock_task:
         response = auth_client.post(url, data)
 
         # 1. Assert Response
         assert response.status_code == status.HTTP_202_ACCEPTED
-        assert response.data['status'] == 'PENDING'
+        assert response.json()['status'] == 'PENDING'
 
         # 2. Assert Database
         assert Summary.objects.count() == 1
@@ -56,7 +75,7 @@ def test_create_summary_success(auth_client, user):
         mock_task.assert_called_once_with(summary.id)
 
 @pytest.mark.django_db
-def test_create_summary_invalid_url(auth_client):
+def test_create_summary_invalid_url(auth_client, api_views):
     """Verifies valid URL validation."""
     url = reverse('submit-summary')
     data = {'url': 'not-a-url'}
@@ -67,7 +86,7 @@ def test_create_summary_invalid_url(auth_client):
     assert Summary.objects.count() == 0
 
 @pytest.mark.django_db
-def test_get_summary_isolation(auth_client, user):
+def test_get_summary_isolation(auth_client, user, api_views):
     """
     Security Test: User A cannot see User B's summaries.
     """
@@ -87,7 +106,7 @@ def test_get_summary_isolation(auth_client, user):
     assert response.status_code == status.HTTP_404_NOT_FOUND
 
 @pytest.mark.django_db
-def test_list_summaries_filter(auth_client, user):
+def test_list_summaries_filter(auth_client, user, api_views):
     """Test the list endpoint and status filtering."""
     # Create 2 summaries for this user
     Summary.objects.create(user=user, url="http://1.com", status="PENDING")
@@ -97,9 +116,408 @@ def test_list_summaries_filter(auth_client, user):
 
     # Case 1: Get All
     resp_all = auth_client.get(base_url)
-    assert len(resp_all.data) == 2
+    assert len(resp_all.json()) == 2
 
     # Case 2: Filter by COMPLETED
     resp_filtered = auth_client.get(base_url + '?status=COMPLETED')
-    assert len(resp_filtered.data) == 1
-    assert resp_filtered.data[0]['url'] == 'http://2.com'
\ No newline at end of file
+    assert len(resp_filtered.json()) == 1
+    assert resp_filtered.json()[0]['url'] == 'http://2.com'
+
+@pytest.mark.django_db
+def test_create_summary_cache_hit(auth_client, user, api_views):
+    """
+    A URL that was already summarized is answered immediately:
+    the record is created as COMPLETED and no task is enqueued (it is only added to the related-summaries index).
+    """
+    from domain.cache import get_summary_cache
+    get_summary_cache().store('http://popular-url.com/', 'Some page text', 'Cached summary')
+
+    url = reverse('submit-summary')
+    with patch('domain.tasks.process_summary_task.delay') as mock_task, \
+         patch('interface_layer.views.index_related_task.delay') as mock_index:
+        response = auth_client.post(url, {'url': 'http://popular-url.com'})
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()['status'] == 'COMPLETED'
+
+        summary = Summary.objects.get(id=response.json()['id'])
+        assert summary.output_summary == 'Cached summary'
+        assert summary.user == user
+        mock_task.assert_not_called()
+        mock_index.assert_called_once_with([summary.id])
+
+@pytest.mark.django_db
+def test_create_batch_summary(auth_client, user):
+    """
+    A reading list is inserted in one go and enqueued as ONE batch task.
+    URLs that are already cached come back COMPLETED and are not enqueued.
+    """
+    from domain.cache import get_summary_cache
+    get_summary_cache().store('http://cached.com/', 'Some page text', 'Cached summary')
+
+    url = reverse('submit-summary-batch')
+    data = {'urls': ['http://a.com', 'http://b.com', 'http://cached.com']}
+
+    with patch('domain.tasks.process_summary_batch_task.delay') as mock_task, \
+         patch('interface_layer.views.index_related_task.delay') as mock_index:
+        response = auth_client.post(url, data, format='json')
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert [item['status'] for item in response.data['results']] == ['PENDING', 'PENDING', 'COMPLETED']
+        assert Summary.objects.filter(user=user).count() == 3
+
+        pending_ids = [item['id'] for item in response.data['results'][:2]]
+        mock_task.assert_called_once_with(pending_ids)
+        mock_index.assert_called_once_with([response.data['results'][2]['id']])
+
+@pytest.mark.django_db
+def test_same_url_twice_runs_one_job(auth_client, user, api_views):
+    """A second request for a URL that is still being summarized follows the first job."""
+    url = reverse('submit-summary')
+    other_client = APIClient()
+    other_client.force_login(User.objects.create_user(username="other"))
+
+    with patch('domain.tasks.process_summary_task.delay') as mock_task:
+        first = auth_client.post(url, {'url': 'https://trending.com/story?utm_source=x'})
+        second = other_client.post(url, {'url': 'https://trending.com/story'})
+
+    assert first.status_code == second.status_code == status.HTTP_202_ACCEPTED
+    first_id = uuid.UUID(first.json()['id'])
+    mock_task.assert_called_once_with(first_id)
+    assert Summary.objects.get(id=second.json()['id']).leader_id == first_id
+
+@pytest.mark.django_db
+def test_single_url_following_a_queued_import_job_goes_first(auth_client, settings, api_views):
+    """The job it follows moves from the importer's bulk lane to the interactive lane: no waiting behind the import"""
+    settings.SUMMARY_SCHEDULING = {**settings.SUMMARY_SCHEDULING, 'MAX_RUNNING': 4, 'BULK_SHARE': 0.25, 'BULK_SLICE': 1}
+    importer = APIClient()
+    importer.force_login(User.objects.create_user(username="importer"))
+    urls = [f'https://import.example/{i}' for i in range(5)]
+
+    with patch('domain.tasks.process_summary_batch_task.delay') as mock_batch, \
+         patch('domain.tasks.process_summary_task.delay') as mock_task, \
+         patch('domain.tasks.dispatch_summaries_task.apply_async'):
+        ids = [item['id'] for item in importer.post(reverse('submit-summary-batch'), {'urls': urls}, format='json').data['results']]
+        mock_batch.assert_called_once_with([ids[0]])  # One bulk slot: the rest waits
+
+        response = auth_client.post(reverse('submit-summary'), {'url': urls[4]})
+
+    assert Summary.objects.get(id=response.json()['id']).leader_id == ids[4]
+    mock_task.assert_called_once_with(ids[4])
+    assert mock_batch.call_count == 1
+
+@pytest.mark.django_db
+def test_batch_follows_running_jobs_and_its_own_duplicates(auth_client, user):
+    running, _ = Summary.objects.create_or_follow(user, 'http://running.com/')
+    url = reverse('submit-summary-batch')
+    data = {'urls': ['http://running.com', 'http://new.com', 'http://new.com/#again']}
+
+    with patch('domain.tasks.process_summary_batch_task.delay') as mock_task:
+        response = auth_client.post(url, data, format='json')
+
+    ids = [item['id'] for item in response.data['results']]
+    mock_task.assert_called_once_with([ids[1]])
+    leaders = dict(Summary.objects.filter(id__in=ids).values_list('id', 'leader_id'))
+    assert leaders == {ids[0]: running.id, ids[1]: None, ids[2]: ids[1]}
+
+@pytest.mark.django_db
+def test_create_batch_summary_validation(auth_client, settings):
+    settings.SUMMARY_BATCH = {**settings.SUMMARY_BATCH, 'MAX_URLS': 2}
+    url = reverse('submit-summary-batch')
+
+    too_many = auth_client.post(url, {'urls': ['http://a.com', 'http://b.com', 'http://c.com']}, format='json')
+    bad_url = auth_client.post(url, {'urls': ['http://a.com', 'not-a-url']}, format='json')
+
+    assert too_many.status_code == status.HTTP_400_BAD_REQUEST
+    assert bad_url.status_code == status.HTTP_400_BAD_REQUEST
+    assert Summary.objects.count() == 0
+
+@pytest.mark.django_db
+def test_get_summary_content(auth_client, user):
+    """The scraped text is served from the content store, only to the owner."""
+    blob = save_content("Cleaned Text Content")
+    summary = Summary.objects.create(user=user, url="http://a.com", status="COMPLETED", content=blob)
+    other_user = User.objects.create_user(username="other", password="password")
+    other_summary = Summary.objects.create(user=other_user, url="http://a.com", content=blob)
+
+    response = auth_client.get(reverse('get-summary-content', args=[summary.id]))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data['input_content'] == "Cleaned Text Content"
+    assert response.data['content_hash'] == blob.digest
+
+    response = auth_client.get(reverse('get-summary-content', args=[other_summary.id]))
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.django_db
+def test_list_summaries_keyset_pagination(auth_client, user, api_views):
+    """Pages follow each other through the Link header without gaps or repeats."""
+    for i in range(5):
+        Summary.objects.create(user=user, url=f"http://{i}.com", status="COMPLETED")
+
+    seen = []
+    next_url = reverse('list-summaries') + '?limit=2'
+    while next_url:
+        response = auth_client.get(next_url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) <= 2
+        seen += [item['url'] for item in response.json()]
+        link = response.headers.get('Link')
+        next_url = link[1:link.index('>')] if link else None
+
+    assert seen == [f"http://{i}.com" for i in reversed(range(5))]
+
+@pytest.mark.django_db
+def test_list_summaries_invalid_cursor(auth_client, api_views):
+    response = auth_client.get(reverse('list-summaries') + '?cursor=garbage')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.django_db
+def test_list_summaries_field_projection(auth_client, user, api_views):
+    Summary.objects.create(user=user, url="http://1.com", status="COMPLETED", output_summary="Long text")
+
+    response = auth_client.get(reverse('list-summaries') + '?fields=id,url,status')
+    assert set(response.json()[0]) == {'id', 'url', 'status'}
+
+    response = auth_client.get(reverse('list-summaries') + '?fields=id,password')
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.django_db
+def test_list_summaries_conditional_get(auth_client, user, api_views):
+    """An unchanged page answers 304; any update to a row on it changes the ETag."""
+    summary = Summary.objects.create(user=user, url="http://1.com", status="PENDING")
+    url = reverse('list-summaries')
+
+    first = auth_client.get(url)
+    etag = first.headers['ETag']
+    assert 'Last-Modified' in first.headers
+
+    repeat = auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert repeat.status_code == status.HTTP_304_NOT_MODIFIED
+    assert repeat.headers['ETag'] == etag
+
+    summary.status = 'COMPLETED'
+    summary.save()
+    changed = auth_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert changed.status_code == status.HTTP_200_OK
+    assert changed.json()[0]['status'] == 'COMPLETED'
+
+def test_summary_events_requires_login():
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from interface_layer.views import summary_events
+
+    request = RequestFactory().get('/summarize/events/')
+    async def anonymous():
+        return AnonymousUser()
+    request.auser = anonymous
+
+    response = asyncio.run(summary_events(request))
+    assert response.status_code == 403
+
+def test_summary_events_streams_status_changes():
+    """The stream opens with 'ready', then relays every event pushed for this user."""
+    from contextlib import asynccontextmanager
+    from types import SimpleNamespace
+    from django.test import RequestFactory
+    from interface_layer.views import summary_events
+
+    @asynccontextmanager
+    async def fake_listen(user_id):
+        assert user_id == 42
+        queue = asyncio.Queue()
+        queue.put_nowait({'id': 'abc', 'status': 'COMPLETED'})
+        yield queue
+
+    async def logged_in():
+        return SimpleNamespace(is_authenticated=True, id=42)
+
+    async def read_two_events():
+        request = RequestFactory().get('/summarize/events/')
+        request.auser = logged_in
+        response = await summary_events(request)
+        stream = response.streaming_content
+        events = [await anext(stream), await anext(stream)]
+        await stream.aclose()
+        return response, events
+
+    with patch('interface_layer.views.listen', fake_listen):
+        response, events = asyncio.run(read_two_events())
+
+    assert response['Content-Type'] == 'text/event-stream'
+    assert b'event: ready' in events[0]
+    assert events[1] == b'event: status\ndata: {"id": "abc", "status": "COMPLETED"}\n\n'
+
+async def read_stream(response):
+    return [event async for event in response.streaming_content]
+
+@pytest.mark.django_db(transaction=True)
+def test_stream_summary_of_a_finished_job(user):
+    """A finished job is answered with the saved summary in a single 'done' event."""
+    from django.test import RequestFactory
+    from interface_layer.views import stream_summary
+
+    summary = Summary.objects.create(user=user, url="http://a.com", status="COMPLETED", output_summary="All done")
+    request = RequestFactory().get('/')
+    async def logged_in():
+        return user
+    request.auser = logged_in
+
+    response = asyncio.run(stream_summary(request, summary.id))
+    events = asyncio.run(read_stream(response))
+
+    assert len(events) == 1
+    assert events[0].startswith(b'event: done\n')
+    assert b'"output_summary": "All done"' in events[0]
+
+@pytest.mark.django_db(transaction=True)
+def test_stream_summary_relays_chunks_until_done(user):
+    from django.test import RequestFactory
+    from interface_layer.views import stream_summary
+
+    summary = Summary.objects.create(user=user, url="http://a.com", status="PROCESSING")
+
+    async def fake_stream(summary_id):
+        yield 'chunk', 'Hello '
+        yield None  # Quiet period: the job is still running, so only a keep-alive is sent
+        yield 'chunk', 'world'
+        await Summary.objects.filter(id=summary_id).aupdate(status='COMPLETED', output_summary='Hello world')
+        yield 'done', 'COMPLETED'
+
+    request = RequestFactory().get('/')
+    async def logged_in():
+        return user
+    request.auser = logged_in
+
+    with patch('interface_layer.views.read_summary_stream', fake_stream):
+        response = asyncio.run(stream_summary(request, summary.id))
+        events = asyncio.run(read_stream(response))
+
+    assert events[0] == b'event: chunk\ndata: {"text": "Hello "}\n\n'
+    assert events[1] == b': keep-alive\n\n'
+    assert events[2] == b'event: chunk\ndata: {"text": "world"}\n\n'
+    assert b'"status": "COMPLETED", "output_summary": "Hello world"' in events[3]
+
+@pytest.mark.django_db
+def test_metrics_endpoint(api_client, auth_client):
+    """Prometheus text format, counting what the API answered"""
+    with patch("domain.tasks.process_summary_task.delay"):
+        auth_client.post(reverse("submit-summary"), {"url": "https://metrics.example.com/"}, format="json")
+
+    response = api_client.get(reverse("metrics"))
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    body = response.content.decode()
+    assert 'summary_requests_total{outcome="queued"}' in body
+    assert "# TYPE summary_stage_seconds histogram" in body
+
+@pytest.mark.django_db
+def test_async_views_authenticate_like_drf(user):
+    """Session or HTTP Basic; a session POST needs the CSRF token, a Basic-auth one does not"""
+    from django.test import Client
+    summary = Summary.objects.create(user=user, url="http://1.com", status="COMPLETED")
+    detail = reverse('get-summary-detail', args=[summary.id])
+    basic = {'HTTP_AUTHORIZATION': 'Basic ' + base64.b64encode(b'testuser:password').decode()}
+
+    assert Client().get(detail).status_code == status.HTTP_403_FORBIDDEN
+    assert Client().get(detail, HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'testuser:wrong').decode()).status_code == 403
+    assert Client().get(detail, **basic).json()['url'] == "http://1.com"
+
+    with patch('domain.tasks.process_summary_task.delay') as mock_task:
+        browser = Client(enforce_csrf_checks=True)
+        browser.force_login(user)
+        refused = browser.post(reverse('submit-summary'), {'url': 'http://a.com'})
+        accepted = Client(enforce_csrf_checks=True).post(reverse('submit-summary'), {'url': 'http://a.com'}, **basic)
+
+    assert refused.status_code == status.HTTP_403_FORBIDDEN
+    assert refused.json()['detail'].startswith('CSRF Failed')
+    assert accepted.status_code == status.HTTP_202_ACCEPTED
+    mock_task.assert_called_once()
+
+@pytest.mark.django_db
+def test_search_summaries_ranked_and_paginated(auth_client, user):
+    def completed(url, output_summary, text=None):
+        summary = Summary.objects.create(user=user, url=url)
+        summary.mark_processing()
+        summary.complete(output_summary, text)
+        return summary
+
+    best = completed("https://rust.example/ownership", "Rust ownership rules.")
+    middle = completed("https://lang.example/1", "Memory safety in Rust.")
+    # Only in the page text: unranked, so newest first
+    oldest = completed("https://lang.example/2", "Systems languages.", "Rust is mentioned at the end.")
+    newer = completed("https://lang.example/4", "Compilers.", "A note on the Rust compiler.")
+    newest = completed("https://lang.example/5", "Toolchains.", "Rust toolchains, briefly.")
+    completed("https://lang.example/3", "Go concurrency.")
+    other = User.objects.create_user(username="other")
+    Summary.objects.create(user=other, url="https://rust.example/other", status="COMPLETED")
+
+    url = reverse('search-summaries')
+    response = auth_client.get(url, {'q': 'rust', 'limit': 2, 'fields': 'id,url'})
+    assert response.status_code == status.HTTP_200_OK
+    assert [uuid.UUID(row['id']) for row in response.json()] == [best.id, middle.id]
+    assert set(response.json()[0]) == {'id', 'url'}
+
+    next_page = response['Link'].split(';')[0].strip('<>')
+    response = auth_client.get(next_page)
+    assert [uuid.UUID(row['id']) for row in response.json()] == [newest.id, newer.id]
+
+    # The cursor also breaks ties between equal ranks
+    next_page = response['Link'].split(';')[0].strip('<>')
+    response = auth_client.get(next_page)
+    assert [uuid.UUID(row['id']) for row in response.json()] == [oldest.id]
+    assert 'Link' not in response
+
+@pytest.mark.django_db
+def test_search_summaries_pages_of_one_return_every_match_once(auth_client, user):
+    expected = set()
+    for i, output_summary in enumerate([
+        "Climate policy.", "Climate policy.", "Climate change and climate policy.",
+        "A climate report on the climate of cities and their climate plans.", "Oceans.", "Oceans.",
+    ]):
+        summary = Summary.objects.create(user=user, url=f"https://news.example/article-{i}")
+        summary.mark_processing()
+        summary.complete(output_summary, "The climate section." if output_summary == "Oceans." else None)
+        expected.add(str(summary.id))
+
+    seen = []
+    response = auth_client.get(reverse('search-summaries'), {'q': 'climate', 'limit': 1, 'fields': 'id'})
+    for _ in range(len(expected) + 1):
+        seen += [row['id'] for row in response.json()]
+        if 'Link' not in response:
+            break
+        response = auth_client.get(response['Link'].split(';')[0].strip('<>'))
+    assert sorted(seen) == sorted(expected)
+
+@pytest.mark.django_db
+def test_search_summaries_needs_a_query(auth_client):
+    url = reverse('search-summaries')
+    assert auth_client.get(url).status_code == status.HTTP_400_BAD_REQUEST
+    assert auth_client.get(url, {'q': 'x' * 201}).status_code == status.HTTP_400_BAD_REQUEST
+    assert auth_client.get(url, {'q': 'rust', 'cursor': 'nonsense'}).status_code == status.HTTP_404_NOT_FOUND
+
+@pytest.mark.django_db
+def test_related_summaries(auth_client, user):
+    from domain.tasks import index_related_task
+
+    def completed(owner, url, output_summary):
+        summary = Summary.objects.create(user=owner, url=url)
+        summary.mark_processing()
+        summary.complete(output_summary)
+        return summary
+
+    page = completed(user, "https://ml.example/transformers", "How transformer models use attention over tokens.")
+    close = completed(user, "https://ml.example/attention", "Attention layers let transformer models weigh tokens.")
+    far = completed(user, "https://food.example/bread", "Baking sourdough bread at home.")
+    other = completed(User.objects.create_user(username="other"), "https://ml.example/bert", "Transformer attention models.")
+    index_related_task([page.id, close.id, far.id, other.id])
+
+    response = auth_client.get(reverse('get-related-summaries', args=[page.id]), {'k': 5})
+    assert response.status_code == status.HTTP_200_OK
+    # Only the user's own summaries, most similar first, and never the one asked about
+    assert [uuid.UUID(row['id']) for row in response.json()] == [close.id, far.id]
+    assert response.json()[0]['url'] == close.url
+    assert response.json()[0]['score'] > response.json()[1]['score']
+
+    running = Summary.objects.create(user=user, url="https://ml.example/running")
+    assert auth_client.get(reverse('get-related-summaries', args=[running.id])).status_code == status.HTTP_409_CONFLICT
+    assert auth_client.get(reverse('get-related-summaries', args=[other.id])).status_code == status.HTTP_404_NOT_FOUND
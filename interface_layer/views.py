@@ -2,17 +2,45 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import NotFound
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+from contextlib import aclosing
+import asyncio
+import base64
+import hashlib
+import json
 
 from .models import Summary
-from .serializer import SummaryRequestSerializer, SummaryDetailSerializer
-from domain.tasks import process_summary_task
+from .serializer import SummaryRequestSerializer, SummaryBatchRequestSerializer, SummaryDetailSerializer
+from .pagination import KeysetPagination, RankedPagination
+from domain.scheduling import BULK, INTERACTIVE
+from domain.tasks import adelay, index_related_task, promote_leader, schedule_summaries
+from domain.cache import get_summary_cache
+from domain.events import listen, read_summary_stream
+from domain.related import embed, get_related_index
+from domain.search import search_document
+from domain.telemetry import REQUESTS, render_metrics
 
 from django.shortcuts import render, redirect
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth import login
+from django.contrib.auth import aauthenticate, login
 from django.contrib.auth.decorators import login_required
 
+# Seconds between keep-alive comments on an idle event stream
+SSE_HEARTBEAT_SECONDS = 15
+# A job in one of these states will not change any more
+FINAL_STATUSES = ('COMPLETED', 'FAILED')
+# Longer search queries are refused (every word is one more index lookup)
+SEARCH_MAX_QUERY_CHARS = 200
+
 @login_required
 def dashboard_view(request):
     """
@@ -32,6 +60,14 @@ def register_view(request):
         form = UserCreationForm()
     return render(request, 'registration/register.html', {'form': form})
 
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (stage timings, tokens, task counters: see domain/telemetry.py).
+    Nginx does not forward it; Prometheus scrapes web:8000 on the internal network.
+    """
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated]) # Ensures request.user exists
 def make_summary_request(request):
@@ -43,24 +79,87 @@ def make_summary_request(request):
     serializer = SummaryRequestSerializer(data=request.data)
     
     if serializer.is_valid():
-        # 2. Save to DB (Status: PENDING)
-        # We attach the current user manually since it's not in the request body
-        summary = serializer.save(user=request.user, status='PENDING')
+        # 2. Shortcut: somebody already summarized this URL recently
+        # We can answer right away without scraping or calling the AI again.
+        cached_summary = get_summary_cache().get_for_url(serializer.validated_data['url'])
+        if cached_summary is not None:
+            summary = serializer.save(
+                user=request.user, status='COMPLETED', output_summary=cached_summary,
+                search_vector=search_document(serializer.validated_data['url'], cached_summary),
+            )
+            index_related_task.delay([summary.id])
+            REQUESTS.labels('cached').inc()
+            return Response(
+                {'id': summary.id, 'status': summary.status, 'message': 'Served from cache.'},
+                status=status.HTTP_201_CREATED
+            )
 
-        # 3. Enqueue Task
-        # .delay() is the magic method that sends this to Redis/Celery
-        process_summary_task.delay(summary.id)
+        # 3. Save to DB (Status: PENDING)
+        # If somebody is already summarizing this URL, the new row just follows that job (single-flight)
+        summary, is_leader = Summary.objects.create_or_follow(request.user, serializer.validated_data['url'])
 
-        # 4. Return HTTP 202 Accepted
+        # 4. Enqueue Task (only for a new job; followers get the leader's result when it finishes)
+        # It starts once the user's earlier jobs (and everybody else's turn) let it: see domain/scheduling.py
+        if is_leader:
+            schedule_summaries(INTERACTIVE, request.user.id, [summary.id])
+        else:
+            promote_leader(summary)  # If the job followed still waits in somebody's import, it goes first now
+        REQUESTS.labels('queued' if is_leader else 'followed').inc()
+
+        # 5. Return HTTP 202 Accepted
         # 202 literally means: "I have received your request but haven't finished processing it."
         return Response(
-            {'id': summary.id, 'status': summary.status, 'message': 'Request queued.'},
+            {'id': summary.id, 'status': summary.status,
+             'message': 'Request queued.' if is_leader else 'Joined a running request for the same URL.'},
             status=status.HTTP_202_ACCEPTED
         )
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def make_batch_summary_request(request):
+    """
+    Receives a list of URLs ({"urls": [...]}), saves them all in one INSERT,
+    and triggers a single batch job for the ones that are neither cached nor already running.
+    """
+    # 1. Validation (every URL + the batch size limit)
+    serializer = SummaryBatchRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. Answer cached URLs immediately
+    cache = get_summary_cache()
+    cached = {}
+    for url in serializer.validated_data['urls']:
+        cached_summary = cache.get_for_url(url)
+        if cached_summary is not None:
+            cached[url] = cached_summary
+
+    # 3. Save to DB with a single bulk INSERT (URLs already being summarized follow the running job)
+    summaries, pending_ids = Summary.objects.bulk_create_or_follow(request.user, serializer.validated_data['urls'], cached)
+
+    # 4. Enqueue the new jobs in the bulk lane: they are let into the pipeline a slice at a time (one batch task each)
+    if pending_ids:
+        schedule_summaries(BULK, request.user.id, pending_ids)
+    served_ids = [summary.id for summary in summaries if summary.status == 'COMPLETED']
+    if served_ids:
+        index_related_task.delay(served_ids)
+    served = len(served_ids)
+    REQUESTS.labels('cached').inc(served)
+    REQUESTS.labels('queued').inc(len(pending_ids))
+    REQUESTS.labels('followed').inc(len(summaries) - served - len(pending_ids))
+
+    return Response(
+        {
+            'results': [{'id': summary.id, 'url': summary.url, 'status': summary.status} for summary in summaries],
+            'message': f"{len(pending_ids)} request(s) queued.",
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_summary_status(request, summary_id):
@@ -76,21 +175,395 @@ def get_summary_status(request, summary_id):
     return Response(serializer.data)
 
 
+async def summary_events(request):
+    """
+    Server-Sent Events stream of the user's status transitions (PROCESSING, COMPLETED, FAILED).
+    The dashboard keeps ONE of these open instead of polling get_summary_status for every job.
+
+    A plain async Django view (not DRF): it must not hold a worker thread while the stream is open,
+    and EventSource authenticates with the session cookie anyway.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+    response = StreamingHttpResponse(stream_summary_events(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Tell nginx to pass every event through immediately
+    return response
+
+
+async def stream_summary_events(user_id):
+    async with listen(user_id) as queue:
+        # 1. Subscribed: the client can now safely re-read anything it is waiting for
+        # (it also tells EventSource to reconnect after 3s if the connection drops)
+        yield 'retry: 3000\nevent: ready\ndata: {}\n\n'
+
+        # 2. Relay events, with a comment line now and then so proxies keep the connection open
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield sse_event('status', event)
+
+
+async def stream_summary(request, summary_id):
+    """
+    Server-Sent Events stream of ONE summary while the model writes it:
+    `chunk` events carry new text as soon as it is generated, a final `done` event carries
+    the status and the complete summary as saved in the database.
+    Works for any job: one that is already finished (or never streamed) just gets `done`.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+
+    summary = await Summary.objects.filter(id=summary_id, user=user).afirst()
+    if summary is None:
+        return JsonResponse({'detail': 'No Summary matches the given query.'}, status=404)
+
+    response = StreamingHttpResponse(stream_summary_output(summary), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def stream_summary_output(summary):
+    # 1. Still running: relay the chunks from Redis (replayed from the start if we joined late;
+    # a request that follows another user's job watches that job's stream)
+    if summary.status not in FINAL_STATUSES:
+        async with aclosing(read_summary_stream(summary.leader_id or summary.id)) as chunks:
+            async for item in chunks:
+                if item is None:
+                    # Quiet for a while: the job may have finished without streaming (cache hit, error)
+                    summary = await Summary.objects.aget(id=summary.id)
+                    if summary.status in FINAL_STATUSES:
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+
+                kind, text = item
+                if kind == 'done':
+                    break
+                if kind == 'reset':
+                    yield sse_event('reset', {})
+                    continue
+                yield sse_event('chunk', {'text': text})
+
+        summary = await Summary.objects.aget(id=summary.id)
+
+    # 2. The saved text is the source of truth (it replaces whatever the client assembled)
+    yield sse_event('done', {'id': str(summary.id), 'status': summary.status, 'output_summary': summary.output_summary})
+
+
+def sse_event(name: str, data: dict) -> str:
+    # JSON keeps newlines inside the text from breaking the "data:" line
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_summary_content(request, summary_id):
+    """
+    Returns the clean text the AI summarized (for debugging).
+    It lives in the compressed content store, so it is only loaded when someone asks for it here.
+    """
+    summary = get_object_or_404(Summary.objects.select_related('content'), id=summary_id, user=request.user)
+    if summary.content_id is None:
+        return Response({'detail': 'No content has been scraped for this summary yet.'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        'id': summary.id,
+        'content_hash': summary.content_id,
+        'input_content': summary.input_content,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_related_summaries(request, summary_id):
+    """
+    The user's other summaries closest in content to this one, most similar first (no model call).
+    - ?k= how many (default 10)
+    """
+    summary = get_object_or_404(Summary.objects.only('id', 'url', 'status', 'output_summary'), id=summary_id, user=request.user)
+    if summary.status != 'COMPLETED':
+        return Response({'detail': 'This summary is not finished yet.'}, status=status.HTTP_409_CONFLICT)
+    try:
+        k = min(max(int(request.query_params.get('k', 10)), 1), settings.RELATED_INDEX['MAX_K'])
+    except ValueError:
+        return Response({'k': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+
+    # 1. Nearest neighbours in the local index
+    neighbours = get_related_index().search(embed(summary.url, summary.output_summary), request.user.id, k, exclude=summary.id)
+
+    # 2. Their rows (one query; summaries deleted since they were indexed drop out)
+    rows = Summary.objects.filter(user=request.user, id__in=[related_id for related_id, _ in neighbours]).only('id', 'url', 'created_at').in_bulk()
+    return Response([
+        {'id': related_id, 'url': rows[related_id].url, 'created_at': rows[related_id].created_at, 'score': round(score, 4)}
+        for related_id, score in neighbours if related_id in rows
+    ])
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_summaries(request):
     """
-    Lists summaries, optionally filtering by status (e.g., ?status=COMPLETED)
+    Lists summaries, newest first, one page at a time.
+
+    - ?status=COMPLETED filters by status
+    - ?fields=id,url,status only returns (and only loads) those fields
+    - ?limit=N sets the page size; the next page's URL is in the `Link` header
+    - Sends an ETag/Last-Modified; a repeated request for an unchanged page gets 304 Not Modified
     """
-    # 1. Filter by Status (Optional)
-    status_param = request.query_params.get('status')
-    
+    # 1. Field projection (?fields=...)
+    fields, errors = list_fields(request.query_params)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. Fetch ONE page (optionally filtered by ?status=), loading only the requested columns
+    paginator = KeysetPagination(request)
+    page = paginator.paginate(list(list_queryset(request.user, paginator, fields)))
+
+    # 3. Conditional GET, or the page itself
+    return list_response(request, page, fields, paginator, Response)
+
+
+def list_fields(query_params) -> tuple:
+    """(fields, None) for ?fields=..., or (None, errors) if it names unknown fields."""
+    all_fields = SummaryDetailSerializer.Meta.fields
+    fields_param = query_params.get('fields')
+    fields = [name.strip() for name in fields_param.split(',') if name.strip()] if fields_param else all_fields
+    unknown = set(fields) - set(all_fields)
+    if unknown:
+        return None, {'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(all_fields)}."]}
+    return fields, None
+
+
+def list_queryset(user, paginator, fields: list):
+    """The (unevaluated) query for one page of the user's summaries."""
     # Base query: Only show the logged-in user's data
-    queryset = Summary.objects.filter(user=request.user)
+    queryset = Summary.objects.filter(user=user)
 
+    status_param = paginator.query_params.get('status')
     if status_param:
         queryset = queryset.filter(status=status_param.upper())
 
-    # 2. Return List
-    serializer = SummaryDetailSerializer(queryset, many=True)
-    return Response(serializer.data)
\ No newline at end of file
+    # (created_at/updated_at are always needed for the cursor and the ETag)
+    queryset = queryset.only(*set(fields) | {'id', 'created_at', 'updated_at'})
+    return paginator.page_queryset(queryset)
+
+
+def list_response(request, page: list, fields: list, paginator, respond):
+    """
+    304 if the client's copy of the page is current, else `respond(data)` (a DRF Response or a JsonResponse)
+    with the page, its validators and `Link` header.
+    """
+    # The page changes when a row on it is added, removed or updated (or a next page appears)
+    etag, last_modified = page_validators(page, fields, paginator.has_next)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_validators(not_modified, etag, last_modified)
+
+    serializer = SummaryDetailSerializer(page, many=True, fields=fields)
+    response = set_validators(respond(serializer.data), etag, last_modified)
+    return paginator.add_link_header(response)
+
+
+def page_validators(page: list, fields: list, has_next: bool) -> tuple:
+    """
+    Returns (quoted ETag, Last-Modified timestamp or None) for one page of summaries.
+    """
+    fingerprint = hashlib.sha256(','.join(fields).encode('utf-8'))
+    for summary in page:
+        fingerprint.update(f"|{summary.id}:{summary.updated_at.isoformat()}".encode('utf-8'))
+    fingerprint.update(b'|more' if has_next else b'|end')
+
+    last_modified = max((summary.updated_at for summary in page), default=None)
+    return quote_etag(fingerprint.hexdigest()[:32]), int(last_modified.timestamp()) if last_modified else None
+
+
+def set_validators(response, etag: str, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Let the browser keep the page, but always revalidate it with us first
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_summaries(request):
+    """
+    Searches the user's summaries, best match first, one page at a time.
+
+    - ?q=... words to find in the URL, the summary or the page text ("quoted phrases", -excluded, OR),
+      or a piece of the URL (typos allowed)
+    - ?status=, ?fields=, ?limit= and the `Link` header work like the list endpoint
+    """
+    # 1. The query
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'q': ['This parameter is required.']}, status=status.HTTP_400_BAD_REQUEST)
+    if len(query) > SEARCH_MAX_QUERY_CHARS:
+        return Response({'q': [f"At most {SEARCH_MAX_QUERY_CHARS} characters."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    fields, errors = list_fields(request.query_params)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. ONE page of matches, ranked in the database (only the requested columns are loaded)
+    queryset = Summary.objects.filter(user=request.user).search(query)
+    status_param = request.query_params.get('status')
+    if status_param:
+        queryset = queryset.filter(status=status_param.upper())
+    paginator = RankedPagination(request)
+    page = paginator.paginate(list(paginator.page_queryset(queryset.only(*set(fields) | {'id', 'created_at'}))))
+
+    serializer = SummaryDetailSerializer(page, many=True, fields=fields)
+    return paginator.add_link_header(Response(serializer.data))
+
+
+# ==========================================
+# ASYNC API (settings.ASYNC_API_VIEWS)
+# ==========================================
+# Async-native twins of the busiest endpoints: same URLs, bodies and status codes.
+# Under uvicorn a sync DRF view holds a thread for the whole request (sync_to_async); these stay on the
+# event loop and only leave it for the ORM (psycopg2 is a sync driver, so Django's a-methods run it in a
+# thread) and for the broker publish. The DRF views stay, for comparison (benchmarks/bench_api_views.py).
+
+async def api_user(request) -> tuple:
+    """
+    DRF's default authentication (session, then HTTP Basic) for the async views.
+    Returns (user, None), or (None, error response).
+    Like DRF, unsafe requests made with a session must carry the CSRF token; Basic-auth clients have no cookie to forge.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            check = CSRFCheck(lambda request: None)
+            check.process_request(request)
+            reason = check.process_view(request, None, (), {})
+            if reason:
+                return None, api_error(f"CSRF Failed: {reason}", status.HTTP_403_FORBIDDEN)
+        return user, None
+
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'basic' and credentials:
+        try:
+            username, _, password = base64.b64decode(credentials, validate=True).decode('utf-8').partition(':')
+        except (ValueError, UnicodeDecodeError):
+            return None, api_error('Invalid basic header. Credentials not correctly base64 encoded.', status.HTTP_403_FORBIDDEN)
+        user = await aauthenticate(request, username=username, password=password)
+        if user is None or not user.is_active:
+            return None, api_error('Invalid username/password.', status.HTTP_403_FORBIDDEN)
+        return user, None
+
+    return None, api_error('Authentication credentials were not provided.', status.HTTP_403_FORBIDDEN)
+
+
+def api_error(detail: str, status_code: int) -> JsonResponse:
+    return JsonResponse({'detail': detail}, status=status_code)
+
+
+def request_data(request):
+    """The parsed body (JSON or form), or None if the JSON is broken."""
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@csrf_exempt  # Checked by api_user(), for session logins only (like DRF)
+@require_POST
+async def amake_summary_request(request):
+    """
+    Async twin of make_summary_request: saves the URL as PENDING (or follows the running job) and enqueues it.
+    """
+    user, error = await api_user(request)
+    if error:
+        return error
+
+    # 1. Validation
+    data = request_data(request)
+    if data is None:
+        return api_error('JSON parse error.', status.HTTP_400_BAD_REQUEST)
+    serializer = SummaryRequestSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    url = serializer.validated_data['url']
+
+    # 2. Shortcut: somebody already summarized this URL recently (the cache backends are sync: Redis, database)
+    cached_summary = await sync_to_async(get_summary_cache().get_for_url)(url)
+    if cached_summary is not None:
+        summary = await Summary.objects.acreate(
+            user=user, url=url, status='COMPLETED', output_summary=cached_summary,
+            search_vector=search_document(url, cached_summary),
+        )
+        await adelay(index_related_task, [summary.id])
+        REQUESTS.labels('cached').inc()
+        return JsonResponse(
+            {'id': summary.id, 'status': summary.status, 'message': 'Served from cache.'},
+            status=status.HTTP_201_CREATED
+        )
+
+    # 3. Save to DB (Status: PENDING), following a running job for the same URL (single-flight)
+    summary, is_leader = await Summary.objects.acreate_or_follow(user, url)
+
+    # 4. Enqueue Task, without blocking the event loop
+    if is_leader:
+        await sync_to_async(schedule_summaries)(INTERACTIVE, user.id, [summary.id])
+    else:
+        await sync_to_async(promote_leader)(summary)  # A job still waiting in an import goes first now
+    REQUESTS.labels('queued' if is_leader else 'followed').inc()
+
+    return JsonResponse(
+        {'id': summary.id, 'status': summary.status,
+         'message': 'Request queued.' if is_leader else 'Joined a running request for the same URL.'},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@require_safe
+async def aget_summary_status(request, summary_id):
+    """
+    Async twin of get_summary_status.
+    """
+    user, error = await api_user(request)
+    if error:
+        return error
+
+    summary = await Summary.objects.filter(id=summary_id, user=user).afirst()
+    if summary is None:
+        return api_error('No Summary matches the given query.', status.HTTP_404_NOT_FOUND)
+    return JsonResponse(SummaryDetailSerializer(summary).data)
+
+
+@require_safe
+async def aget_summaries(request):
+    """
+    Async twin of get_summaries (same ?status=, ?fields=, ?limit=, cursors and conditional GET).
+    """
+    user, error = await api_user(request)
+    if error:
+        return error
+
+    # 1. Field projection (?fields=...)
+    fields, errors = list_fields(request.GET)
+    if errors:
+        return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # 2. Fetch ONE page
+    paginator = KeysetPagination(request)
+    try:
+        page = paginator.paginate([summary async for summary in list_queryset(user, paginator, fields)])
+    except NotFound as e:
+        return api_error(str(e.detail), status.HTTP_404_NOT_FOUND)
+
+    # 3. Conditional GET, or the page itself
+    return list_response(request, page, fields, paginator, lambda data: JsonResponse(data, safe=False))